@@ -0,0 +1,559 @@
+"""
+失心王游戏 - Web API的处理逻辑（与Web框架无关）
+
+app.py（Flask，WSGI）和 asgi.py（Starlette，ASGI）共用这里的路由表：
+每个处理函数接收 ApiRequest，返回 ApiResponse，由各自的入口转换为框架的请求和响应。
+"""
+import os
+from typing import Callable, List, Mapping, NamedTuple, Optional
+from game import Game
+from card import Card, Suit
+from solver import SolveStatus, DEFAULT_MAX_NODES, DEFAULT_TIMEOUT
+from game_store import create_store
+from simulate import estimate_win_probability, POLICIES, DEFAULT_SAMPLES, DEFAULT_TIME_BUDGET
+
+# 存储游戏实例（后端由环境变量GAME_STORE选择，多个工作进程时需要使用sqlite）
+store = create_store()
+
+# /actions 每个请求最多包含的操作数
+MAX_ACTIONS_PER_REQUEST = 8
+
+# 胜率估计每个请求最多模拟的局数和时间预算（秒）
+WIN_PROBABILITY_MAX_SAMPLES = 2000
+WIN_PROBABILITY_TIME_BUDGET = float(os.environ.get('WIN_PROBABILITY_TIME_BUDGET',
+                                                   DEFAULT_TIME_BUDGET))
+
+
+class ApiRequest:
+    """一个API请求"""
+
+    def __init__(self, game_id: Optional[str] = None, args: Optional[Mapping] = None,
+                 data: Optional[dict] = None, if_none_match: Optional[str] = None):
+        """
+        Args:
+            game_id: 路径中的游戏ID
+            args: 查询参数
+            data: JSON请求体（不是JSON对象时为空字典）
+            if_none_match: If-None-Match请求头的原始内容
+        """
+        self.game_id = game_id
+        self.args = args if args is not None else {}
+        self.data = data if isinstance(data, dict) else {}
+        self.if_none_match = if_none_match
+
+
+class ApiResponse:
+    """一个API响应"""
+
+    def __init__(self, payload: Optional[dict] = None, status: int = 200,
+                 etag: Optional[str] = None):
+        """
+        Args:
+            payload: JSON响应内容（304时为None）
+            status: HTTP状态码
+            etag: 状态的ETag，提供时响应禁止不经验证直接使用缓存
+        """
+        self.payload = payload
+        self.status = status
+        self.etag = etag
+
+    @property
+    def headers(self) -> dict:
+        """需要附加的响应头"""
+        if self.etag is None:
+            return {}
+        return {'ETag': f'"{self.etag}"', 'Cache-Control': 'no-cache'}
+
+
+class Route(NamedTuple):
+    """
+    路由表中的一项
+
+    path中的游戏ID写作 {game_id}；cpu_bound表示处理函数会调用求解器、模拟或
+    等待游戏的锁，异步入口在有界的求解线程池中执行；其他的只读写存储，
+    在单独的I/O线程池中执行（不占用求解线程池的容量）。
+    """
+    path: str
+    method: str
+    handler: Callable[[ApiRequest], ApiResponse]
+    cpu_bound: bool
+
+
+def error_response(message: str, status: int = 400, **extra) -> ApiResponse:
+    """错误响应"""
+    return ApiResponse({'error': message, **extra}, status)
+
+
+def _game_not_found() -> ApiResponse:
+    return error_response('游戏不存在', 404)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    If-None-Match是否包含该ETag（弱比较，忽略W/前缀，* 匹配任何ETag）
+    """
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*':
+            return True
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag.strip('"') == etag:
+            return True
+    return False
+
+
+def card_to_dict(card: Card) -> dict:
+    """将Card对象转换为字典"""
+    return {
+        'suit': card.suit.value if card.suit != Suit.JOKER else 'JOKER',
+        'value': card.value,
+        'is_big_joker': card.is_big_joker if card.suit == Suit.JOKER else False,
+        'display': str(card),
+        'is_spade_king': card.is_spade_king(),
+        'is_king': card.is_king()
+    }
+
+def game_payload(game: Game) -> dict:
+    """
+    游戏状态的响应内容：状态、手牌和敌人的点数、每个敌人能否击败（查表）
+    """
+    state = game.get_game_state()
+    return {
+        'hand': [card_to_dict(card) for card in state['hand']],
+        'enemies': [card_to_dict(card) for card in state['enemies']],
+        'hand_values': game.get_hand_values(),
+        'enemy_values': game.get_enemy_values(),
+        'attackable': game.attackable_enemies(),
+        'kings_defeated': state['kings_defeated'],
+        'is_game_over': state['is_game_over'],
+        'is_victory': state['is_victory'],
+        'deck_size': state['deck_size'],
+        'version': game.version
+    }
+
+# 增量响应中按位置比较的列表字段（只有牌需要转换为字典）和直接比较的字段
+_DELTA_LIST_FIELDS = ('hand', 'enemies', 'hand_values', 'enemy_values', 'attackable')
+_DELTA_SCALAR_FIELDS = ('kings_defeated', 'is_game_over', 'is_victory', 'deck_size')
+
+def _delta_fields(game: Game) -> dict:
+    """增量响应中比较的字段的当前值（牌的列表是副本，之后修改游戏不影响）"""
+    state = game.get_game_state()
+    fields = {
+        'version': game.version,
+        'hand': list(game.hand), 'enemies': list(game.enemies),
+        'hand_values': game.get_hand_values(), 'enemy_values': game.get_enemy_values(),
+        'attackable': game.attackable_enemies()
+    }
+    for field in _DELTA_SCALAR_FIELDS:
+        fields[field] = state[field]
+    return fields
+
+def delta_base(game: Game, since_version) -> Optional[dict]:
+    """
+    修改游戏之前记录增量响应的比较基准（见 game_delta）
+
+    Args:
+        game: 处理函数读取的、还没有修改的游戏
+        since_version: 客户端已有的版本号
+
+    Returns:
+        since_version正好是这个版本时返回比较用的字段，否则返回None（响应完整状态）
+    """
+    if (not isinstance(since_version, int) or isinstance(since_version, bool)
+            or since_version != game.version):
+        return None
+    return _delta_fields(game)
+
+def game_delta(game: Game, base: dict) -> dict:
+    """
+    相对于修改前的状态（delta_base 的返回值）的增量响应内容
+
+    列表字段只在有变化时返回 {'length': 新长度, 'changed': {位置: 新值}}，
+    其他字段只在有变化时返回新值；只有变化的牌才转换为字典。
+    """
+    current = _delta_fields(game)
+    delta = {'delta': True, 'version': game.version, 'base_version': base['version']}
+    for field in _DELTA_LIST_FIELDS:
+        new, old = current[field], base[field]
+        changed = {i: value for i, value in enumerate(new) if i >= len(old) or old[i] != value}
+        if changed or len(new) != len(old):
+            if field in ('hand', 'enemies'):
+                changed = {i: card_to_dict(card) for i, card in changed.items()}
+            delta[field] = {'length': len(new), 'changed': changed}
+    for field in _DELTA_SCALAR_FIELDS:
+        if current[field] != base[field]:
+            delta[field] = current[field]
+    return delta
+
+def state_etag(game: Game) -> str:
+    """状态的ETag（版本号，每次修改都会变化）"""
+    return str(game.version)
+
+def game_response(game: Game, base: Optional[dict] = None, **extra) -> ApiResponse:
+    """
+    带ETag的状态响应
+
+    Args:
+        game: 游戏
+        base: 修改前的比较基准（见 delta_base）；提供时只返回变化的部分（见 game_delta），
+              否则返回完整状态
+        extra: 额外的响应字段
+    """
+    payload = game_delta(game, base) if base is not None else game_payload(game)
+    return ApiResponse({**extra, **payload}, etag=state_etag(game))
+
+def check_manual_expression(game: Game, enemy_index: int, expression: str) -> Optional[str]:
+    """
+    验证手动输入的算式能否击败敌人（结果和用到的手牌，见 Game.verify_expression）
+
+    Returns:
+        错误信息，验证通过时返回None
+    """
+    if not expression:
+        return '手动输入时需要提供算式'
+    return game.verify_expression(expression, enemy_index).error
+
+def solve_result_to_dict(game: Game, enemy_index: int) -> dict:
+    """在搜索预算内求解，转换为check-enemy的响应内容"""
+    result = game.solve_enemy(enemy_index)
+
+    if result and result.status == SolveStatus.FOUND:
+        solution = result.solution
+        return {
+            'can_defeat': True,
+            'expression': solution[0],
+            'result': solution[1],
+            'target_value': game.get_enemy_values()[enemy_index],
+            'status': result.status.value,
+            'nodes': result.nodes
+        }
+    return {
+        'can_defeat': False,
+        'status': result.status.value if result else SolveStatus.IMPOSSIBLE.value,
+        'nodes': result.nodes if result else 0
+    }
+
+# 自动验证没有击败敌人的原因（搜索预算用完时不能说无法击败，客户端可以改为手动输入算式）
+_DEFEAT_ERRORS = {
+    SolveStatus.IMPOSSIBLE: '无法击败该敌人',
+    SolveStatus.BUDGET_EXHAUSTED: '自动计算超出搜索预算，未能确认能否击败该敌人，请手动输入算式',
+}
+
+def defeat_bounded(game: Game, enemy_index: int) -> SolveStatus:
+    """
+    在搜索预算内验证能否击败敌人（见 Game.solve_enemy），能击败时击败它
+
+    Returns:
+        FOUND（已击败）、IMPOSSIBLE（无法击败）或 BUDGET_EXHAUSTED（预算用完，游戏不变）
+    """
+    result = game.solve_enemy(enemy_index)
+    if result is None:
+        return SolveStatus.IMPOSSIBLE
+    if result.status == SolveStatus.FOUND:
+        game.defeat_enemy(enemy_index, skip_validation=True)
+    return result.status
+
+def defeat_error(status: SolveStatus, **extra) -> ApiResponse:
+    """defeat_bounded 没有击败敌人时的错误响应（solve_status 区分无解和预算用完）"""
+    return error_response(_DEFEAT_ERRORS[status], solve_status=status.value, **extra)
+
+def apply_action(game: Game, action) -> tuple:
+    """
+    执行 /actions 中的一个操作
+
+    Returns:
+        (操作结果, 错误响应)，成功时错误响应为None
+    """
+    if not isinstance(action, dict) or action.get('type') not in ('check', 'defeat', 'discard'):
+        return None, error_response('未知的操作类型')
+    action_type = action['type']
+
+    if action_type == 'discard':
+        card_index = action.get('card_index')
+        if not isinstance(card_index, int) or not game.discard_card(card_index):
+            return None, error_response('无法丢弃该牌')
+        return {'type': action_type, 'success': True}, None
+
+    enemy_index = action.get('enemy_index')
+    if not isinstance(enemy_index, int) or not 0 <= enemy_index < len(game.enemies):
+        return None, error_response('无效的敌人索引')
+
+    if action_type == 'check':
+        return {'type': action_type, **solve_result_to_dict(game, enemy_index)}, None
+
+    expression = action.get('expression')
+    if expression is not None:
+        error = check_manual_expression(game, enemy_index, expression)
+        if error:
+            return None, error_response(error)
+        game.defeat_enemy(enemy_index, skip_validation=True)
+    else:
+        status = defeat_bounded(game, enemy_index)
+        if status != SolveStatus.FOUND:
+            return None, defeat_error(status)
+    return {'type': action_type, 'success': True}, None
+
+
+def get_stats(request: ApiRequest) -> ApiResponse:
+    """服务器统计信息：当前游戏数量、内存/磁盘占用估计、淘汰次数"""
+    return ApiResponse({'games': store.stats()})
+
+def new_game(request: ApiRequest) -> ApiResponse:
+    """创建新游戏"""
+    game = Game()
+    game_id = store.create(game)
+
+    return game_response(game, game_id=game_id)
+
+def get_game_state(request: ApiRequest) -> ApiResponse:
+    """获取游戏状态（If-None-Match与当前版本相同时返回304，不生成响应内容）"""
+    game = store.get(request.game_id)
+    if game is None:
+        return _game_not_found()
+
+    etag = state_etag(game)
+    if etag_matches(request.if_none_match, etag):
+        return ApiResponse(status=304, etag=etag)
+    return game_response(game)
+
+def check_enemy(request: ApiRequest) -> ApiResponse:
+    """检查是否能击败敌人"""
+    game = store.get(request.game_id)
+    if game is None:
+        return _game_not_found()
+
+    data = request.data
+    enemy_index = data.get('enemy_index')
+
+    if enemy_index is None:
+        return error_response('缺少enemy_index参数')
+
+    # 只需要知道能否击败（用于高亮可攻击的敌人）时，直接查表，不生成表达式
+    if data.get('hint_only', False):
+        return ApiResponse({
+            'can_defeat': game.can_attack_enemy(enemy_index)
+        })
+
+    # 在搜索预算内求解，避免个别手牌长时间占用工作线程
+    return ApiResponse(solve_result_to_dict(game, enemy_index))
+
+def defeatable_enemies(request: ApiRequest) -> ApiResponse:
+    """一次性检查所有敌人是否能被击败"""
+    game = store.get(request.game_id)
+    if game is None:
+        return _game_not_found()
+
+    solutions = game.defeatable_enemies(max_nodes=DEFAULT_MAX_NODES, timeout=DEFAULT_TIMEOUT)
+    enemy_values = game.get_enemy_values()
+
+    enemies = []
+    for solution, enemy_value in zip(solutions, enemy_values):
+        if solution:
+            enemies.append({
+                'can_defeat': True,
+                'expression': solution[0],
+                'result': solution[1],
+                'target_value': enemy_value
+            })
+        else:
+            enemies.append({
+                'can_defeat': False,
+                'target_value': enemy_value
+            })
+
+    return ApiResponse({'enemies': enemies})
+
+def win_probability(request: ApiRequest) -> ApiResponse:
+    """蒙特卡洛估计当前局面的胜率（带95%置信区间）"""
+    game = store.get(request.game_id)
+    if game is None:
+        return _game_not_found()
+
+    try:
+        samples = int(request.args.get('samples', DEFAULT_SAMPLES))
+    except (TypeError, ValueError):
+        samples = None
+    policy = request.args.get('policy', 'greedy')
+    if samples is None or not 1 <= samples <= WIN_PROBABILITY_MAX_SAMPLES:
+        return error_response(f'samples必须在1到{WIN_PROBABILITY_MAX_SAMPLES}之间')
+    if policy not in POLICIES:
+        return error_response(f'未知的策略: {policy}')
+
+    return ApiResponse(estimate_win_probability(
+        game, samples=samples, time_budget=WIN_PROBABILITY_TIME_BUDGET, policy=policy
+    ))
+
+def defeat_enemy(request: ApiRequest) -> ApiResponse:
+    """击败敌人（请求中的since_version正好是修改前的版本时只返回变化的部分）"""
+    data = request.data
+    enemy_index = data.get('enemy_index')
+    skip_validation = data.get('skip_validation', False)  # 手动输入时跳过自动验证
+
+    if enemy_index is None:
+        return error_response('缺少enemy_index参数')
+
+    # 持有这局游戏的锁，修改在退出时保存（其他工作进程也能看到）
+    with store.edit(request.game_id) as game:
+        if game is None:
+            return _game_not_found()
+
+        # 如果跳过验证，需要先验证手动输入的算式
+        if skip_validation:
+            error = check_manual_expression(game, enemy_index, data.get('expression'))
+            if error:
+                return error_response(error)
+
+        base = delta_base(game, data.get('since_version'))
+        if skip_validation:
+            game.defeat_enemy(enemy_index, skip_validation=True)
+        else:
+            # 在搜索预算内自动验证（与check-enemy相同的预算）
+            status = defeat_bounded(game, enemy_index)
+            if status != SolveStatus.FOUND:
+                return defeat_error(status)
+
+        return game_response(game, base, success=True)
+
+def apply_actions(request: ApiRequest) -> ApiResponse:
+    """
+    一次请求执行一组操作，返回操作结果和最新的完整状态
+
+    请求格式：{"actions": [{"type": "check", "enemy_index": 0},
+                           {"type": "defeat", "enemy_index": 0, "expression": "..."},
+                           {"type": "discard", "card_index": 1}]}
+    check求解但不修改游戏；defeat提供expression时按手动输入验证算式。
+    所有操作都成功才保存，任何一个失败时游戏保持不变（返回400和失败的操作序号）。
+    actions为空时只返回状态。提供的since_version正好是执行前的版本时只返回变化的部分。
+    """
+    data = request.data
+    actions = data.get('actions', [])
+    if not isinstance(actions, list) or len(actions) > MAX_ACTIONS_PER_REQUEST:
+        return error_response(f'actions必须是不超过{MAX_ACTIONS_PER_REQUEST}个操作的列表')
+
+    # 持有这局游戏的锁，在副本上执行，全部成功后才保存
+    with store.lock(request.game_id):
+        stored = store.get(request.game_id)
+        if stored is None:
+            return _game_not_found()
+        game = Game.from_bytes(stored.to_bytes())
+        base = delta_base(stored, data.get('since_version'))
+
+        results = []
+        for position, action in enumerate(actions):
+            result, error = apply_action(game, action)
+            if error:
+                error.payload['action_index'] = position
+                return error
+            results.append(result)
+
+        if any(action['type'] != 'check' for action in actions):
+            store.save(request.game_id, game)
+
+    return game_response(game, base, success=True, results=results)
+
+def get_hand_values(request: ApiRequest) -> ApiResponse:
+    """获取手牌的实际点数"""
+    game = store.get(request.game_id)
+    if game is None:
+        return _game_not_found()
+
+    hand_values = []
+
+    for card, numeric_value in zip(game.hand, game.get_hand_values()):
+        hand_values.append({
+            'card': card_to_dict(card),
+            'numeric_value': numeric_value
+        })
+
+    return ApiResponse({'hand_values': hand_values})
+
+def discard_advice(request: ApiRequest) -> ApiResponse:
+    """击败敌人后推荐丢弃的手牌（按丢弃后期望能击败的敌人数从高到低）"""
+    game = store.get(request.game_id)
+    if game is None:
+        return _game_not_found()
+
+    return ApiResponse({
+        'recommendations': [{
+            'card_index': card_index,
+            'card': card_to_dict(game.hand[card_index]),
+            'expected_attackable': round(expected, 4)
+        } for card_index, expected in game.recommend_discard()]
+    })
+
+def validate_expression(request: ApiRequest) -> ApiResponse:
+    """验证用户输入的算式"""
+    game = store.get(request.game_id)
+    if game is None:
+        return _game_not_found()
+
+    data = request.data
+    enemy_index = data.get('enemy_index')
+    expression = data.get('expression')
+
+    if enemy_index is None or expression is None:
+        return error_response('缺少参数')
+
+    if not isinstance(enemy_index, int) or not 0 <= enemy_index < len(game.enemies):
+        return error_response('无效的敌人索引')
+
+    # JSON中的数字等不是字符串的算式按无效的算式处理
+    if not isinstance(expression, str):
+        return ApiResponse({'valid': False, 'error': '算式无效: 算式必须是字符串'})
+
+    # 解析算式，检查结果和用到的手牌（与Streamlit版本相同的验证）
+    verdict = game.verify_expression(expression, enemy_index)
+    if not verdict.valid:
+        return ApiResponse({
+            'valid': False,
+            'error': verdict.error,
+            'missing': verdict.missing,
+            'extra': verdict.extra
+        })
+
+    return ApiResponse({
+        'valid': True,
+        'result': float(verdict.value),
+        'target_value': verdict.target_value
+    })
+
+def discard_card(request: ApiRequest) -> ApiResponse:
+    """丢弃手牌（请求中的since_version正好是修改前的版本时只返回变化的部分）"""
+    data = request.data
+    card_index = data.get('card_index')
+
+    if card_index is None:
+        return error_response('缺少card_index参数')
+
+    # 持有这局游戏的锁，修改在退出时保存（其他工作进程也能看到）
+    with store.edit(request.game_id) as game:
+        if game is None:
+            return _game_not_found()
+
+        base = delta_base(game, data.get('since_version'))
+        success = game.discard_card(card_index)
+
+        if not success:
+            return error_response('无法丢弃该牌')
+
+        return game_response(game, base, success=True)
+
+
+# 所有API路由（主页和静态文件由各自的入口提供）
+ROUTES: List[Route] = [
+    Route('/api/stats', 'GET', get_stats, False),
+    Route('/api/game/new', 'POST', new_game, False),
+    Route('/api/game/{game_id}/state', 'GET', get_game_state, False),
+    Route('/api/game/{game_id}/check-enemy', 'POST', check_enemy, True),
+    Route('/api/game/{game_id}/defeatable-enemies', 'GET', defeatable_enemies, True),
+    Route('/api/game/{game_id}/win-probability', 'GET', win_probability, True),
+    Route('/api/game/{game_id}/defeat-enemy', 'POST', defeat_enemy, True),
+    Route('/api/game/{game_id}/actions', 'POST', apply_actions, True),
+    Route('/api/game/{game_id}/hand-values', 'GET', get_hand_values, False),
+    Route('/api/game/{game_id}/discard-advice', 'GET', discard_advice, True),
+    Route('/api/game/{game_id}/validate-expression', 'POST', validate_expression, True),
+    Route('/api/game/{game_id}/discard', 'POST', discard_card, True),
+]
@@ -0,0 +1,185 @@
+"""
+失心王游戏 - ASGI入口（Starlette）
+
+与 app.py 提供相同的路由（处理逻辑都在 api.py 中）。事件循环中不做阻塞的操作：
+调用求解器、模拟或等待游戏锁的请求交给有界的求解线程池执行，排队的请求超过
+上限时立即返回503，而不是让请求无限堆积；只读写存储的请求（SQLite的查询和
+写入也会阻塞）交给单独的I/O线程池，不占用求解线程池的容量。
+
+运行：uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+from starlette.templating import Jinja2Templates
+from game_store import DEFAULT_SWEEP_INTERVAL
+from api import ROUTES, ApiRequest, ApiResponse, store
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 求解线程数和最多排队的请求数（正在执行的不计入）
+DEFAULT_SOLVER_THREADS = 4
+DEFAULT_SOLVER_QUEUE = 16
+# 读写存储的线程数
+DEFAULT_IO_THREADS = 8
+# 503响应建议客户端重试前等待的秒数
+RETRY_AFTER = 1
+
+
+class SolverBusy(Exception):
+    """求解线程池已满"""
+
+
+class SolverExecutor:
+    """
+    有界的求解线程池
+
+    计数只在事件循环中读写，不需要加锁；任务在线程中真正结束时才减少计数
+    （客户端断开连接后，已经开始的求解仍会占用线程直到结束）。
+    """
+
+    def __init__(self, threads: int = DEFAULT_SOLVER_THREADS,
+                 queue_size: int = DEFAULT_SOLVER_QUEUE):
+        """
+        Args:
+            threads: 求解线程数
+            queue_size: 所有线程都忙时最多排队的请求数
+        """
+        self.threads = threads
+        self.capacity = threads + queue_size
+        self.pending = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=threads,
+                                            thread_name_prefix='solver')
+
+    def _finished(self, future):
+        self.pending -= 1
+
+    async def run(self, func, *args):
+        """
+        在线程池中执行func(*args)并等待结果
+
+        Raises:
+            SolverBusy: 正在执行和排队的任务已达到上限
+        """
+        if self.pending >= self.capacity:
+            self.rejected += 1
+            raise SolverBusy()
+        loop = asyncio.get_running_loop()
+        future = self._executor.submit(func, *args)
+        self.pending += 1
+        future.add_done_callback(
+            lambda done: loop.call_soon_threadsafe(self._finished, done)
+        )
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+solver_executor = SolverExecutor(
+    threads=int(os.environ.get('ASGI_SOLVER_THREADS', DEFAULT_SOLVER_THREADS)),
+    queue_size=int(os.environ.get('ASGI_SOLVER_QUEUE', DEFAULT_SOLVER_QUEUE))
+)
+
+io_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('ASGI_IO_THREADS', DEFAULT_IO_THREADS)),
+    thread_name_prefix='store-io'
+)
+
+templates = Jinja2Templates(directory=os.path.join(_BASE_DIR, 'templates'))
+
+
+def to_starlette_response(api_response: ApiResponse) -> Response:
+    """将ApiResponse转换为Starlette的响应"""
+    if api_response.payload is None:
+        return Response(status_code=api_response.status, headers=api_response.headers)
+    return JSONResponse(api_response.payload, status_code=api_response.status,
+                        headers=api_response.headers)
+
+
+def make_endpoint(handler, cpu_bound: bool):
+    """
+    把api.py中的处理函数包装为Starlette的端点
+
+    cpu_bound的处理函数在求解线程池中执行（满时返回503），其他的在I/O线程池中执行
+    """
+    async def endpoint(request: Request) -> Response:
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        api_request = ApiRequest(
+            game_id=request.path_params.get('game_id'),
+            args=request.query_params,
+            data=data,
+            if_none_match=request.headers.get('if-none-match')
+        )
+        if not cpu_bound:
+            api_response = await asyncio.get_running_loop().run_in_executor(
+                io_executor, handler, api_request
+            )
+            return to_starlette_response(api_response)
+        try:
+            api_response = await solver_executor.run(handler, api_request)
+        except SolverBusy:
+            return JSONResponse({'error': '服务器繁忙，请稍后重试'}, status_code=503,
+                                headers={'Retry-After': str(RETRY_AFTER)})
+        return to_starlette_response(api_response)
+    return endpoint
+
+
+async def index(request: Request) -> Response:
+    """主页（模板中的 url_for('static', filename=...) 指向 /static 下的文件）"""
+    def static_url(endpoint, filename):
+        return request.app.url_path_for(endpoint, path=filename)
+    return templates.TemplateResponse(request, 'index.html', {'url_for': static_url})
+
+
+async def get_solver_stats(request: Request) -> Response:
+    """求解线程池的状态：线程数、容量、正在执行和排队的任务数、被拒绝的请求数"""
+    return JSONResponse({
+        'threads': solver_executor.threads,
+        'capacity': solver_executor.capacity,
+        'pending': solver_executor.pending,
+        'rejected': solver_executor.rejected
+    })
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # 后台定期删除闲置过期的游戏
+    store.start_sweeper(float(os.environ.get('GAME_SWEEP_INTERVAL', DEFAULT_SWEEP_INTERVAL)))
+    yield
+    solver_executor.shutdown()
+
+
+routes = [Route('/', index)]
+routes += [
+    Route(route.path, make_endpoint(route.handler, route.cpu_bound),
+          methods=[route.method], name=route.handler.__name__)
+    for route in ROUTES
+]
+routes += [
+    Route('/api/solver-stats', get_solver_stats),
+    Mount('/static', StaticFiles(directory=os.path.join(_BASE_DIR, 'static')), name='static'),
+]
+
+app = Starlette(
+    routes=routes,
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'],
+                           allow_headers=['*'], expose_headers=['ETag'])],
+    lifespan=lifespan
+)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host=os.environ.get('HOST', '0.0.0.0'), port=int(os.environ.get('PORT', 5000)))
@@ -0,0 +1,6 @@
+"""
+求解器性能基准测试
+
+运行：
+    python -m bench.run
+"""
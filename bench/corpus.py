@@ -0,0 +1,118 @@
+"""
+基准测试用的手牌语料
+
+所有手牌都由 Card.create_deck() 按固定随机种子抽取，同一个种子每次生成的
+语料完全相同，不同版本的求解器可以在同一批手牌上比较。
+"""
+import random
+from typing import Dict, List, Optional
+
+from card import Card, Suit
+from solver import Solver
+
+DEFAULT_SEED = 20240601
+
+# 敌人点数的范围（小王最小为1，大王最大为14）
+MIN_TARGET = 1
+MAX_TARGET = 14
+
+# 无解用例的(张数, 目标值下限, 目标值上限)：6张牌几乎总能算出1-14，
+# 所以用更大的目标值
+UNSOLVABLE_RANGES = ((4, MIN_TARGET, MAX_TARGET), (5, MIN_TARGET, MAX_TARGET), (6, 1000, 5000))
+
+
+class BenchCase:
+    """一个基准测试用例：一手牌和一个目标值"""
+
+    def __init__(self, category: str, cards: List[Card], target: int):
+        """
+        Args:
+            category: 语料类别
+            cards: 手牌
+            target: 目标值
+        """
+        self.category = category
+        self.cards = cards
+        self.target = target
+        # 与游戏一致：黑桃K可用可不用
+        self.exclude_card: Optional[Card] = next(
+            (card for card in cards if card.is_spade_king()), None
+        )
+
+    def __repr__(self):
+        return f"{self.category}: {self.cards} -> {self.target}"
+
+
+def _joker_heavy(rng: random.Random, deck: List[Card], count: int) -> List[BenchCase]:
+    """大小王都在手牌中，其余牌随机"""
+    jokers = [card for card in deck if card.suit == Suit.JOKER]
+    others = [card for card in deck if card.suit != Suit.JOKER]
+    cases = []
+    for _ in range(count):
+        cards = jokers + rng.sample(others, rng.choice([3, 4]))
+        rng.shuffle(cards)
+        cases.append(BenchCase('joker_heavy', cards, rng.randint(MIN_TARGET, MAX_TARGET)))
+    return cases
+
+
+def _duplicates(rng: random.Random, deck: List[Card], count: int) -> List[BenchCase]:
+    """只有一两种点数的手牌（大量重复数值）"""
+    cases = []
+    for _ in range(count):
+        ranks = rng.sample(range(1, 14), rng.choice([1, 2]))
+        pool = [card for card in deck if card.value in ranks]
+        cards = rng.sample(pool, min(len(pool), rng.choice([4, 5])))
+        cases.append(BenchCase('duplicates', cards, rng.randint(MIN_TARGET, MAX_TARGET)))
+    return cases
+
+
+def _random_hands(rng: random.Random, deck: List[Card], count: int,
+                  size: int) -> List[BenchCase]:
+    """指定张数的随机手牌"""
+    return [
+        BenchCase(f'cards_{size}', rng.sample(deck, size), rng.randint(MIN_TARGET, MAX_TARGET))
+        for _ in range(count)
+    ]
+
+
+def _unsolvable(rng: random.Random, deck: List[Card], count: int) -> List[BenchCase]:
+    """
+    无解的手牌（UNSOLVABLE_RANGES中每种张数各count个）
+    
+    必须完整搜索才能证明无解，是求解器的最坏情况。用求解器确认无解，
+    有解的重新抽取。
+    """
+    cases = []
+    for size, low, high in UNSOLVABLE_RANGES:
+        found = 0
+        while found < count:
+            cards = rng.sample(deck, size)
+            target = rng.randint(low, high)
+            exclude_card = next((card for card in cards if card.is_spade_king()), None)
+            if not Solver.is_solvable(cards, target, exclude_card):
+                cases.append(BenchCase('unsolvable', cards, target))
+                found += 1
+    return cases
+
+
+def build_corpus(seed: int = DEFAULT_SEED, scale: int = 1) -> Dict[str, List[BenchCase]]:
+    """
+    生成基准测试语料
+    
+    Args:
+        seed: 随机种子
+        scale: 语料规模倍数（每个类别的用例数量按比例增加）
+    
+    Returns:
+        {类别: 用例列表}
+    """
+    rng = random.Random(seed)
+    deck = Card.create_deck()
+    return {
+        'joker_heavy': _joker_heavy(rng, deck, 20 * scale),
+        'duplicates': _duplicates(rng, deck, 20 * scale),
+        'cards_5': _random_hands(rng, deck, 20 * scale, 5),
+        'cards_6': _random_hands(rng, deck, 10 * scale, 6),
+        'cards_7': _random_hands(rng, deck, 5 * scale, 7),
+        'unsolvable': _unsolvable(rng, deck, 5 * scale),
+    }
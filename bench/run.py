@@ -0,0 +1,270 @@
+"""
+运行求解器基准测试
+
+    python -m bench.run                    # 运行并与基准线比较，变慢时返回非0
+    python -m bench.run --update-baseline  # 运行并把结果保存为新的基准线
+    python -m bench.run --engines solve,solve_many --scale 2
+
+每个引擎在每类语料上统计 p50/p95/p99 延迟和每秒展开的节点数，结果写入JSON。
+每次调用前都会清空求解结果缓存，测到的是真实的求解时间。
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bench.corpus import DEFAULT_SEED, MAX_TARGET, MIN_TARGET, BenchCase, build_corpus
+import solver
+from solver import Solver
+from stats import percentile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+RESULTS_PATH = os.path.join(BENCH_DIR, 'results.json')
+
+# 默认的回归阈值：p95延迟超过基准线的50%（且至少慢1毫秒）、
+# 展开节点数超过基准线的10%时判定为变慢（用到并行搜索的类别不比较节点数）
+DEFAULT_TOLERANCE = 0.5
+DEFAULT_NODE_TOLERANCE = 0.10
+MIN_DELTA_MS = 1.0
+
+
+def _run_solve(case: BenchCase) -> Optional[int]:
+    """精确模式单目标求解（游戏使用的方式），返回展开的节点数"""
+    return Solver.solve_bounded(case.cards, case.target, exclude_card=case.exclude_card,
+                                max_nodes=None, timeout=None).nodes
+
+
+def _run_solve_unpruned(case: BenchCase) -> Optional[int]:
+    """关闭剪枝的精确模式单目标求解"""
+    return Solver.solve_bounded(case.cards, case.target, exclude_card=case.exclude_card,
+                                max_nodes=None, timeout=None, prune=False).nodes
+
+
+def _run_solve_float(case: BenchCase) -> Optional[int]:
+    """浮点模式单目标求解（Solver.solve 的默认方式），不统计节点数"""
+    Solver.solve(case.cards, case.target, exclude_card=case.exclude_card)
+    return None
+
+
+def _run_solve_many(case: BenchCase) -> Optional[int]:
+    """一次搜索求解所有可能的敌人点数"""
+    targets = list(range(MIN_TARGET, MAX_TARGET + 1))
+    results = Solver.solve_many_bounded(case.cards, targets, exclude_card=case.exclude_card,
+                                        max_nodes=None, timeout=None)
+    return results[0].nodes
+
+
+def _run_solve_all_combinations(case: BenchCase) -> Optional[int]:
+    """子集动态规划求出所有解法，不统计节点数"""
+    Solver.solve_all_combinations(case.cards, case.target, exclude_card=case.exclude_card)
+    return None
+
+
+# 引擎名称 -> 对一个用例执行一次求解的函数（返回展开的节点数，不统计时返回None）
+ENGINES: Dict[str, Callable[[BenchCase], Optional[int]]] = {
+    'solve': _run_solve,
+    'solve_unpruned': _run_solve_unpruned,
+    'solve_float': _run_solve_float,
+    'solve_many': _run_solve_many,
+    'solve_all_combinations': _run_solve_all_combinations,
+}
+
+
+def _runs_in_parallel(case: BenchCase) -> bool:
+    """用例是否会使用多进程并行搜索（展开的节点数取决于进程的调度，每次运行都不同）"""
+    return (solver.PARALLEL_PROCESSES > 1 and bool(solver.PARALLEL_MIN_CARDS)
+            and len(case.cards) >= solver.PARALLEL_MIN_CARDS)
+
+
+def _summarize(latencies: List[float], nodes: List[Optional[int]],
+               parallel: bool = False) -> dict:
+    """
+    汇总一组测量结果
+
+    Args:
+        latencies: 每次调用的耗时（秒）
+        nodes: 每次调用展开的节点数（None表示该引擎不统计）
+        parallel: 是否有用例使用了并行搜索
+
+    Returns:
+        {count, p50_ms, p95_ms, p99_ms, total_ms, nodes, nodes_per_sec, parallel}
+    """
+    ordered = sorted(latencies)
+    total = sum(latencies)
+    summary = {
+        'count': len(latencies),
+        'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+        'total_ms': round(total * 1000, 3),
+        'nodes': None,
+        'nodes_per_sec': None,
+        'parallel': parallel,
+    }
+    if all(count is not None for count in nodes):
+        summary['nodes'] = sum(nodes)
+        summary['nodes_per_sec'] = round(sum(nodes) / total) if total > 0 else None
+    return summary
+
+
+def run_engine(engine: str, corpus: Dict[str, List[BenchCase]], repeat: int = 3) -> dict:
+    """
+    在所有语料上运行一个引擎
+
+    Args:
+        engine: 引擎名称（见 ENGINES）
+        corpus: build_corpus 生成的语料
+        repeat: 每个用例重复的次数（取最快的一次）
+
+    Returns:
+        {类别: 汇总结果}，另有 'all' 汇总所有类别
+    """
+    run = ENGINES[engine]
+    results = {}
+    all_latencies, all_nodes = [], []
+    any_parallel = False
+    for category, cases in corpus.items():
+        latencies, nodes = [], []
+        for case in cases:
+            # 取多次中最快的一次，减少机器负载波动的影响
+            best = None
+            for _ in range(repeat):
+                Solver.clear_cache()
+                start = time.perf_counter()
+                count = run(case)
+                elapsed = time.perf_counter() - start
+                if best is None or elapsed < best:
+                    best = elapsed
+            latencies.append(best)
+            nodes.append(count)
+        parallel = any(_runs_in_parallel(case) for case in cases)
+        results[category] = _summarize(latencies, nodes, parallel)
+        all_latencies.extend(latencies)
+        all_nodes.extend(nodes)
+        any_parallel = any_parallel or parallel
+    results['all'] = _summarize(all_latencies, all_nodes, any_parallel)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE,
+            node_tolerance: float = DEFAULT_NODE_TOLERANCE) -> List[str]:
+    """
+    与基准线比较
+
+    只比较两边都有的引擎和类别；语料（种子、规模）不同时无法比较。
+    串行搜索展开的节点数与机器无关，是主要的比较依据；并行搜索的任务之间共享
+    已展开的状态，节点数随进程调度变化，这些类别（任一边用到并行搜索）只比较
+    延迟。延迟受机器负载影响，阈值较宽。
+
+    Returns:
+        变慢的项目说明列表（空列表表示没有变慢）
+    """
+    if (results.get('seed'), results.get('scale')) != (baseline.get('seed'), baseline.get('scale')):
+        return [f"语料不同（种子/规模 {results.get('seed')}/{results.get('scale')} "
+                f"与基准线 {baseline.get('seed')}/{baseline.get('scale')}），无法比较"]
+
+    regressions = []
+    for engine, categories in results['engines'].items():
+        base_categories = baseline.get('engines', {}).get(engine)
+        if base_categories is None:
+            continue
+        for category, summary in categories.items():
+            base = base_categories.get(category)
+            if base is None:
+                continue
+            current, previous = summary['p95_ms'], base['p95_ms']
+            if current > previous * (1 + tolerance) and current - previous >= MIN_DELTA_MS:
+                regressions.append(f"{engine}/{category}: p95 {previous:.3f}ms -> {current:.3f}ms")
+            if base.get('parallel') or summary.get('parallel'):
+                continue
+            if summary['nodes'] is not None and base['nodes'] is not None:
+                if summary['nodes'] > base['nodes'] * (1 + node_tolerance):
+                    regressions.append(
+                        f"{engine}/{category}: 节点数 {base['nodes']} -> {summary['nodes']}"
+                    )
+    return regressions
+
+
+def _format_row(cells: Tuple) -> str:
+    """右对齐格式化表格的一行"""
+    return '  '.join(str(cell).rjust(width) for cell, width in zip(cells, (24, 6, 10, 10, 10, 12)))
+
+
+def print_report(results: dict):
+    """打印结果表格"""
+    for engine, categories in results['engines'].items():
+        print(f"\n== {engine} ==")
+        print(_format_row(('类别', '次数', 'p50(ms)', 'p95(ms)', 'p99(ms)', '节点/秒')))
+        for category, summary in categories.items():
+            print(_format_row((
+                category, summary['count'], summary['p50_ms'], summary['p95_ms'],
+                summary['p99_ms'],
+                summary['nodes_per_sec'] if summary['nodes_per_sec'] is not None else '-',
+            )))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='求解器基准测试')
+    parser.add_argument('--engines', default=','.join(ENGINES),
+                        help=f"逗号分隔的引擎列表（可选：{', '.join(ENGINES)}）")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='语料的随机种子')
+    parser.add_argument('--scale', type=int, default=1, help='语料规模倍数')
+    parser.add_argument('--repeat', type=int, default=3, help='每个用例重复的次数（取最快的一次）')
+    parser.add_argument('--output', default=RESULTS_PATH, help='结果JSON文件路径')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='基准线JSON文件路径')
+    parser.add_argument('--update-baseline', action='store_true', help='把本次结果保存为基准线')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='p95延迟允许超过基准线的比例')
+    parser.add_argument('--node-tolerance', type=float, default=DEFAULT_NODE_TOLERANCE,
+                        help='展开节点数允许超过基准线的比例')
+    args = parser.parse_args(argv)
+
+    engines = [name.strip() for name in args.engines.split(',') if name.strip()]
+    unknown = [name for name in engines if name not in ENGINES]
+    if unknown:
+        parser.error(f"未知的引擎：{', '.join(unknown)}")
+
+    corpus = build_corpus(args.seed, args.scale)
+    results = {
+        'seed': args.seed,
+        'scale': args.scale,
+        'repeat': args.repeat,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'engines': {},
+    }
+    for engine in engines:
+        results['engines'][engine] = run_engine(engine, corpus, args.repeat)
+    print_report(results)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {args.output}")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"基准线已更新：{args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("没有基准线，跳过比较（使用 --update-baseline 生成）")
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance, args.node_tolerance)
+    if regressions:
+        print("\n性能回归：")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\n与基准线相比没有变慢")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
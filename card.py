@@ -14,21 +14,59 @@ class Suit(Enum):
     JOKER = "🃏"  # 王牌
 
 
+# 整副牌中花色的顺序（决定牌的编号）
+_SUIT_ORDER = [Suit.SPADE, Suit.HEART, Suit.DIAMOND, Suit.CLUB]
+
+
 class Card:
-    """扑克牌"""
+    """
+    扑克牌（不可变）
+    
+    整副牌只有54张，每张牌全局只创建一个实例：Card(...) 返回共享的实例，
+    所有游戏的牌堆都引用同一组对象。因此比较两张牌只需比较是否为同一对象，
+    每局游戏也不再复制54个牌对象。
+    """
+    
+    __slots__ = ('suit', 'value', 'is_big_joker', 'id', 'rank')
     
-    def __init__(self, suit: Suit, value: Optional[int] = None, is_big_joker: bool = False):
+    def __new__(cls, suit: Suit, value: Optional[int] = None, is_big_joker: bool = False):
         """
-        初始化一张牌
+        获取一张牌
         
         Args:
             suit: 花色
             value: 点数（1-13，None表示王牌）
             is_big_joker: 是否是大王（True=大王，False=小王，只有当suit是JOKER时有效）
+        
+        Returns:
+            这张牌的共享实例
         """
-        self.suit = suit
-        self.value = value
-        self.is_big_joker = is_big_joker
+        if suit == Suit.JOKER:
+            return _DECK[53 if is_big_joker else 52]
+        if value is None or not 1 <= value <= 13:
+            raise ValueError(f"无效的点数: {value}")
+        return _DECK[_SUIT_ORDER.index(suit) * 13 + value - 1]
+    
+    @classmethod
+    def _intern(cls, index: int, suit: Suit, value: Optional[int], is_big_joker: bool) -> 'Card':
+        """创建编号为index的共享实例（只在模块加载时调用）"""
+        card = object.__new__(cls)
+        object.__setattr__(card, 'suit', suit)
+        object.__setattr__(card, 'value', value)
+        object.__setattr__(card, 'is_big_joker', is_big_joker)
+        object.__setattr__(card, 'id', index)  # 牌的编号（0-53），见 to_index
+        object.__setattr__(card, 'rank', value or 0)  # 点数（王牌为0，实际点数由上下文决定）
+        return card
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("Card是不可变的")
+    
+    def __delattr__(self, name):
+        raise AttributeError("Card是不可变的")
+    
+    def __reduce__(self):
+        # pickle/copy 还原为同一个共享实例
+        return (Card.from_index, (self.id,))
     
     def __repr__(self):
         if self.suit == Suit.JOKER:
@@ -37,15 +75,9 @@ class Card:
             value_str = self.get_value_str()
             return f"{self.suit.value}{value_str}"
     
-    def __eq__(self, other):
-        if not isinstance(other, Card):
-            return False
-        return (self.suit == other.suit and 
-                self.value == other.value and 
-                self.is_big_joker == other.is_big_joker)
-    
-    def __hash__(self):
-        return hash((self.suit, self.value, self.is_big_joker))
+    # 每张牌只有一个实例，相等即同一对象（使用object默认的 __eq__ 和 __hash__）
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
     
     def get_value_str(self) -> str:
         """获取点数的字符串表示"""
@@ -96,29 +128,62 @@ class Card:
                 # 小王 = 其他牌中最小的点数
                 return min(other_values)
         else:
-            return self.value if self.value else 0
+            return self.rank
+    
+    @staticmethod
+    def resolve_values(cards: list['Card']) -> list[int]:
+        """
+        一次算出一组牌中每张牌的点数（大小王的点数以这组牌为上下文）
+        
+        与对每张牌调用 get_numeric_value(cards) 结果相同，但只扫描一遍。
+        
+        Args:
+            cards: 牌列表（同时作为大小王的上下文）
+        
+        Returns:
+            与cards一一对应的点数列表
+        """
+        ranks = [card.rank for card in cards if card.rank]
+        small = min(ranks) if ranks else 1
+        big = max(ranks) if ranks else 14
+        return [
+            card.rank if card.rank else (big if card.is_big_joker else small)
+            for card in cards
+        ]
     
     def is_spade_king(self) -> bool:
         """判断是否是黑桃K"""
-        return self.suit == Suit.SPADE and self.value == 13
+        return self.id == 12
     
     def is_king(self) -> bool:
         """判断是否是K（任意花色的K）"""
-        return self.value == 13 and self.suit != Suit.JOKER
+        return self.rank == 13
+    
+    def to_index(self) -> int:
+        """
+        牌的编号（0-53），与 create_deck() 中的顺序一致：
+        黑桃A-K为0-12，红心13-25，方块26-38，梅花39-51，小王52，大王53
+        """
+        return self.id
+    
+    @staticmethod
+    def from_index(index: int) -> 'Card':
+        """由编号（0-53）获取牌，见 to_index"""
+        if not 0 <= index <= 53:
+            raise ValueError(f"无效的牌编号: {index}")
+        return _DECK[index]
     
     @staticmethod
     def create_deck() -> list['Card']:
-        """创建一副完整的牌（52张标准牌 + 2张王牌）"""
-        deck = []
-        
-        # 创建标准牌
-        for suit in [Suit.SPADE, Suit.HEART, Suit.DIAMOND, Suit.CLUB]:
-            for value in range(1, 14):
-                deck.append(Card(suit, value))
-        
-        # 添加王牌
-        deck.append(Card(Suit.JOKER, None, False))  # 小王
-        deck.append(Card(Suit.JOKER, None, True))   # 大王
-        
-        return deck
+        """创建一副完整的牌（52张标准牌 + 2张王牌，牌对象为共享实例）"""
+        return list(_DECK)
+
+
+# 全部54张牌的共享实例，按编号排列
+_DECK = []
+for _suit in _SUIT_ORDER:
+    for _value in range(1, 14):
+        _DECK.append(Card._intern(len(_DECK), _suit, _value, False))
+_DECK.append(Card._intern(52, Suit.JOKER, None, False))  # 小王
+_DECK.append(Card._intern(53, Suit.JOKER, None, True))   # 大王
 
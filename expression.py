@@ -0,0 +1,167 @@
+"""
+玩家输入的算式的解析和计算
+
+只接受整数、+ - * /（也可以写作 × ÷）和括号，用分数精确计算，并返回算式中
+出现的所有数字（用于检查是否恰好用到了手牌）。限制了算式的长度、数字的位数
+和括号的嵌套层数，每次计算的开销是有上限的。
+
+不支持正负号（一元的 + -）：算式中的每个数字都是一张手牌的点数，"-1+2" 这样的
+算式需要改写为 "2-1"。
+"""
+from fractions import Fraction
+from typing import List
+
+# 算式最多的字符数、数字最多的位数、括号最多的嵌套层数
+MAX_EXPRESSION_LENGTH = 200
+MAX_NUMBER_DIGITS = 4
+MAX_NESTING = 16
+
+# 可以替代 + - * / ( ) 的字符（中文输入法常用的全角符号）
+_ALIASES = str.maketrans({
+    '×': '*', '÷': '/', '（': '(', '）': ')',
+    '＋': '+', '－': '-', '＊': '*', '／': '/',
+})
+_OPERATORS = '+-*/'
+
+
+class ExpressionError(ValueError):
+    """算式无效（语法错误、超出限制或除以0）"""
+
+
+class ParsedExpression:
+    """算式的计算结果"""
+
+    def __init__(self, value: Fraction, operands: List[int]):
+        """
+        Args:
+            value: 精确的计算结果
+            operands: 算式中出现的数字（按出现的顺序）
+        """
+        self.value = value
+        self.operands = operands
+
+    def __repr__(self):
+        return f"ParsedExpression({self.value}, operands={self.operands})"
+
+
+def _tokenize(expression: str) -> List[str]:
+    """
+    把算式拆分为数字、运算符和括号（忽略空白）
+
+    Raises:
+        ExpressionError: 有不支持的字符或数字太长
+    """
+    tokens = []
+    i = 0
+    while i < len(expression):
+        char = expression[i]
+        if char.isspace():
+            i += 1
+        elif char in _OPERATORS or char in '()':
+            tokens.append(char)
+            i += 1
+        elif '0' <= char <= '9':
+            start = i
+            while i < len(expression) and '0' <= expression[i] <= '9':
+                i += 1
+            if i - start > MAX_NUMBER_DIGITS:
+                raise ExpressionError(f"数字太大: {expression[start:i]}")
+            tokens.append(expression[start:i])
+        else:
+            raise ExpressionError(f"不支持的字符: {char}（只能使用整数、+ - * / 和括号）")
+    return tokens
+
+
+class _Parser:
+    """
+    递归下降解析并计算：
+        算式 := 项 (('+' | '-') 项)*
+        项   := 因子 (('*' | '/') 因子)*
+        因子 := 整数 | '(' 算式 ')'
+    因子不能以 + - 开头（不支持正负号）。
+    """
+
+    def __init__(self, tokens: List[str]):
+        self.tokens = tokens
+        self.position = 0
+        self.depth = 0
+        self.operands = []
+
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def parse(self) -> Fraction:
+        if not self.tokens:
+            raise ExpressionError("算式为空")
+        value = self._expression()
+        if self._peek() is not None:
+            raise ExpressionError(f"多余的内容: {self._peek()}")
+        return value
+
+    def _expression(self) -> Fraction:
+        value = self._term()
+        while self._peek() in ('+', '-'):
+            op = self.tokens[self.position]
+            self.position += 1
+            right = self._term()
+            value = value + right if op == '+' else value - right
+        return value
+
+    def _term(self) -> Fraction:
+        value = self._factor()
+        while self._peek() in ('*', '/'):
+            op = self.tokens[self.position]
+            self.position += 1
+            right = self._factor()
+            if op == '*':
+                value = value * right
+            elif right == 0:
+                raise ExpressionError("不能除以0")
+            else:
+                value = value / right
+        return value
+
+    def _factor(self) -> Fraction:
+        token = self._peek()
+        if token is None:
+            raise ExpressionError("算式不完整")
+        self.position += 1
+        if token == '(':
+            self.depth += 1
+            if self.depth > MAX_NESTING:
+                raise ExpressionError(f"括号嵌套超过{MAX_NESTING}层")
+            value = self._expression()
+            if self._peek() != ')':
+                raise ExpressionError("括号不匹配")
+            self.position += 1
+            self.depth -= 1
+            return value
+        if token in ('+', '-'):
+            raise ExpressionError(f"不支持正负号: {token}（负数请改写为减法）")
+        if token.isdigit():
+            number = int(token)
+            self.operands.append(number)
+            return Fraction(number)
+        raise ExpressionError(f"这里需要数字或括号: {token}")
+
+
+def evaluate(expression: str) -> ParsedExpression:
+    """
+    解析并精确计算算式
+
+    Args:
+        expression: 玩家输入的算式，例如 "(11 + 5) * 2"
+
+    Returns:
+        计算结果和算式中出现的数字
+
+    Raises:
+        ExpressionError: 算式不是字符串、无效、超出长度/位数/嵌套限制或除以0
+    """
+    if not isinstance(expression, str):
+        raise ExpressionError("算式必须是字符串")
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionError(f"算式太长（最多{MAX_EXPRESSION_LENGTH}个字符）")
+    parser = _Parser(_tokenize(expression.translate(_ALIASES)))
+    value = parser.parse()
+    return ParsedExpression(value, parser.operands)
@@ -2,55 +2,166 @@
 游戏主逻辑
 """
 import random
-from typing import List, Optional
+import struct
+import sys
+from collections import Counter
+from fractions import Fraction
+from itertools import combinations_with_replacement
+from math import comb
+from typing import Iterable, Iterator, List, Optional, Tuple
 from card import Card, Suit
-from solver import Solver
+from expression import evaluate, ExpressionError
+from solver import Solver, SearchBudget, SolveResult, DEFAULT_MAX_NODES, DEFAULT_TIMEOUT
+
+
+# to_bytes 的格式：版本、标志位、已击败的K的数量、牌堆/手牌/敌人的张数、
+# 随机种子、操作记录的长度，后面依次是牌堆、手牌、敌人的牌编号（每张牌一个字节，
+# 见 Card.to_index）和操作记录（见 get_action_log）
+_SNAPSHOT_VERSION = 1
+_SNAPSHOT_HEADER = struct.Struct('<BBBBBBQH')
+_FLAG_GAME_OVER = 1
+_FLAG_VICTORY = 2
+
+# 随机种子的范围（快照中用8字节保存）
+_SEED_LIMIT = 1 << 64
+
+# 操作记录中每个操作一个字节：击败敌人为敌人的索引，丢弃手牌为 0x80 | 手牌的索引
+_ACTION_DISCARD = 0x80
+
+
+class Deck:
+    """
+    牌堆：洗好的牌数组 + 读取位置
+
+    抽牌只移动读取位置（O(1)），不像 list.pop(0) 那样移动后面所有的牌。
+    len(deck) 为剩余张数，遍历得到剩余的牌（从牌堆顶开始）。
+    """
+
+    __slots__ = ('_cards', '_cursor')
+
+    def __init__(self, cards: Iterable[Card] = ()):
+        """
+        Args:
+            cards: 牌堆中的牌，第一张为牌堆顶
+        """
+        self._cards = list(cards)
+        self._cursor = 0
+
+    def draw(self) -> Card:
+        """从牌堆顶抽一张牌（牌堆为空时抛出IndexError）"""
+        if self._cursor >= len(self._cards):
+            raise IndexError("牌堆已空")
+        card = self._cards[self._cursor]
+        self._cursor += 1
+        return card
+
+    def __len__(self) -> int:
+        return len(self._cards) - self._cursor
+
+    def __iter__(self) -> Iterator[Card]:
+        return iter(self._cards[self._cursor:])
+
+    def __sizeof__(self) -> int:
+        return object.__sizeof__(self) + sys.getsizeof(self._cards)
+
+    def __repr__(self):
+        return f"Deck({list(self)!r})"
+
+
+class ExpressionVerdict:
+    """玩家输入的算式的验证结果（见 Game.verify_expression）"""
+    
+    def __init__(self, valid: bool, error: Optional[str] = None,
+                 value: Optional[Fraction] = None, target_value: Optional[int] = None,
+                 operands: Optional[List[int]] = None, missing: Optional[List[int]] = None,
+                 extra: Optional[List[int]] = None):
+        """
+        Args:
+            valid: 算式能否击败敌人
+            error: 不能击败时的原因
+            value: 算式的精确计算结果（算式无效时为None）
+            target_value: 敌人的点数
+            operands: 算式中出现的数字
+            missing: 没有用到的必须使用的手牌点数
+            extra: 手牌中没有（或使用次数多于手牌张数）的数字
+        """
+        self.valid = valid
+        self.error = error
+        self.value = value
+        self.target_value = target_value
+        self.operands = operands or []
+        self.missing = missing or []
+        self.extra = extra or []
+    
+    def __repr__(self):
+        if self.valid:
+            return f"ExpressionVerdict(valid, {self.value})"
+        return f"ExpressionVerdict(invalid, {self.error!r})"
 
 
 class Game:
     """失心王游戏"""
     
-    def __init__(self):
-        """初始化游戏"""
-        self.deck = []
+    def __init__(self, seed: Optional[int] = None):
+        """
+        初始化游戏
+        
+        Args:
+            seed: 随机种子（0 <= seed < 2**64）。同一个种子总是发出同样的牌，
+                  省略时随机生成。
+        """
+        if seed is None:
+            seed = random.SystemRandom().randrange(_SEED_LIMIT)
+        if not 0 <= seed < _SEED_LIMIT:
+            raise ValueError(f"随机种子超出范围: {seed}")
+        self.seed = seed
+        self.actions = []  # 操作记录，见 get_action_log
+        self.deck = Deck()  # 牌堆
         self.hand = []  # 手牌
         self.enemies = []  # 敌人牌
         self.spade_king = None  # 黑桃K
         self.kings_defeated = 0  # 已击败的K的数量
         self.is_game_over = False
         self.is_victory = False
+        # 手牌和敌人的点数（大小王按上下文解析后），手牌或敌人变化时清空
+        self._hand_values = None
+        self._enemy_values = None
         
         self._initialize_game()
     
     def _initialize_game(self):
         """初始化游戏状态"""
         # 创建牌堆
-        self.deck = Card.create_deck()
+        cards = Card.create_deck()
         
         # 找到黑桃K
-        self.spade_king = next((c for c in self.deck if c.is_spade_king()), None)
+        self.spade_king = next((c for c in cards if c.is_spade_king()), None)
         if not self.spade_king:
             raise ValueError("找不到黑桃K！")
         
         # 移除黑桃K
-        self.deck.remove(self.spade_king)
+        cards.remove(self.spade_king)
         
-        # 洗牌
-        random.shuffle(self.deck)
+        # 洗牌（使用由种子创建的随机数生成器，不与其他游戏/线程共享全局随机状态；
+        # 只有发牌用到随机数，所以不保存在游戏对象上，每局可节省约2.5KB）
+        random.Random(self.seed).shuffle(cards)
         
         # 初始化手牌：黑桃K + 4张随机牌（不能有其他花色的K）
+        # 从牌堆顶依次取牌，一次遍历完成
         self.hand = [self.spade_king]
-        cards_added = 0
-        while cards_added < 4 and len(self.deck) > 0:
-            card = self.deck.pop(0)
+        skipped_kings = []
+        position = 0
+        while len(self.hand) < 5 and position < len(cards):
+            card = cards[position]
+            position += 1
             # 排除其他花色的K（红心K、方块K、梅花K）
             if card.is_king() and not card.is_spade_king():
                 # 抽到其他花色的K，放回牌堆末尾
-                self.deck.append(card)
+                skipped_kings.append(card)
             else:
                 # 不是K的牌，加入手牌
                 self.hand.append(card)
-                cards_added += 1
+        self.deck = Deck(cards[position:] + skipped_kings)
         
         # 翻开4张牌作为敌人
         self._refresh_enemies()
@@ -58,16 +169,31 @@ class Game:
     def _refresh_enemies(self):
         """刷新敌人牌（直到有4个敌人）"""
         while len(self.enemies) < 4 and len(self.deck) > 0:
-            self.enemies.append(self.deck.pop(0))
+            self.enemies.append(self.deck.draw())
+        self._enemy_values = None
+    
+    def _invalidate_values(self):
+        """手牌或敌人变化后清空缓存的点数"""
+        self._hand_values = None
+        self._enemy_values = None
     
     def get_enemy_values(self) -> List[int]:
-        """获取所有敌人的点数"""
-        values = []
-        for enemy in self.enemies:
+        """
+        获取所有敌人的点数（敌人变化前重复调用返回缓存的同一个列表，不要修改）
+        """
+        if self._enemy_values is None:
             # 计算敌人点数时，需要考虑上下文（敌人牌）
-            value = enemy.get_numeric_value(self.enemies)
-            values.append(value)
-        return values
+            self._enemy_values = Card.resolve_values(self.enemies)
+        return self._enemy_values
+    
+    def get_hand_values(self) -> List[int]:
+        """
+        获取所有手牌的点数（大小王以手牌为上下文；手牌变化前重复调用返回
+        缓存的同一个列表，不要修改）
+        """
+        if self._hand_values is None:
+            self._hand_values = Card.resolve_values(self.hand)
+        return self._hand_values
     
     def can_defeat_enemy(self, enemy_index: int) -> Optional[tuple]:
         """
@@ -82,20 +208,143 @@ class Game:
         if enemy_index < 0 or enemy_index >= len(self.enemies):
             return None
         
-        enemy = self.enemies[enemy_index]
-        target_value = enemy.get_numeric_value(self.enemies)
+        target_value = self.get_enemy_values()[enemy_index]
         
         # 使用求解器找到解决方案
         # 除黑桃K之外的牌必须全部用到，黑桃K可用可不用
+        # 使用精确的分数运算，避免浮点误差导致误判
         solution = Solver.solve(
             self.hand, 
             target_value, 
             must_use_all=True, 
-            exclude_card=self.spade_king
+            exclude_card=self.spade_king,
+            exact=True
         )
         
         return solution
     
+    def solve_enemy(self, enemy_index: int, max_nodes: Optional[int] = DEFAULT_MAX_NODES,
+                    timeout: Optional[float] = DEFAULT_TIMEOUT) -> Optional[SolveResult]:
+        """
+        在搜索预算内检查能否击败指定的敌人（用于网页请求和提示）
+        
+        Args:
+            enemy_index: 敌人的索引（0-3）
+            max_nodes: 最多展开的节点数（None表示不限制）
+            timeout: 最长搜索时间，单位秒（None表示不限制）
+        
+        Returns:
+            SolveResult（找到解 / 证明无解 / 预算用完），索引无效时返回None
+        """
+        if enemy_index < 0 or enemy_index >= len(self.enemies):
+            return None
+        
+        target_value = self.get_enemy_values()[enemy_index]
+        return Solver.solve_bounded(
+            self.hand,
+            target_value,
+            must_use_all=True,
+            exclude_card=self.spade_king,
+            exact=True,
+            max_nodes=max_nodes,
+            timeout=timeout
+        )
+    
+    def defeatable_enemies(self, max_nodes: Optional[int] = None,
+                           timeout: Optional[float] = None) -> List[Optional[tuple]]:
+        """
+        一次性检查所有敌人是否能被击败（手牌只搜索一次）
+        
+        Args:
+            max_nodes: 最多展开的节点数（None表示不限制）
+            timeout: 最长搜索时间，单位秒（None表示不限制）
+        
+        Returns:
+            与敌人一一对应的列表，能击败的为(表达式字符串, 计算结果)，
+            否则（包括预算用完时还没找到解）为None
+        """
+        return Solver.solve_many(
+            self.hand,
+            self.get_enemy_values(),
+            must_use_all=True,
+            exclude_card=self.spade_king,
+            exact=True,
+            budget=SearchBudget(max_nodes, timeout)
+        )
+    
+    def can_attack_enemy(self, enemy_index: int) -> bool:
+        """
+        判断能否击败指定的敌人（不生成表达式，用于高亮可攻击的敌人）
+        
+        Args:
+            enemy_index: 敌人的索引（0-3）
+        
+        Returns:
+            能否击败
+        """
+        if enemy_index < 0 or enemy_index >= len(self.enemies):
+            return False
+        
+        target_value = self.get_enemy_values()[enemy_index]
+        return Solver.is_solvable(self.hand, target_value, exclude_card=self.spade_king)
+    
+    def attackable_enemies(self) -> List[bool]:
+        """
+        判断每个敌人能否被击败（不生成表达式，手牌只查一次表，用于高亮可攻击的敌人）
+        
+        Returns:
+            与敌人一一对应的能否击败
+        """
+        enemy_values = self.get_enemy_values()
+        reachable = Solver.solvable_targets([self.hand], enemy_values,
+                                            exclude_card=self.spade_king)[0]
+        return [value in reachable for value in enemy_values]
+    
+    def verify_expression(self, expression: str, enemy_index: int) -> ExpressionVerdict:
+        """
+        验证玩家输入的算式能否击败指定的敌人
+        
+        算式必须算出敌人的点数，并且恰好用到除黑桃K外的每张手牌一次，黑桃K
+        可用可不用（每张牌最多用一次）。算式中的数字与手牌点数按多重集合比较。
+        
+        Args:
+            expression: 玩家输入的算式（见 expression.evaluate）
+            enemy_index: 敌人的索引
+        
+        Returns:
+            验证结果
+        """
+        if not 0 <= enemy_index < len(self.enemies):
+            return ExpressionVerdict(False, '无效的敌人索引')
+        target_value = self.get_enemy_values()[enemy_index]
+        
+        try:
+            parsed = evaluate(expression)
+        except ExpressionError as e:
+            return ExpressionVerdict(False, f'算式无效: {e}', target_value=target_value)
+        
+        verdict = ExpressionVerdict(False, value=parsed.value, target_value=target_value,
+                                    operands=parsed.operands)
+        if parsed.value != target_value:
+            verdict.error = f'计算结果 {parsed.value} 不等于目标点数 {target_value}'
+            return verdict
+        
+        required = Counter()
+        optional = Counter()
+        for card, value in zip(self.hand, self.get_hand_values()):
+            (optional if card.is_spade_king() else required)[value] += 1
+        used = Counter(parsed.operands)
+        verdict.missing = sorted((required - used).elements())
+        verdict.extra = sorted((used - required - optional).elements())
+        
+        if verdict.missing:
+            verdict.error = f'未使用所有必须的手牌（缺少点数: {verdict.missing}）'
+        elif verdict.extra:
+            verdict.error = f'使用了不在手牌中的点数（或用了多于手牌的次数）: {verdict.extra}'
+        else:
+            verdict.valid = True
+        return verdict
+    
     def defeat_enemy(self, enemy_index: int, skip_validation: bool = False) -> bool:
         """
         击败指定的敌人（立即将敌人加入手牌，然后需要丢弃手牌）
@@ -121,6 +370,7 @@ class Game:
         # 移除敌人并立即加入手牌
         defeated_enemy = self.enemies.pop(enemy_index)
         self.hand.append(defeated_enemy)
+        self._invalidate_values()
         
         # 注意：不立即刷新敌人牌，需要先丢弃一张手牌
         # 刷新敌人牌会在discard_card中完成
@@ -130,6 +380,7 @@ class Game:
             self.is_game_over = True
             self.is_victory = True
         
+        self.actions.append(enemy_index)
         return True
     
     def discard_card(self, card_index: int) -> bool:
@@ -153,12 +404,164 @@ class Game:
         
         # 丢弃牌
         self.hand.pop(card_index)
+        self._hand_values = None
         
         # 刷新敌人牌（补充到4个敌人）
         self._refresh_enemies()
         
+        self.actions.append(_ACTION_DISCARD | card_index)
         return True
     
+    def recommend_discard(self) -> List[Tuple[int, float]]:
+        """
+        给每张可以丢弃的手牌打分（击败敌人后选择丢弃哪张牌时使用）
+        
+        得分是丢弃这张牌、翻开新的敌人之后，用剩下的手牌能击败的敌人数量的
+        期望值。新翻开的牌按牌堆中剩余的牌精确计算概率（大小王的点数按翻开
+        后的敌人为上下文），不偷看牌堆的顺序。所有候选手牌一起求解，相同的
+        部分只计算一次。
+        
+        Returns:
+            [(手牌的索引, 期望能击败的敌人数)]，按得分从高到低排列（得分相同时
+            按索引排列）；没有可丢弃的牌时为空列表
+        """
+        candidates = [i for i, card in enumerate(self.hand) if not card.is_spade_king()]
+        if not candidates:
+            return []
+        
+        # 丢弃后补充敌人时翻开的张数，以及各种翻牌结果（按点数合并）和概率
+        draws = min(max(4 - len(self.enemies), 0), len(self.deck))
+        kinds = {}
+        for card in self.deck:
+            key = (card.rank, card.is_big_joker)
+            count = kinds.get(key, (card, 0))[1]
+            kinds[key] = (card, count + 1)
+        kinds = list(kinds.values())
+        total = comb(len(self.deck), draws)
+        outcomes = []
+        for picked in combinations_with_replacement(range(len(kinds)), draws):
+            weight = 1
+            for kind, count in Counter(picked).items():
+                weight *= comb(kinds[kind][1], count)
+            if weight:
+                enemies = self.enemies + [kinds[kind][0] for kind in picked]
+                outcomes.append((Card.resolve_values(enemies), weight / total))
+        
+        hands = [self.hand[:i] + self.hand[i + 1:] for i in candidates]
+        targets = sorted({value for values, _ in outcomes for value in values})
+        reachable = Solver.solvable_targets(hands, targets, exclude_card=self.spade_king)
+        
+        scores = []
+        for index, solvable in zip(candidates, reachable):
+            expected = sum(probability * sum(value in solvable for value in values)
+                           for values, probability in outcomes)
+            scores.append((index, expected))
+        scores.sort(key=lambda item: -item[1])
+        return scores
+    
+    @property
+    def version(self) -> int:
+        """
+        状态的版本号：每次成功击败敌人或丢弃手牌加1（即操作记录的长度）
+        
+        用于网页版的ETag和增量响应。
+        """
+        return len(self.actions)
+    
+    def get_action_log(self) -> bytes:
+        """
+        获取紧凑的操作记录（每个成功的操作一个字节）
+        
+        击败敌人记为敌人的索引，丢弃手牌记为 0x80 | 手牌的索引。
+        用 replay(seed, 操作记录) 可以重建完全相同的游戏。
+        """
+        return bytes(self.actions)
+    
+    @staticmethod
+    def replay(seed: int, actions: bytes) -> 'Game':
+        """
+        由随机种子和操作记录重建游戏
+        
+        Args:
+            seed: 游戏的随机种子
+            actions: get_action_log 返回的操作记录
+        
+        Returns:
+            与记录时状态完全相同的游戏
+        
+        Raises:
+            ValueError: 操作记录与这个种子发出的牌不符
+        """
+        game = Game(seed)
+        for action in actions:
+            if action & _ACTION_DISCARD:
+                ok = game.discard_card(action & ~_ACTION_DISCARD)
+            else:
+                # 记录中的击败操作当时已经验证过，重放时不再求解
+                ok = (0 <= action < len(game.enemies)
+                      and game.defeat_enemy(action, skip_validation=True))
+            if not ok:
+                raise ValueError(f"无法重放操作记录（操作 {action:#04x}）")
+        return game
+    
+    def to_bytes(self) -> bytes:
+        """
+        导出紧凑的二进制快照（16字节头 + 每张牌1字节 + 每个操作1字节，一局游戏约100字节）
+        
+        Returns:
+            可以用 from_bytes 还原的字节串
+        """
+        flags = ((_FLAG_GAME_OVER if self.is_game_over else 0)
+                 | (_FLAG_VICTORY if self.is_victory else 0))
+        header = _SNAPSHOT_HEADER.pack(
+            _SNAPSHOT_VERSION, flags, self.kings_defeated,
+            len(self.deck), len(self.hand), len(self.enemies),
+            self.seed, len(self.actions)
+        )
+        cards = list(self.deck) + self.hand + self.enemies
+        return header + bytes(card.to_index() for card in cards) + bytes(self.actions)
+    
+    @staticmethod
+    def from_bytes(data: bytes) -> 'Game':
+        """
+        由 to_bytes 导出的快照还原游戏
+        
+        Args:
+            data: to_bytes 的返回值
+        
+        Returns:
+            游戏对象
+        
+        Raises:
+            ValueError: 快照版本不支持或长度不正确
+        """
+        version = data[0] if data else None
+        if version != _SNAPSHOT_VERSION:
+            raise ValueError(f"不支持的游戏快照版本: {version}")
+        header = _SNAPSHOT_HEADER
+        if len(data) < header.size:
+            raise ValueError("游戏快照长度不正确")
+        (_, flags, kings_defeated, deck_size, hand_size, enemy_count,
+         seed, action_count) = header.unpack_from(data)
+        card_count = deck_size + hand_size + enemy_count
+        if len(data) != header.size + card_count + action_count:
+            raise ValueError("游戏快照长度不正确")
+        cards = data[header.size:header.size + card_count]
+        actions = data[header.size + card_count:]
+        
+        game = Game.__new__(Game)
+        game.deck = Deck(Card.from_index(index) for index in cards[:deck_size])
+        game.hand = [Card.from_index(index) for index in cards[deck_size:deck_size + hand_size]]
+        game.enemies = [Card.from_index(index) for index in cards[deck_size + hand_size:]]
+        game.spade_king = next((c for c in game.hand if c.is_spade_king()), None)
+        game.kings_defeated = kings_defeated
+        game.is_game_over = bool(flags & _FLAG_GAME_OVER)
+        game.is_victory = bool(flags & _FLAG_VICTORY)
+        game.seed = seed
+        game.actions = list(actions)
+        game._invalidate_values()
+        return game
+    
     def get_game_state(self) -> dict:
         """获取游戏状态"""
         return {
@@ -167,6 +570,7 @@ class Game:
             'kings_defeated': self.kings_defeated,
             'is_game_over': self.is_game_over,
             'is_victory': self.is_victory,
-            'deck_size': len(self.deck)
+            'deck_size': len(self.deck),
+            'seed': self.seed
         }
 
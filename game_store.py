@@ -0,0 +1,436 @@
+"""
+游戏存储
+
+网页版用 gunicorn 启动多个工作进程，同一局游戏的请求可能落到任何一个进程上，
+所以游戏不能只保存在某个进程的内存里。GameStore 定义了存取游戏的接口：
+
+- MemoryGameStore: 保存在当前进程内存中（单进程开发环境）
+- SQLiteGameStore: 保存在SQLite数据库文件中，同一台机器上的所有工作进程共享，
+  进程重启后游戏也不会丢失
+
+修改游戏时用 edit() 取出游戏并持有该局游戏的锁，同一局游戏的并发请求依次执行，
+不同的游戏互不影响。
+
+被放弃的游戏不会一直占用内存/磁盘：超过 ttl 秒没有访问的游戏由后台清理线程
+删除，游戏数量超过 max_games 时淘汰最久没有访问的游戏（LRU）。
+
+通过环境变量 GAME_STORE 选择后端（memory / sqlite），SQLite数据库文件的路径由
+GAME_STORE_PATH 指定；GAME_TTL、GAME_MAX_GAMES、GAME_SWEEP_INTERVAL 配置淘汰策略。
+"""
+import os
+import secrets
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from game import Game
+
+try:
+    import fcntl
+except ImportError:  # Windows没有fcntl，只能做进程内加锁
+    fcntl = None
+
+DEFAULT_DB_PATH = os.path.join(tempfile.gettempdir(), 'heartbreaker_games.db')
+DEFAULT_TTL = 2 * 60 * 60  # 游戏闲置2小时后删除
+DEFAULT_MAX_GAMES = 10000
+DEFAULT_SWEEP_INTERVAL = 60
+
+
+def estimate_game_size(game: Game) -> int:
+    """
+    估算一局游戏在内存中占用的字节数（游戏对象和牌列表；牌对象是所有游戏
+    共享的，不计入）
+    """
+    size = sys.getsizeof(game) + sys.getsizeof(game.__dict__)
+    for cards in (game.deck, game.hand, game.enemies, game.actions):
+        size += sys.getsizeof(cards)
+    return size
+
+
+class GameStore:
+    """
+    游戏存储接口
+
+    子类实现 get / save / delete / lock / sweep / count，
+    expired/evicted 只统计当前进程删除的游戏。
+    """
+
+    backend = None  # 后端名称，见 create_store
+
+    def __init__(self, ttl: Optional[float] = DEFAULT_TTL,
+                 max_games: Optional[int] = DEFAULT_MAX_GAMES):
+        """
+        Args:
+            ttl: 游戏闲置多少秒后删除（None表示不过期）
+            max_games: 最多保存的游戏数量，超出时淘汰最久没有访问的游戏（None表示不限制）
+        """
+        self.ttl = ttl
+        self.max_games = max_games
+        self.expired = 0  # 因闲置过期删除的游戏数
+        self.evicted = 0  # 因数量超出上限淘汰的游戏数
+        self._sweeper = None
+        self._stop_sweeper = threading.Event()
+
+    def create(self, game: Game) -> str:
+        """
+        保存一局新游戏
+
+        Args:
+            game: 游戏对象
+
+        Returns:
+            游戏ID（随机令牌，不能被猜到，也不会像 id(game) 那样被重复使用）
+        """
+        game_id = secrets.token_urlsafe(16)
+        self.save(game_id, game)
+        return game_id
+
+    def get(self, game_id: str) -> Optional[Game]:
+        """
+        读取游戏（只用于读取；修改游戏请使用 edit，修改才会被保存）
+
+        Returns:
+            游戏对象，不存在时返回None
+        """
+        raise NotImplementedError
+
+    def save(self, game_id: str, game: Game):
+        """保存游戏"""
+        raise NotImplementedError
+
+    def delete(self, game_id: str):
+        """删除游戏"""
+        raise NotImplementedError
+
+    def lock(self, game_id: str):
+        """
+        获取一局游戏的锁（上下文管理器），持有期间其他请求不能修改这局游戏
+        """
+        raise NotImplementedError
+
+    @contextmanager
+    def edit(self, game_id: str) -> Iterator[Optional[Game]]:
+        """
+        加锁读取游戏，退出时保存修改
+
+        用法：
+            with store.edit(game_id) as game:
+                if game is None:
+                    ...  # 游戏不存在
+                game.discard_card(0)
+
+        代码块中抛出异常时不保存。
+
+        Yields:
+            游戏对象，不存在时为None
+        """
+        with self.lock(game_id):
+            game = self.get(game_id)
+            yield game
+            if game is not None:
+                self.save(game_id, game)
+
+    def sweep(self) -> int:
+        """
+        删除闲置超过ttl秒的游戏
+
+        Returns:
+            删除的游戏数
+        """
+        raise NotImplementedError
+
+    def count(self) -> int:
+        """当前保存的游戏数"""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        """存储的统计信息（游戏数量、内存/磁盘占用估计、淘汰次数等）"""
+        return {
+            'backend': self.backend,
+            'games': self.count(),
+            'max_games': self.max_games,
+            'ttl': self.ttl,
+            'expired': self.expired,
+            'evicted': self.evicted
+        }
+
+    def start_sweeper(self, interval: float = DEFAULT_SWEEP_INTERVAL):
+        """
+        启动后台清理线程，每隔interval秒删除一次过期的游戏（重复调用无效）
+        """
+        if self._sweeper is not None or self.ttl is None:
+            return
+
+        def run():
+            while not self._stop_sweeper.wait(interval):
+                try:
+                    self.sweep()
+                except Exception:
+                    # 清理失败（例如数据库暂时被锁）不影响下一轮
+                    pass
+
+        self._sweeper = threading.Thread(target=run, name='game-store-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        """停止后台清理线程"""
+        if self._sweeper is not None:
+            self._stop_sweeper.set()
+            self._sweeper.join()
+            self._sweeper = None
+            self._stop_sweeper.clear()
+
+    def __contains__(self, game_id: str) -> bool:
+        return self.get(game_id) is not None
+
+
+class _LockTable:
+    """按键（游戏ID或锁文件中的字节）分配的进程内锁（不再使用的锁会被回收）"""
+
+    def __init__(self):
+        self._locks = {}  # 键 -> [锁, 使用者数量]
+        self._guard = threading.Lock()
+
+    @contextmanager
+    def hold(self, key):
+        """持有一个键的锁"""
+        with self._guard:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+
+class MemoryGameStore(GameStore):
+    """
+    保存在当前进程内存中的游戏（多个工作进程之间不共享）
+
+    游戏按最后访问时间排列在OrderedDict中，最久没有访问的在最前面，
+    过期清理和LRU淘汰都只需要从头部开始删除。
+    """
+
+    backend = 'memory'
+
+    # 估算内存占用时最多抽样的游戏数
+    SIZE_SAMPLE = 100
+
+    def __init__(self, ttl: Optional[float] = DEFAULT_TTL,
+                 max_games: Optional[int] = DEFAULT_MAX_GAMES):
+        super().__init__(ttl, max_games)
+        self._games = OrderedDict()  # 游戏ID -> (游戏, 最后访问时间)
+        self._guard = threading.Lock()
+        self._locks = _LockTable()
+
+    def get(self, game_id: str) -> Optional[Game]:
+        with self._guard:
+            entry = self._games.get(game_id)
+            if entry is None:
+                return None
+            self._games[game_id] = (entry[0], time.monotonic())
+            self._games.move_to_end(game_id)
+            return entry[0]
+
+    def save(self, game_id: str, game: Game):
+        with self._guard:
+            self._games[game_id] = (game, time.monotonic())
+            self._games.move_to_end(game_id)
+            if self.max_games is not None:
+                while len(self._games) > self.max_games:
+                    self._games.popitem(last=False)
+                    self.evicted += 1
+
+    def delete(self, game_id: str):
+        with self._guard:
+            self._games.pop(game_id, None)
+
+    def lock(self, game_id: str):
+        return self._locks.hold(game_id)
+
+    def sweep(self) -> int:
+        if self.ttl is None:
+            return 0
+        deadline = time.monotonic() - self.ttl
+        removed = 0
+        with self._guard:
+            while self._games:
+                game_id, (_, accessed_at) = next(iter(self._games.items()))
+                if accessed_at >= deadline:
+                    break
+                del self._games[game_id]
+                removed += 1
+            self.expired += removed
+        return removed
+
+    def count(self) -> int:
+        return len(self._games)
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        with self._guard:
+            sample = [game for game, _ in list(self._games.values())[-self.SIZE_SAMPLE:]]
+        # 抽样最近访问的游戏估算平均大小，再乘以游戏数量
+        average = sum(estimate_game_size(game) for game in sample) / len(sample) if sample else 0
+        stats['memory_bytes'] = int(average * stats['games'])
+        return stats
+
+
+class SQLiteGameStore(GameStore):
+    """
+    保存在SQLite数据库文件中的游戏（同一台机器上的所有进程共享）
+
+    游戏状态用 Game.to_bytes 导出为紧凑的二进制快照（每张牌一个字节）。
+    每局游戏的锁由两部分组成：进程内的线程锁，以及锁文件上按游戏ID划分的
+    fcntl字节范围锁（不同进程之间）；不同的游戏通常落在不同的字节上，互不阻塞。
+    """
+
+    backend = 'sqlite'
+
+    # 锁文件中用于划分游戏锁的字节数（不同游戏落到同一字节时只是多等一会儿）
+    LOCK_SLOTS = 1 << 16
+
+    # 读取游戏时，最后访问时间超过这么多秒才更新（避免每次读取都写数据库）
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, ttl: Optional[float] = DEFAULT_TTL,
+                 max_games: Optional[int] = DEFAULT_MAX_GAMES):
+        """
+        Args:
+            path: 数据库文件路径（锁文件为 path + '.lock'）
+            ttl: 游戏闲置多少秒后删除（None表示不过期）
+            max_games: 最多保存的游戏数量（None表示不限制）
+        """
+        super().__init__(ttl, max_games)
+        self.path = path
+        self._local = threading.local()
+        self._locks = _LockTable()
+        self._lock_fd = None
+        if fcntl is not None:
+            self._lock_fd = os.open(path + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        with self._connection() as conn:
+            # updated_at 为最后访问时间（保存或读取）
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS games ('
+                'id TEXT PRIMARY KEY, state BLOB NOT NULL, updated_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS games_updated_at ON games (updated_at)')
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        当前线程的数据库连接（sqlite3连接不能跨线程使用，也不能在fork出的
+        子进程中继续使用，例如 gunicorn --preload）
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, game_id: str) -> Optional[Game]:
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT state, updated_at FROM games WHERE id = ?', (game_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[1] > self.TOUCH_INTERVAL:
+            with conn:
+                conn.execute('UPDATE games SET updated_at = ? WHERE id = ?', (now, game_id))
+        return Game.from_bytes(row[0])
+
+    def save(self, game_id: str, game: Game):
+        state = game.to_bytes()
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO games (id, state, updated_at) VALUES (?, ?, ?)',
+                (game_id, state, time.time())
+            )
+            if self.max_games is not None:
+                # 超出上限时删除最久没有访问的游戏
+                excess = conn.execute('SELECT COUNT(*) FROM games').fetchone()[0] - self.max_games
+                if excess > 0:
+                    cursor = conn.execute(
+                        'DELETE FROM games WHERE id IN '
+                        '(SELECT id FROM games ORDER BY updated_at LIMIT ?)', (excess,)
+                    )
+                    self.evicted += cursor.rowcount
+
+    def delete(self, game_id: str):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM games WHERE id = ?', (game_id,))
+
+    def sweep(self) -> int:
+        if self.ttl is None:
+            return 0
+        with self._connection() as conn:
+            cursor = conn.execute('DELETE FROM games WHERE updated_at < ?',
+                                  (time.time() - self.ttl,))
+        self.expired += cursor.rowcount
+        return cursor.rowcount
+
+    def count(self) -> int:
+        return self._connection().execute('SELECT COUNT(*) FROM games').fetchone()[0]
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        conn = self._connection()
+        stats['state_bytes'] = conn.execute(
+            'SELECT COALESCE(SUM(LENGTH(state)), 0) FROM games'
+        ).fetchone()[0]
+        page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        stats['disk_bytes'] = page_count * page_size
+        return stats
+
+    @contextmanager
+    def lock(self, game_id: str):
+        # fcntl锁属于整个进程：同一进程内的线程对同一字节加锁会直接成功，任何一个
+        # 线程解锁都会释放这个字节。所以线程锁也按字节（而不是游戏ID）划分，
+        # 同一进程内同时只有一个线程持有某个字节，再用fcntl锁跨进程互斥
+        slot = zlib.crc32(game_id.encode()) % self.LOCK_SLOTS
+        with self._locks.hold(slot):
+            if self._lock_fd is None:
+                yield
+                return
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_EX, 1, slot)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, slot)
+
+
+def create_store(backend: Optional[str] = None, path: Optional[str] = None) -> GameStore:
+    """
+    按配置创建游戏存储
+
+    Args:
+        backend: 'memory' 或 'sqlite'（默认读取环境变量 GAME_STORE，未设置时为memory）
+        path: SQLite数据库文件路径（默认读取环境变量 GAME_STORE_PATH）
+
+    Returns:
+        游戏存储对象（ttl和max_games读取环境变量 GAME_TTL、GAME_MAX_GAMES，0表示不限制）
+    """
+    backend = (backend or os.environ.get('GAME_STORE', 'memory')).lower()
+    ttl = float(os.environ.get('GAME_TTL', DEFAULT_TTL)) or None
+    max_games = int(os.environ.get('GAME_MAX_GAMES', DEFAULT_MAX_GAMES)) or None
+    if backend == 'memory':
+        return MemoryGameStore(ttl, max_games)
+    if backend == 'sqlite':
+        return SQLiteGameStore(path or os.environ.get('GAME_STORE_PATH', DEFAULT_DB_PATH),
+                               ttl, max_games)
+    raise ValueError(f"未知的游戏存储后端: {backend}")
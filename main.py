@@ -90,7 +90,7 @@ def main():
         if solution:
             # 显示解决方案
             enemy = game.enemies[enemy_index]
-            enemy_value = enemy.get_numeric_value(game.enemies)
+            enemy_value = game.get_enemy_values()[enemy_index]
             display_solution(solution, enemy_value)
             
             # 确认攻击
@@ -120,10 +120,14 @@ def main():
                             discardable_indices.append(i + 1)
                     
                     if len(discardable_indices) > 0:
-                        print("\n可丢弃的手牌:")
+                        # 按丢弃后期望能击败的敌人数推荐
+                        advice = dict(game.recommend_discard())
+                        best = max(advice, key=advice.get)
+                        print("\n可丢弃的手牌（括号内为丢弃后期望能击败的敌人数）:")
                         for i, card in enumerate(game.hand):
                             if not card.is_spade_king():
-                                print(f"  {i + 1}. {card}")
+                                marker = " ← 推荐" if i == best else ""
+                                print(f"  {i + 1}. {card} ({advice[i]:.2f}){marker}")
                         
                         discard_choice = get_user_choice(
                             "请选择要丢弃的手牌编号: ",
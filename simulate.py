@@ -0,0 +1,495 @@
+"""
+无界面批量模拟游戏
+
+    python simulate.py --games 1000                       # 贪心策略，多进程模拟1000局
+    python simulate.py --games 200 --policy lookahead --output lookahead.jsonl
+    python simulate.py --games 500 --policy random --workers 1 --no-validate
+
+每局游戏的结果（一行一个JSON）在完成时立即写入输出文件，最后打印胜率、
+游戏长度和求解耗时的汇总。每局游戏的种子由 --seed 确定，结果中的种子和
+操作记录可以用 Game.replay 重现整局游戏。
+
+estimate_win_probability 用同样的策略从当前局面随机模拟（蒙特卡洛）估计胜率。
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from card import Card
+from game import Deck, Game
+from solver import Solver
+from stats import percentile
+
+DEFAULT_OUTPUT = 'simulation.jsonl'
+# 每个子进程任务包含的游戏局数（减少进程间通信的次数）
+DEFAULT_CHUNK_SIZE = 20
+
+# 游戏结果
+RESULT_VICTORY = 'victory'  # 击败了三个K
+RESULT_STUCK = 'stuck'      # 没有能击败的敌人
+
+# 丢弃前的手牌数（击败敌人后手牌比这多一张，需要先丢弃）
+_HAND_SIZE = 5
+
+# 胜率估计默认的模拟次数和时间预算（秒）
+DEFAULT_SAMPLES = 200
+DEFAULT_TIME_BUDGET = 1.0
+# 置信区间的置信水平和对应的z值
+CONFIDENCE_LEVEL = 0.95
+CONFIDENCE_Z = 1.96
+
+
+class Policy:
+    """
+    出牌策略
+
+    每局游戏创建一个新的策略对象。子类实现 choose_attack 和 choose_discard。
+    """
+
+    name = None  # 策略名称，见 POLICIES
+
+    def __init__(self, rng: random.Random, memo: Optional[dict] = None):
+        """
+        Args:
+            rng: 策略使用的随机数生成器（由游戏种子创建，模拟结果可以重现）
+            memo: 能否击败的查询结果缓存（多局模拟共用一个字典时可以复用查询结果）
+        """
+        self.rng = rng
+        self.memo = {} if memo is None else memo
+
+    def attackable(self, hand: List[Card], spade_king: Card, enemies: List[Card]) -> List[bool]:
+        """
+        判断用给定的手牌能否击败每个敌人（查表，不生成表达式）
+
+        Args:
+            hand: 手牌
+            spade_king: 黑桃K（可用可不用）
+            enemies: 敌人牌（大小王以这些敌人为上下文）
+
+        Returns:
+            与敌人一一对应的列表
+        """
+        cards = tuple(sorted(card.id for card in hand))
+        result = []
+        for value in Card.resolve_values(enemies):
+            key = (cards, value)
+            ok = self.memo.get(key)
+            if ok is None:
+                ok = self.memo[key] = Solver.is_solvable(hand, value, exclude_card=spade_king)
+            result.append(ok)
+        return result
+
+    def choose_attack(self, game: Game) -> Optional[int]:
+        """
+        选择要攻击的敌人
+
+        Returns:
+            敌人的索引（必须能击败），没有能击败的敌人时返回None
+        """
+        raise NotImplementedError
+
+    def choose_discard(self, game: Game) -> int:
+        """
+        击败敌人后选择要丢弃的手牌
+
+        Returns:
+            手牌的索引（不能是黑桃K）
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _discardable(hand: List[Card]) -> List[int]:
+        """可以丢弃的手牌的索引（除黑桃K外）"""
+        return [i for i, card in enumerate(hand) if not card.is_spade_king()]
+
+
+class RandomPolicy(Policy):
+    """随机攻击一个能击败的敌人，随机丢弃一张手牌"""
+
+    name = 'random'
+
+    def choose_attack(self, game: Game) -> Optional[int]:
+        attackable = self.attackable(game.hand, game.spade_king, game.enemies)
+        targets = [i for i, ok in enumerate(attackable) if ok]
+        return self.rng.choice(targets) if targets else None
+
+    def choose_discard(self, game: Game) -> int:
+        return self.rng.choice(self._discardable(game.hand))
+
+
+class GreedyPolicy(Policy):
+    """
+    贪心策略：能击败K时优先击败K，否则击败点数最大的敌人；
+    丢弃后使剩下的敌人中能击败的最多的那张手牌
+    """
+
+    name = 'greedy'
+
+    def choose_attack(self, game: Game) -> Optional[int]:
+        attackable = self.attackable(game.hand, game.spade_king, game.enemies)
+        values = game.get_enemy_values()
+        best = None
+        for i, ok in enumerate(attackable):
+            if not ok:
+                continue
+            key = (game.enemies[i].is_king(), values[i])
+            if best is None or key > best[0]:
+                best = (key, i)
+        return best[1] if best else None
+
+    def choose_discard(self, game: Game) -> int:
+        best = None
+        for i in self._discardable(game.hand):
+            hand = game.hand[:i] + game.hand[i + 1:]
+            score = sum(self.attackable(hand, game.spade_king, game.enemies))
+            if best is None or score > best[0]:
+                best = (score, i)
+        return best[1]
+
+
+class LookaheadPolicy(Policy):
+    """
+    向前看一步：同时选择攻击的敌人和随后丢弃的手牌
+
+    对每个能击败的敌人和每种丢弃方式，评估之后剩下的敌人中能击败的K和
+    敌人的数量（只使用已经翻开的牌，不偷看牌堆），取得分最高的组合。
+    """
+
+    name = 'lookahead'
+
+    def __init__(self, rng: random.Random, memo: Optional[dict] = None):
+        super().__init__(rng, memo)
+        self._planned_discard = None  # choose_attack 选好的要丢弃的牌
+
+    def choose_attack(self, game: Game) -> Optional[int]:
+        best = None
+        for i, ok in enumerate(self.attackable(game.hand, game.spade_king, game.enemies)):
+            if not ok:
+                continue
+            enemy = game.enemies[i]
+            remaining = game.enemies[:i] + game.enemies[i + 1:]
+            hand = game.hand + [enemy]
+            for j in self._discardable(hand):
+                kept = hand[:j] + hand[j + 1:]
+                attackable = self.attackable(kept, game.spade_king, remaining)
+                kings = sum(ok and card.is_king() for ok, card in zip(attackable, remaining))
+                score = (enemy.is_king(), kings, sum(attackable))
+                if best is None or score > best[0]:
+                    best = (score, i, hand[j])
+        if best is None:
+            return None
+        self._planned_discard = best[2]
+        return best[1]
+
+    def choose_discard(self, game: Game) -> int:
+        if self._planned_discard in game.hand:
+            return game.hand.index(self._planned_discard)
+        return self._discardable(game.hand)[0]
+
+
+# 策略名称 -> 策略类
+POLICIES: Dict[str, type] = {
+    policy.name: policy for policy in (GreedyPolicy, RandomPolicy, LookaheadPolicy)
+}
+
+
+def play_game(seed: int, policy: str = GreedyPolicy.name, validate: bool = True) -> dict:
+    """
+    用指定的策略玩一局游戏
+
+    Args:
+        seed: 游戏的随机种子
+        policy: 策略名称（见 POLICIES）
+        validate: 击败敌人时是否用求解器验证（求出表达式，与网页请求的负载相同）；
+                  否则只使用策略的查表结果
+
+    Returns:
+        这局游戏的结果：种子、策略、结果、已击败的K、击败的敌人数、牌堆剩余张数、
+        决策和求解的耗时（毫秒）以及操作记录（十六进制，见 Game.get_action_log）
+
+    Raises:
+        RuntimeError: 策略选择的敌人无法击败，或选择的手牌无法丢弃
+    """
+    game = Game(seed)
+    turns, decision_time, solver_time = _play_out(
+        game, POLICIES[policy](random.Random(seed)), validate
+    )
+    return {
+        'seed': seed,
+        'policy': policy,
+        'result': RESULT_VICTORY if game.is_victory else RESULT_STUCK,
+        'kings_defeated': game.kings_defeated,
+        'turns': turns,
+        'deck_left': len(game.deck),
+        'decision_ms': round(decision_time * 1000, 3),
+        'solver_ms': round(solver_time * 1000, 3),
+        'actions': game.get_action_log().hex(),
+    }
+
+
+def _play_out(game: Game, player: Policy, validate: bool) -> Tuple[int, float, float]:
+    """
+    用策略把游戏玩到结束（胜利或没有能击败的敌人）
+
+    游戏可以从任意局面开始，包括击败敌人后还没有丢弃手牌的局面。
+
+    Returns:
+        (击败的敌人数, 决策耗时, 求解耗时)，耗时单位为秒
+
+    Raises:
+        RuntimeError: 策略选择的敌人无法击败，或选择的手牌无法丢弃
+    """
+    turns = 0
+    decision_time = 0.0
+    solver_time = 0.0
+
+    while not game.is_game_over:
+        if len(game.hand) > _HAND_SIZE:
+            start = time.perf_counter()
+            card_index = player.choose_discard(game)
+            decision_time += time.perf_counter() - start
+            if not game.discard_card(card_index):
+                raise RuntimeError(
+                    f"种子 {game.seed}：策略 {player.name} 选择的手牌 {card_index} 无法丢弃"
+                )
+
+        start = time.perf_counter()
+        enemy_index = player.choose_attack(game)
+        decision_time += time.perf_counter() - start
+        if enemy_index is None:
+            break
+
+        start = time.perf_counter()
+        defeated = game.defeat_enemy(enemy_index, skip_validation=not validate)
+        solver_time += time.perf_counter() - start
+        if not defeated:
+            raise RuntimeError(
+                f"种子 {game.seed}：策略 {player.name} 选择的敌人 {enemy_index} 无法击败"
+            )
+        turns += 1
+
+    return turns, decision_time, solver_time
+
+
+def _play_batch(seeds: List[int], policy: str, validate: bool) -> List[dict]:
+    """在子进程中连续玩多局游戏"""
+    return [play_game(seed, policy, validate) for seed in seeds]
+
+
+def game_seeds(games: int, seed: int) -> List[int]:
+    """由总种子生成每局游戏的种子"""
+    rng = random.Random(seed)
+    return [rng.getrandbits(64) for _ in range(games)]
+
+
+def simulate(games: int, policy: str = GreedyPolicy.name, seed: int = 0,
+             workers: Optional[int] = None, validate: bool = True,
+             chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[dict]:
+    """
+    批量模拟游戏，每完成一批就产出这一批的结果
+
+    Args:
+        games: 游戏局数
+        policy: 策略名称（见 POLICIES）
+        seed: 总种子（决定每局游戏的种子）
+        workers: 进程数（默认为CPU核数，1表示在当前进程中运行）
+        validate: 击败敌人时是否用求解器验证，见 play_game
+        chunk_size: 每个子进程任务包含的游戏局数
+
+    Returns:
+        每局游戏结果的迭代器（多进程时按完成的顺序，不是种子的顺序）
+    """
+    seeds = game_seeds(games, seed)
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        for game_seed in seeds:
+            yield play_game(game_seed, policy, validate)
+        return
+
+    chunks = [seeds[i:i + chunk_size] for i in range(0, len(seeds), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_play_batch, chunk, policy, validate) for chunk in chunks]
+        try:
+            for future in as_completed(futures):
+                yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def wilson_interval(wins: int, samples: int, z: float = CONFIDENCE_Z) -> Tuple[float, float]:
+    """
+    胜率的Wilson置信区间（样本少或胜率接近0/1时比正态近似可靠）
+
+    Args:
+        wins: 胜利的局数
+        samples: 模拟的局数
+        z: 置信水平对应的z值（默认95%）
+
+    Returns:
+        (下限, 上限)；没有样本时为(0, 1)
+    """
+    if samples <= 0:
+        return 0.0, 1.0
+    p = wins / samples
+    denominator = 1 + z * z / samples
+    center = (p + z * z / (2 * samples)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / samples + z * z / (4 * samples * samples)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def estimate_win_probability(game: Game, samples: int = DEFAULT_SAMPLES,
+                             time_budget: Optional[float] = DEFAULT_TIME_BUDGET,
+                             policy: str = GreedyPolicy.name,
+                             seed: Optional[int] = None) -> dict:
+    """
+    蒙特卡洛估计当前局面的胜率
+
+    牌堆的顺序对玩家是未知的：每次模拟随机打乱牌堆中剩下的牌（手牌和翻开的
+    敌人不变），用策略玩到结束（只查表，不求表达式）。每次模拟之后检查时间
+    预算，用完时返回已有样本的估计。所有模拟共用一个能否击败的查询缓存，
+    相同的手牌和敌人点数只查一次。
+
+    Args:
+        game: 游戏（不会被修改）
+        samples: 最多模拟的局数
+        time_budget: 时间预算，单位秒（None表示不限制；至少模拟一局）
+        policy: 模拟使用的策略名称（见 POLICIES）
+        seed: 打乱牌堆使用的随机种子（None表示随机）
+
+    Returns:
+        {probability, low, high, confidence, samples, wins, policy, elapsed_ms,
+         budget_exhausted}，low/high 为Wilson置信区间
+    """
+    start = time.perf_counter()
+    rng = random.Random(seed)
+    snapshot = game.to_bytes()
+    unseen = list(game.deck)
+    memo = {}
+    wins = 0
+    played = 0
+    exhausted = False
+
+    if game.is_game_over:
+        # 游戏已经结束，结果是确定的（不需要模拟）
+        probability = 1.0 if game.is_victory else 0.0
+        low = high = probability
+    else:
+        while played < samples:
+            if (played and time_budget is not None
+                    and time.perf_counter() - start >= time_budget):
+                exhausted = True
+                break
+            rollout = Game.from_bytes(snapshot)
+            rng.shuffle(unseen)
+            rollout.deck = Deck(unseen)
+            rollout.seed = None  # 打乱后的牌堆与种子无关
+            _play_out(rollout, POLICIES[policy](rng, memo), validate=False)
+            wins += rollout.is_victory
+            played += 1
+        probability = wins / played if played else 0.0
+        low, high = wilson_interval(wins, played)
+
+    return {
+        'probability': round(probability, 4),
+        'low': round(low, 4),
+        'high': round(high, 4),
+        'confidence': CONFIDENCE_LEVEL,
+        'samples': played,
+        'wins': wins,
+        'policy': policy,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 3),
+        'budget_exhausted': exhausted,
+    }
+
+
+def _distribution(values: List[float]) -> dict:
+    """均值和 p50/p95/p99"""
+    ordered = sorted(values)
+    return {
+        'mean': round(sum(ordered) / len(ordered), 3),
+        'p50': percentile(ordered, 50),
+        'p95': percentile(ordered, 95),
+        'p99': percentile(ordered, 99),
+    }
+
+
+def aggregate(records: List[dict]) -> dict:
+    """
+    汇总模拟结果
+
+    Args:
+        records: play_game 的返回值列表（非空）
+
+    Returns:
+        {games, wins, win_rate, kings_defeated: {K的数量: 局数}, turns, solver_ms,
+         decision_ms}，后三项为均值和百分位数
+    """
+    wins = sum(record['result'] == RESULT_VICTORY for record in records)
+    kings = {}
+    for record in records:
+        kings[record['kings_defeated']] = kings.get(record['kings_defeated'], 0) + 1
+    return {
+        'games': len(records),
+        'wins': wins,
+        'win_rate': round(wins / len(records), 4),
+        'kings_defeated': dict(sorted(kings.items())),
+        'turns': _distribution([record['turns'] for record in records]),
+        'solver_ms': _distribution([record['solver_ms'] for record in records]),
+        'decision_ms': _distribution([record['decision_ms'] for record in records]),
+    }
+
+
+def print_report(summary: dict, elapsed: float):
+    """打印汇总结果"""
+    print(f"局数: {summary['games']}  胜利: {summary['wins']}  胜率: {summary['win_rate']:.2%}")
+    print("已击败K的分布: " + ', '.join(
+        f"{kings}个 {count}局" for kings, count in summary['kings_defeated'].items()))
+    for key, label in (('turns', '击败敌人数'), ('solver_ms', '求解耗时(ms)'),
+                       ('decision_ms', '决策耗时(ms)')):
+        stats = summary[key]
+        print(f"{label}: 平均 {stats['mean']}  p50 {stats['p50']}  "
+              f"p95 {stats['p95']}  p99 {stats['p99']}")
+    print(f"总耗时: {elapsed:.2f}s（{summary['games'] / elapsed:.1f} 局/秒）")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='无界面批量模拟《失心王》游戏')
+    parser.add_argument('--games', type=int, default=100, help='游戏局数')
+    parser.add_argument('--policy', default=GreedyPolicy.name, choices=list(POLICIES),
+                        help='出牌策略')
+    parser.add_argument('--seed', type=int, default=0, help='总种子（决定每局游戏的种子）')
+    parser.add_argument('--workers', type=int, default=None, help='进程数（默认为CPU核数）')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='每个子进程任务包含的游戏局数')
+    parser.add_argument('--no-validate', action='store_true',
+                        help='击败敌人时不用求解器验证（只查表，模拟更快）')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT,
+                        help='每局结果的输出文件（JSON Lines）')
+    args = parser.parse_args(argv)
+    if args.games <= 0:
+        parser.error('--games 必须大于0')
+
+    records = []
+    start = time.perf_counter()
+    with open(args.output, 'w', encoding='utf-8') as f:
+        for record in simulate(args.games, args.policy, args.seed, args.workers,
+                               not args.no_validate, args.chunk_size):
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            f.flush()
+            records.append(record)
+    elapsed = time.perf_counter() - start
+
+    print_report(aggregate(records), elapsed)
+    print(f"每局结果已写入 {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,8 +2,483 @@
 四则运算求解器
 用于找到能用给定牌计算出目标值的方法
 """
+import atexit
+import ctypes
+import multiprocessing
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, CancelledError, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from enum import Enum
+from math import gcd
 from typing import List, Tuple, Optional
 from card import Card
+from solver_table import MAX_TARGET, ReachableTable
+
+# 预计算的可达点数表（import时mmap映射；表文件不存在时为None，回退到搜索）
+_TABLE = ReachableTable.load()
+
+
+class SolutionCache:
+    """
+    进程内共享的LRU求解结果缓存（线程安全）
+    
+    键只包含已经确定的点数（不包含Card对象），所以不同游戏中点数相同的
+    手牌可以共用结果；"无解"也会被缓存。
+    """
+    
+    MISSING = object()  # 缓存未命中的标记（None表示缓存的"无解"）
+    
+    def __init__(self, maxsize: int = 4096):
+        """
+        Args:
+            maxsize: 最多缓存的条目数（0表示不缓存）
+        """
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        """获取缓存结果，未命中时返回MISSING"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return SolutionCache.MISSING
+    
+    def put(self, key, value):
+        """写入缓存，超过容量时淘汰最久未使用的条目"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        """清空缓存和计数器"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+    
+    def stats(self) -> dict:
+        """缓存统计信息"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+# 进程内共享的求解结果缓存（容量可用环境变量SOLVER_CACHE_SIZE配置）
+_CACHE = SolutionCache(int(os.environ.get('SOLVER_CACHE_SIZE', 4096)))
+
+class BudgetExhausted(Exception):
+    """搜索预算用完"""
+
+
+class SearchBudget:
+    """
+    一次求解的搜索预算（节点数上限和/或时间上限）和剪枝设置，
+    同时统计展开的节点数以及每条剪枝规则去掉的节点数
+    """
+    
+    # 每展开多少个节点检查一次时间
+    CHECK_INTERVAL = 4096
+    
+    def __init__(self, max_nodes: Optional[int] = None, timeout: Optional[float] = None,
+                 prune: bool = True, control: Optional['_SearchControl'] = None):
+        """
+        Args:
+            max_nodes: 最多展开的节点数（None表示不限制）
+            timeout: 最长搜索时间，单位秒（None表示不限制）
+            prune: 是否启用剪枝规则
+            control: 并行搜索的任务共享的控制块（取消标志和整次搜索的预算），见 _SearchControl
+        """
+        self.max_nodes = max_nodes
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self.prune = prune
+        self.control = control
+        self.nodes = 0
+        # 每条剪枝规则去掉的节点数：
+        #   bound: 剩余数值的量级不可能算出任何目标值
+        #   identity: 与同一对数值的其他运算结果相同（×1与÷1、+0与-0、×0与0÷x）
+        #   symmetric: 数值相同的一对（合并后的状态与之前完全相同）
+        self.pruned = {'bound': 0, 'identity': 0, 'symmetric': 0}
+        self.exhausted = False
+        self.next_check = 0
+        self._schedule()
+    
+    def _schedule(self):
+        """计算下一次需要检查预算的节点数"""
+        next_check = float('inf')
+        if self.control is not None:
+            next_check = self.nodes + _SearchControl.CHECK_INTERVAL
+        elif self.deadline is not None:
+            next_check = self.nodes + SearchBudget.CHECK_INTERVAL
+        if self.max_nodes is not None:
+            next_check = min(next_check, self.max_nodes + 1)
+        self.next_check = next_check
+    
+    def check(self):
+        """检查预算，用完时抛出BudgetExhausted"""
+        if ((self.max_nodes is not None and self.nodes > self.max_nodes) or
+                (self.deadline is not None and time.monotonic() >= self.deadline) or
+                (self.control is not None and self.control.should_stop(self.nodes))):
+            self.exhausted = True
+            raise BudgetExhausted()
+        self._schedule()
+    
+    def remaining_nodes(self) -> Optional[int]:
+        """剩余的节点数（不限制时为None）"""
+        if self.max_nodes is None:
+            return None
+        return max(self.max_nodes - self.nodes, 0)
+    
+    def remaining_time(self) -> Optional[float]:
+        """剩余的时间，单位秒（不限制时为None）"""
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0.0)
+
+
+class SolveStatus(Enum):
+    """有预算的求解结果状态"""
+    FOUND = "found"  # 找到解
+    IMPOSSIBLE = "impossible"  # 证明无解
+    BUDGET_EXHAUSTED = "budget_exhausted"  # 预算用完，不确定是否有解
+
+
+class SolveResult:
+    """有预算的求解结果"""
+    
+    def __init__(self, status: SolveStatus, solution: Optional[Tuple[str, float]] = None,
+                 nodes: int = 0, pruned: Optional[dict] = None):
+        """
+        Args:
+            status: 结果状态
+            solution: 找到的解(表达式字符串, 计算结果)
+            nodes: 本次求解展开的节点数
+            pruned: 每条剪枝规则去掉的节点数
+        """
+        self.status = status
+        self.solution = solution
+        self.nodes = nodes
+        self.pruned = pruned or {}
+    
+    def __repr__(self):
+        return f"SolveResult({self.status.value}, {self.solution}, nodes={self.nodes})"
+
+
+# 有预算的求解（网页请求）默认的节点数上限和时间上限（0表示不限制）
+DEFAULT_MAX_NODES = int(os.environ.get('SOLVER_MAX_NODES', 0)) or None
+DEFAULT_TIMEOUT = float(os.environ.get('SOLVER_TIMEOUT', 2.0)) or None
+
+# 参与运算的牌达到该张数时使用多进程并行搜索（0表示不并行）
+PARALLEL_MIN_CARDS = int(os.environ.get('SOLVER_PARALLEL_MIN_CARDS', 7))
+# 并行搜索的进程数（默认为CPU核数）
+PARALLEL_PROCESSES = int(os.environ.get('SOLVER_PROCESSES', os.cpu_count() or 1))
+
+# 同时进行的并行搜索最多使用的共享控制块数量（都在使用时改为串行搜索），
+# 每个控制块中已展开数值多重集合表的大小（int64的个数）和线性探测的次数
+PARALLEL_SLOTS = min(PARALLEL_PROCESSES, 8)
+_SEEN_TABLE_SIZE = 1 << 21
+_SEEN_PROBES = 8
+# 少于这么多个数值的多重集合展开的代价很小（两个数值最多只有6个叶子），
+# 记录在任务自己的集合中，不占用共享的表
+_SHARED_MIN_VALUES = 3
+# 共享表中精确模式的数值编码为 分子 << 32 | 分母（分子或分母超出范围的多重集合
+# 记录在任务自己的集合中）；记录标记的低8位是数值的个数
+_EXACT_VALUE_LIMIT = 1 << 31
+_SEEN_LENGTH_BITS = 8
+_SEEN_TAG_MASK = ((1 << 63) - 1) & ~((1 << _SEEN_LENGTH_BITS) - 1)
+# 控制块布局：[取消标志, 整次搜索已展开的节点数, 已展开的多重集合表...]
+_SLOT_HEADER = 2
+_SLOT_SIZE = _SLOT_HEADER + _SEEN_TABLE_SIZE
+
+# 跨请求复用的进程池（第一次使用时创建）
+_POOL = None
+# 等待并行任务时检查进程池是否已被关闭的间隔（秒）
+_POOL_CHECK_INTERVAL = 1.0
+_POOL_LOCK = threading.Lock()
+
+# 所有控制块所在的共享内存、更新节点数用的锁（进程池的工作进程在初始化时获得）
+# 和还没有被占用的控制块（只在主进程中使用）
+_SHARED = None
+_SHARED_LOCK = None
+_FREE_SLOTS: List[int] = []
+
+
+def _init_worker(shared, lock):
+    """进程池工作进程的初始化：保存共享的控制块"""
+    global _SHARED, _SHARED_LOCK
+    _SHARED = shared
+    _SHARED_LOCK = lock
+
+
+def _get_pool() -> Optional[tuple]:
+    """
+    获取共享的进程池（单核或禁用并行时返回None）
+
+    Returns:
+        (进程池, 控制块所在的共享内存, 更新节点数用的锁)，同一次获取的三者总是配套的
+        （_reset_pool 之后 _SHARED 可能已经指向新的共享内存）
+    """
+    global _POOL, _FREE_SLOTS
+    if PARALLEL_PROCESSES <= 1:
+        return None
+    with _POOL_LOCK:
+        if _POOL is None:
+            _init_worker(multiprocessing.RawArray('q', PARALLEL_SLOTS * _SLOT_SIZE),
+                         multiprocessing.Lock())
+            _FREE_SLOTS = list(range(PARALLEL_SLOTS))
+            _POOL = ProcessPoolExecutor(max_workers=PARALLEL_PROCESSES,
+                                        initializer=_init_worker,
+                                        initargs=(_SHARED, _SHARED_LOCK))
+        return _POOL, _SHARED, _SHARED_LOCK
+
+
+def _reset_pool(pool: Optional[ProcessPoolExecutor] = None):
+    """
+    关闭进程池（例如子进程异常退出后），下次使用时重新创建
+
+    Args:
+        pool: 只在当前的进程池还是它时才关闭（已经被其他线程重建时不关闭新的）；
+              None表示关闭当前的进程池
+    """
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None and (pool is None or pool is _POOL):
+            _POOL.shutdown(wait=False, cancel_futures=True)
+            _POOL = None
+
+
+atexit.register(_reset_pool)
+
+
+def _acquire_slot(shared) -> Optional[int]:
+    """
+    在shared中占用一个空闲的控制块并清空（没有空闲的或进程池已经重建时返回None）
+    """
+    with _POOL_LOCK:
+        if shared is not _SHARED or not _FREE_SLOTS:
+            return None
+        slot = _FREE_SLOTS.pop()
+    base = slot * _SLOT_SIZE
+    item_size = ctypes.sizeof(ctypes.c_longlong)
+    ctypes.memset(ctypes.addressof(shared) + base * item_size, 0, _SLOT_SIZE * item_size)
+    return slot
+
+
+def _release_slot(shared, slot: int):
+    """归还控制块（进程池重建后旧的控制块不再归还）"""
+    with _POOL_LOCK:
+        if shared is _SHARED:
+            _FREE_SLOTS.append(slot)
+
+
+class _SearchControl:
+    """
+    一次并行搜索的所有任务共享的控制块
+
+    主进程找到所有目标值后设置取消标志；各任务每展开CHECK_INTERVAL个节点
+    把新展开的节点数加到整次搜索的总数上，并检查取消标志、总节点数上限和
+    截止时间，所以节点数和时间预算限制的是整次搜索而不是每个任务。
+    """
+
+    # 每展开多少个节点同步一次（越小超出节点数上限越少）
+    CHECK_INTERVAL = 256
+
+    def __init__(self, shared, lock, slot: int, max_nodes: Optional[int] = None,
+                 deadline: Optional[float] = None):
+        """
+        Args:
+            shared: 控制块所在的共享内存（搜索开始时获取，之后重建进程池不影响这次搜索）
+            lock: 更新节点数用的锁
+            slot: 控制块编号
+            max_nodes: 整次搜索最多展开的节点数（None表示不限制）
+            deadline: 整次搜索的截止时间，time.monotonic()的值（系统范围的单调时钟，
+                      各进程之间可以比较；None表示不限制）
+        """
+        self.shared = shared
+        self.lock = lock
+        self.slot = slot
+        self.base = slot * _SLOT_SIZE
+        self.max_nodes = max_nodes
+        self.deadline = deadline
+        self.flushed = 0
+
+    def should_stop(self, nodes: int) -> bool:
+        """
+        把本任务新展开的节点数加到总数上，返回是否需要停止
+
+        Args:
+            nodes: 本任务已展开的节点数
+        """
+        with self.lock:
+            self.shared[self.base + 1] += nodes - self.flushed
+            total = self.shared[self.base + 1]
+        self.flushed = nodes
+        return (self.shared[self.base] != 0 or
+                (self.max_nodes is not None and total > self.max_nodes) or
+                (self.deadline is not None and time.monotonic() >= self.deadline))
+
+    def cancel(self):
+        """设置取消标志（正在执行的任务在下一次同步时停止）"""
+        self.shared[self.base] = 1
+
+    @property
+    def nodes(self) -> int:
+        """整次搜索已展开的节点数"""
+        return self.shared[self.base + 1]
+
+
+class _SharedSeen(set):
+    """
+    并行搜索的任务共用的已展开数值多重集合
+
+    多重集合完整地记录在控制块的开放寻址表中（每条记录是一个标记和每个数值
+    一个int64），一个任务展开过的多重集合其他任务不再展开。标记由编码的hash和
+    数值的个数组成，标记相同时还要逐个比较数值，hash相同的不同多重集合不会被
+    当作已经展开。数值少于_SHARED_MIN_VALUES个、不能编码或探测_SEEN_PROBES次
+    仍没有空位时记录在本任务自己的集合中。
+    写入时持有锁，每条记录只写一次（先写数值再写标记）；读取不加锁，读到还没有
+    写完的记录时比较失败（编码不会是0），只会造成重复搜索。
+    """
+
+    def __init__(self, control: _SearchControl, width: int, exact: bool):
+        """
+        Args:
+            control: 这次搜索的控制块
+            width: 多重集合最多的数值个数（每条记录占 width + 1 个int64）
+            exact: 数值是否为精确的分数（否则为浮点数）
+        """
+        super().__init__()
+        self.shared = control.shared
+        self.lock = control.lock
+        self.table = control.base + _SLOT_HEADER
+        self.width = min(width, (1 << _SEEN_LENGTH_BITS) - 1)
+        self.entries = _SEEN_TABLE_SIZE // (self.width + 1)
+        self.exact = exact
+        # 最近一次查找的多重集合和结果（_search 查找后紧接着记录同一个多重集合）
+        self.last_key = None
+        self.last_found = None
+
+    def _encode(self, key) -> Optional[list]:
+        """多重集合的编码（每个数值一个不为0的int64），不记录在共享表中时返回None"""
+        if not _SHARED_MIN_VALUES <= len(key) <= self.width:
+            return None
+        if self.exact:
+            words = []
+            for num, den in key:
+                if not (-_EXACT_VALUE_LIMIT < num < _EXACT_VALUE_LIMIT and den < _EXACT_VALUE_LIMIT):
+                    return None
+                words.append(num << 32 | den)
+            return words
+        # 0统一写作-0.0（位模式不为0）
+        count = len(key)
+        return list(struct.unpack(f'<{count}q', struct.pack(
+            f'<{count}d', *(v or -0.0 for v in key))))
+
+    def _probe(self, words: list) -> tuple:
+        """
+        Returns:
+            (标记, 记录的下标, 是否已有这个多重集合)；没有时下标为第一个空位，
+            探测次数用完时为None
+        """
+        fingerprint = hash(tuple(words))
+        tag = (fingerprint & _SEEN_TAG_MASK) | len(words)
+        entry = (fingerprint >> _SEEN_LENGTH_BITS) % self.entries
+        for _ in range(_SEEN_PROBES):
+            position = self.table + entry * (self.width + 1)
+            current = self.shared[position]
+            if current == 0:
+                return tag, position, False
+            if current == tag and self.shared[position + 1:position + 1 + len(words)] == words:
+                return tag, position, True
+            entry = (entry + 1) % self.entries
+        return tag, None, False
+
+    def _find(self, key) -> Optional[tuple]:
+        """
+        在共享表中查找多重集合
+
+        Returns:
+            (编码, 标记, 记录的下标, 是否已有)，见 _probe；不记录在共享表中时返回None
+        """
+        if key is not self.last_key:
+            words = self._encode(key)
+            self.last_key = key
+            self.last_found = None if words is None else (words, *self._probe(words))
+        return self.last_found
+
+    def __contains__(self, key) -> bool:
+        found = self._find(key)
+        if found is not None and found[3]:
+            return True
+        return set.__contains__(self, key)
+
+    def add(self, key):
+        found = self._find(key)
+        self.last_key = None
+        if found is not None and not found[3] and found[2] is not None:
+            words, tag, position, _ = found
+            with self.lock:
+                if self.shared[position] != 0:
+                    # 查找之后其他任务占用了这个空位，重新查找
+                    tag, position, present = self._probe(words)
+                    if present:
+                        return
+                if position is not None:
+                    self.shared[position + 1:position + 1 + len(words)] = words
+                    self.shared[position] = tag
+                    return
+        if found is None or not found[3]:
+            set.add(self, key)
+
+
+def _search_task(children: List[List[tuple]], targets: List[int], exact: bool,
+                 slot: int, max_nodes: Optional[int], deadline: Optional[float],
+                 prune: bool) -> tuple:
+    """
+    进程池中执行的任务：搜索同一对节点合并后的所有子状态
+    
+    整次搜索的预算、取消标志和已展开的多重集合都在共享的控制块中（见 _SearchControl）
+    
+    Returns:
+        ({目标值: (表达式字符串, 计算结果)}, 展开的节点数, 预算是否用完, 剪枝统计)
+    """
+    control = _SearchControl(_SHARED, _SHARED_LOCK, slot, max_nodes, deadline)
+    budget = SearchBudget(prune=prune, control=control)
+    remaining = set(targets)
+    seen = _SharedSeen(control, max((len(child) for child in children), default=0), exact)
+    found = {}
+    try:
+        # 开始前先检查一次（排队期间可能已经取消或预算用完）
+        budget.check()
+        for child in children:
+            if Solver._search(child, remaining, seen, exact, found, budget):
+                break
+    except BudgetExhausted:
+        pass
+    control.should_stop(budget.nodes)
+    solutions = {target: Solver._to_solution(node, exact) for target, node in found.items()}
+    return solutions, budget.nodes, budget.exhausted, budget.pruned
 
 
 class Solver:
@@ -11,7 +486,8 @@ class Solver:
     
     @staticmethod
     def solve(cards: List[Card], target: int, must_use_all: bool = True, 
-              exclude_card: Optional[Card] = None) -> Optional[Tuple[str, float]]:
+              exclude_card: Optional[Card] = None,
+              exact: bool = False, prune: bool = True) -> Optional[Tuple[str, float]]:
         """
         求解能否用给定的牌计算出目标值
         
@@ -20,13 +496,103 @@ class Solver:
             target: 目标值
             must_use_all: 是否必须使用所有牌（除了exclude_card）
             exclude_card: 可选的排除牌（如黑桃K）
+            exact: 是否使用精确的分数运算（没有浮点误差，表达式只在找到解后生成）
+            prune: 是否启用剪枝规则（见 SearchBudget.pruned）
         
         Returns:
             如果能计算出目标值，返回(表达式字符串, 计算结果)，否则返回None
         """
-        # 获取需要使用的牌的点数
+        return Solver.solve_many(cards, [target], must_use_all, exclude_card, exact,
+                                 SearchBudget(prune=prune))[0]
+    
+    @staticmethod
+    def solve_many(cards: List[Card], targets: List[int], must_use_all: bool = True,
+                   exclude_card: Optional[Card] = None, exact: bool = False,
+                   budget: Optional[SearchBudget] = None) -> List[Optional[Tuple[str, float]]]:
+        """
+        用同一手牌同时求解多个目标值（例如所有敌人的点数）
+        
+        同一手牌只搜索一次，搜索过程中遇到的每个目标值都会被记录下来，
+        而不是对每个目标值分别从头搜索。
+        
+        Args:
+            cards: 可用的牌列表
+            targets: 目标值列表
+            must_use_all: 是否必须使用所有牌（除了exclude_card）
+            exclude_card: 可选的排除牌（如黑桃K）
+            exact: 是否使用精确的分数运算
+            budget: 可选的搜索预算（预算用完时没找到解的目标值也返回None）
+        
+        Returns:
+            与targets一一对应的列表，每项为(表达式字符串, 计算结果)或None
+        """
+        solutions, _ = Solver._solve_many(cards, targets, must_use_all, exclude_card, exact,
+                                          budget or SearchBudget())
+        return [solutions[target] for target in targets]
+    
+    @staticmethod
+    def solve_bounded(cards: List[Card], target: int, must_use_all: bool = True,
+                      exclude_card: Optional[Card] = None, exact: bool = True,
+                      max_nodes: Optional[int] = DEFAULT_MAX_NODES,
+                      timeout: Optional[float] = DEFAULT_TIMEOUT,
+                      prune: bool = True) -> SolveResult:
+        """
+        在预算内求解（用于网页请求，避免个别手牌占满工作进程）
+        
+        Args:
+            cards: 可用的牌列表
+            target: 目标值
+            must_use_all: 是否必须使用所有牌（除了exclude_card）
+            exclude_card: 可选的排除牌（如黑桃K）
+            exact: 是否使用精确的分数运算
+            max_nodes: 最多展开的节点数（None表示不限制）
+            timeout: 最长搜索时间，单位秒（None表示不限制）
+            prune: 是否启用剪枝规则
+        
+        Returns:
+            SolveResult：找到解 / 证明无解 / 预算用完
+        """
+        return Solver.solve_many_bounded(cards, [target], must_use_all, exclude_card, exact,
+                                         max_nodes, timeout, prune)[0]
+    
+    @staticmethod
+    def solve_many_bounded(cards: List[Card], targets: List[int], must_use_all: bool = True,
+                           exclude_card: Optional[Card] = None, exact: bool = True,
+                           max_nodes: Optional[int] = DEFAULT_MAX_NODES,
+                           timeout: Optional[float] = DEFAULT_TIMEOUT,
+                           prune: bool = True) -> List[SolveResult]:
+        """
+        在同一份预算内同时求解多个目标值，参数见 solve_bounded
+        
+        Returns:
+            与targets一一对应的SolveResult列表（nodes为本次调用展开的总节点数）
+        """
+        budget = SearchBudget(max_nodes, timeout, prune)
+        solutions, unresolved = Solver._solve_many(cards, targets, must_use_all, exclude_card,
+                                                   exact, budget)
+        results = []
+        for target in targets:
+            if solutions[target] is not None:
+                status = SolveStatus.FOUND
+            elif target in unresolved:
+                status = SolveStatus.BUDGET_EXHAUSTED
+            else:
+                status = SolveStatus.IMPOSSIBLE
+            results.append(SolveResult(status, solutions[target], budget.nodes, dict(budget.pruned)))
+        return results
+    
+    @staticmethod
+    def _solve_many(cards: List[Card], targets: List[int], must_use_all: bool,
+                    exclude_card: Optional[Card], exact: bool, budget: SearchBudget) -> tuple:
+        """
+        solve_many 的实现
+        
+        Returns:
+            ({目标值: 解或None}, 因预算用完而不确定是否有解的目标值集合)
+        """
+        # 获取需要使用的牌的点数（需要上下文来计算大小王）
         values = []
-        for card in cards:
+        for card, numeric_value in zip(cards, Card.resolve_values(cards)):
             if exclude_card and card == exclude_card:
                 if not must_use_all:
                     continue  # 跳过黑桃K（如果不需要使用所有牌）
@@ -34,191 +600,801 @@ class Solver:
                     # 即使必须使用所有牌，黑桃K也可以选择不使用（根据规则）
                     pass
             
-            # 计算牌的点数（需要上下文来计算大小王）
-            numeric_value = card.get_numeric_value(cards)
             values.append((numeric_value, card))
         
+        # 按点数排序，使搜索结果只取决于点数组合而与牌的顺序无关
+        values.sort(key=lambda item: item[0])
+        
+        # 缓存键只使用已经算好的点数（大小王的点数取决于上下文，不能用Card本身）
+        split_optional = bool(must_use_all and exclude_card)
+        if split_optional:
+            required = tuple(v for v, c in values if not c.is_spade_king())
+            optional = tuple(v for v, c in values if c.is_spade_king())
+        else:
+            required = tuple(v for v, _ in values)
+            optional = ()
+        
+        solutions = {}
+        pending = []
+        for target in dict.fromkeys(targets):
+            result = _CACHE.get((required, optional, target, exact))
+            if result is SolutionCache.MISSING:
+                pending.append(target)
+            else:
+                solutions[target] = result
+        
+        unresolved = set()
+        if pending:
+            found = Solver._solve_policy(values, pending, split_optional, exact, budget)
+            for target in pending:
+                solutions[target] = found.get(target)
+                if solutions[target] is None and budget.exhausted:
+                    # 预算用完时没找到解不代表无解，不能缓存
+                    unresolved.add(target)
+                else:
+                    _CACHE.put((required, optional, target, exact), solutions[target])
+        
+        return solutions, unresolved
+    
+    @staticmethod
+    def cache_stats() -> dict:
+        """求解结果缓存的统计信息（命中、未命中、淘汰次数等）"""
+        return _CACHE.stats()
+    
+    @staticmethod
+    def clear_cache():
+        """清空求解结果缓存"""
+        _CACHE.clear()
+    
+    @staticmethod
+    def _solve_policy(values: List[Tuple[int, Card]], targets: List[int], split_optional: bool,
+                      exact: bool, budget: SearchBudget) -> dict:
+        """
+        按黑桃K的使用规则求解
+        
+        Args:
+            values: (数值, 牌)的列表
+            targets: 目标值列表
+            split_optional: 黑桃K是否可用可不用（否则values中的牌必须全部用到）
+            exact: 是否使用精确的分数运算
+            budget: 搜索预算
+        
+        Returns:
+            {目标值: (表达式字符串, 计算结果)}，只包含能计算出的目标值
+        """
         # 如果必须使用所有牌（除了可选的排除牌），确保所有牌都被使用
-        if must_use_all and exclude_card:
+        if split_optional:
             # 黑桃K可用可不用，所以我们可以尝试两种方式
             values_without_spade_k = [(v, c) for v, c in values if not c.is_spade_king()]
             values_with_spade_k = values
             
+            # 先查预计算表，表中确定算不出的方式直接跳过搜索
+            reachable = {}
+            for target in targets:
+                result = None
+                if len(values_without_spade_k) < len(values_with_spade_k):
+                    result = Solver._lookup_table(values_without_spade_k, target)
+                reachable[target] = result if result is not None else (True, True)
+            
             # 先尝试不使用黑桃K
-            result = Solver._solve_values(values_without_spade_k, target)
-            if result:
-                return result
+            solutions = Solver._solve_values_many(
+                values_without_spade_k, [t for t in targets if reachable[t][0]], exact, budget
+            )
             
             # 再尝试使用黑桃K
-            result = Solver._solve_values(values_with_spade_k, target)
-            if result:
-                return result
-        else:
-            # 必须使用所有牌
-            result = Solver._solve_values(values, target)
-            if result:
-                return result
+            solutions.update(Solver._solve_values_many(
+                values_with_spade_k,
+                [t for t in targets if t not in solutions and reachable[t][1]],
+                exact, budget
+            ))
+            return solutions
         
-        return None
+        # 必须使用所有牌
+        pending = []
+        for target in targets:
+            reachable = Solver._lookup_table(values, target)
+            if reachable is None or reachable[0]:
+                pending.append(target)
+        return Solver._solve_values_many(values, pending, exact, budget)
+    
+    @staticmethod
+    def is_solvable(cards: List[Card], target: int, exclude_card: Optional[Card] = None) -> bool:
+        """
+        判断能否用给定的牌计算出目标值（不需要表达式时使用）
+        
+        除黑桃K和exclude_card外的牌必须全部用到，黑桃K和exclude_card可用可不用。
+        在预计算表的范围内为O(1)查表，否则回退到子集动态规划（见 _reachable_targets）。
+        
+        Args:
+            cards: 可用的牌列表
+            target: 目标值
+            exclude_card: 可选的排除牌（如黑桃K）
+        
+        Returns:
+            能否计算出目标值
+        """
+        return target in Solver._reachable_targets(cards, [target], exclude_card)
     
     @staticmethod
-    def _solve_values(values: List[Tuple[int, Card]], target: int) -> Optional[Tuple[str, float]]:
+    def _lookup_table(values: List[Tuple[int, Card]], target: int) -> Optional[Tuple[bool, bool]]:
+        """
+        在预计算表中查询（必须全部用到values中的点数）
+        
+        Returns:
+            (不使用黑桃K能否算出, 使用黑桃K能否算出)；没有表或超出表的范围时返回None
+        """
+        if _TABLE is None:
+            return None
+        return _TABLE.reachable([v for v, _ in values], target)
+    
+    @staticmethod
+    def _solve_values(values: List[Tuple[int, Card]], target: int,
+                      exact: bool = False) -> Optional[Tuple[str, float]]:
         """
         使用数值列表求解目标值
         
+        每一步从多重集合中任选一对（无序）数值合并，交换律运算（+、*）只算一次，
+        并记录已经搜索过的数值多重集合，避免重复搜索相同的子问题。
+        
         Args:
             values: (数值, 牌)的列表
             target: 目标值
+            exact: 是否使用精确的分数运算（否则使用浮点数和误差容限）
         
         Returns:
             如果能计算出目标值，返回(表达式字符串, 计算结果)，否则返回None
         """
-        if len(values) == 0:
+        return Solver._solve_values_many(values, [target], exact, SearchBudget()).get(target)
+    
+    @staticmethod
+    def _solve_values_many(values: List[Tuple[int, Card]], targets: List[int],
+                           exact: bool, budget: SearchBudget) -> dict:
+        """
+        一次搜索同时求解多个目标值（每个数值多重集合只展开一次）
+        
+        Args:
+            values: (数值, 牌)的列表
+            targets: 目标值列表
+            exact: 是否使用精确的分数运算（否则使用浮点数和误差容限）
+            budget: 搜索预算（用完时返回已经找到的解）
+        
+        Returns:
+            {目标值: (表达式字符串, 计算结果)}，只包含能计算出的目标值
+        """
+        if len(values) == 0 or len(targets) == 0 or budget.exhausted:
+            return {}
+        
+        if exact:
+            nodes = [((v, 1), None, str(v), None) for v, _ in values]
+        else:
+            nodes = [(float(v), None, str(v), None) for v, _ in values]
+        
+        # 牌较多时把第一层的拆分分给进程池并行搜索
+        if PARALLEL_MIN_CARDS and len(nodes) >= PARALLEL_MIN_CARDS:
+            solutions = Solver._search_parallel(nodes, targets, exact, budget)
+            if solutions is not None:
+                return solutions
+        
+        found = {}
+        try:
+            Solver._search(nodes, set(targets), set(), exact, found, budget)
+        except BudgetExhausted:
+            pass
+        return {target: Solver._to_solution(node, exact) for target, node in found.items()}
+    
+    @staticmethod
+    def _to_solution(node: tuple, exact: bool) -> Tuple[str, float]:
+        """把结果节点转换为(表达式字符串, 计算结果)"""
+        value = node[0]
+        if exact:
+            value = value[0] / value[1]
+        return (Solver._render(node), value)
+    
+    @staticmethod
+    def _search_parallel(nodes: List[tuple], targets: List[int], exact: bool,
+                         budget: SearchBudget) -> Optional[dict]:
+        """
+        并行搜索：第一层的每一对数值（及其所有运算结果）作为一个任务交给进程池
+        
+        所有任务共享一个控制块（见 _SearchControl）：budget剩余的节点数和时间
+        限制的是所有任务的总和，已展开的数值多重集合在任务之间共享；
+        所有目标值都找到后设置取消标志，正在执行的任务也会很快停止。
+        
+        Returns:
+            {目标值: (表达式字符串, 计算结果)}；进程池或控制块不可用时返回None（调用方改为串行搜索）
+        """
+        acquired = _get_pool()
+        if acquired is None:
+            return None
+        pool, shared, lock = acquired
+        slot = _acquire_slot(shared)
+        if slot is None:
             return None
         
-        if len(values) == 1:
-            val, _ = values[0]
-            if abs(val - target) < 0.0001:  # 浮点数比较
-                return (str(val), float(val))
+        control = _SearchControl(shared, lock, slot, budget.max_nodes, budget.deadline)
+        shared[control.base + 1] = budget.nodes
+        remaining = set(targets)
+        solutions = {}
+        futures = []
+        try:
+            for children in Solver._pair_children(nodes, exact, budget=budget):
+                futures.append(pool.submit(
+                    _search_task, children, list(targets), exact,
+                    slot, budget.max_nodes, budget.deadline, budget.prune
+                ))
+            
+            pending = set(futures)
+            while pending and remaining:
+                timeout = budget.remaining_time()
+                done, pending = wait(pending, return_when=FIRST_COMPLETED,
+                                     timeout=_POOL_CHECK_INTERVAL if timeout is None
+                                     else min(timeout, _POOL_CHECK_INTERVAL))
+                if not done:
+                    if pool is not _POOL:
+                        # 进程池已经被其他线程关闭（_reset_pool），还没完成的任务不会再有结果
+                        return None
+                    if budget.remaining_time() == 0:
+                        # 超时
+                        budget.exhausted = True
+                        break
+                    continue
+                for future in done:
+                    found, _, exhausted, pruned = future.result()
+                    for rule, count in pruned.items():
+                        budget.pruned[rule] += count
+                    if exhausted:
+                        budget.exhausted = True
+                    for target, solution in found.items():
+                        if target in remaining:
+                            remaining.discard(target)
+                            solutions[target] = solution
+        except (BrokenProcessPool, OSError):
+            _reset_pool(pool)
+            return None
+        except (RuntimeError, CancelledError):
+            # 其他线程已经关闭了这个进程池（_reset_pool），改为串行搜索
             return None
+        finally:
+            # 停止还在执行的任务，所有任务结束后才归还控制块（避免旧任务写入下一次搜索）
+            control.cancel()
+            budget.nodes = control.nodes
+            for future in futures:
+                future.cancel()
+            Solver._release_when_done(futures, shared, slot)
         
-        # 尝试所有可能的运算组合
-        # 使用递归方法，尝试所有可能的表达式
-        from itertools import permutations
+        return solutions
+    
+    @staticmethod
+    def _release_when_done(futures: list, shared, slot: int):
+        """所有任务都结束（完成、取消或出错）后归还控制块"""
+        outstanding = [len(futures)]
+        lock = threading.Lock()
         
-        # 获取所有数值
-        nums = [v[0] for v in values]
+        def finished(_):
+            with lock:
+                outstanding[0] -= 1
+                last = outstanding[0] == 0
+            if last:
+                _release_slot(shared, slot)
         
-        # 尝试所有排列
-        for perm in permutations(nums):
-            result = Solver._try_operations(list(perm), target)
-            if result:
-                return result
+        if not futures:
+            _release_slot(shared, slot)
+        for future in futures:
+            future.add_done_callback(finished)
+    
+    @staticmethod
+    def _render(node: tuple) -> str:
+        """
+        沿着回溯指针生成表达式字符串（只在找到解之后调用一次）
         
-        return None
+        节点格式为(值, 运算符, 左子节点, 右子节点)，叶子节点的运算符为None，
+        左子节点位置存放数字的字符串
+        """
+        _, op, left, right = node
+        if op is None:
+            return left
+        return f"({Solver._render(left)} {op} {Solver._render(right)})"
     
     @staticmethod
-    def _try_operations(nums: List[int], target: int) -> Optional[Tuple[str, float]]:
+    def _combine_float(val1: float, val2: float) -> List[Tuple[float, str, bool]]:
         """
-        尝试对数字列表进行运算（递归方法）
-        使用表达式和值的元组列表来跟踪表达式
+        浮点数模式下合并一对数值
         
-        Args:
-            nums: 数字列表
-            target: 目标值
+        Returns:
+            (结果值, 运算符, 是否交换左右操作数)的列表；+、* 满足交换律只生成一次
+        """
+        results = [
+            (val1 + val2, '+', False),
+            (val1 * val2, '*', False),
+            (val1 - val2, '-', False),
+        ]
+        if abs(val1 - val2) >= 0.0001:
+            results.append((val2 - val1, '-', True))
+        if abs(val2) >= 0.0001:
+            results.append((val1 / val2, '/', False))
+        if abs(val1) >= 0.0001 and abs(val1 - val2) >= 0.0001:
+            results.append((val2 / val1, '/', True))
+        return results
+    
+    @staticmethod
+    def _combine_exact(val1: Tuple[int, int], val2: Tuple[int, int]) -> List[Tuple[Tuple[int, int], str, bool]]:
+        """
+        精确模式下合并一对分数（分子, 分母），分母始终为正且已约分
         
         Returns:
-            如果能计算出目标值，返回(表达式字符串, 计算结果)，否则返回None
+            (结果值, 运算符, 是否交换左右操作数)的列表；+、* 满足交换律只生成一次
         """
-        if len(nums) == 1:
-            if abs(nums[0] - target) < 0.0001:
-                return (str(nums[0]), float(nums[0]))
-            return None
+        p, q = val1
+        r, s = val2
+        qs = q * s
         
-        # 使用表达式和值的元组列表
-        exprs = [(str(n), float(n)) for n in nums]
+        results = [
+            (Solver._fraction(p * s + r * q, qs), '+', False),
+            (Solver._fraction(p * r, qs), '*', False),
+            (Solver._fraction(p * s - r * q, qs), '-', False),
+        ]
+        if val1 != val2:
+            results.append((Solver._fraction(r * q - p * s, qs), '-', True))
+        if r != 0:
+            results.append((Solver._fraction(p * s, q * r), '/', False))
+        if p != 0 and val1 != val2:
+            results.append((Solver._fraction(r * q, s * p), '/', True))
+        return results
+    
+    @staticmethod
+    def _inverse_exact(a: Tuple[int, int], r: Tuple[int, int]) -> List[Tuple[Tuple[int, int], str, bool]]:
+        """
+        已知一个操作数a和结果r，反推另一个操作数b（精确模式）
         
-        # 递归尝试所有可能的运算
-        return Solver._try_operations_helper(exprs, target)
+        Returns:
+            (b, 运算符, b是否在左边)的列表，即 r = b op a 或 r = a op b
+        """
+        p, q = a
+        x, y = r
+        results = [
+            (Solver._fraction(x * q - p * y, y * q), '+', False),  # r = a + b
+            (Solver._fraction(p * y - x * q, y * q), '-', False),  # r = a - b
+            (Solver._fraction(x * q + p * y, y * q), '-', True),   # r = b - a
+        ]
+        if p != 0:
+            results.append((Solver._fraction(x * p, y * q), '/', True))  # r = b / a
+            results.append((Solver._fraction(x * q, y * p), '*', False))  # r = a * b
+            if x != 0:
+                results.append((Solver._fraction(p * y, q * x), '/', False))  # r = a / b
+        return results
+    
+    @staticmethod
+    def _fraction(num: int, den: int) -> Tuple[int, int]:
+        """约分并把符号放到分子上"""
+        g = gcd(num, den)
+        if den < 0:
+            g = -g
+        return (num // g, den // g)
     
     @staticmethod
-    def _try_operations_helper(exprs: List[Tuple[str, float]], target: float) -> Optional[Tuple[str, float]]:
+    def _search(nodes: List[tuple], targets: set, seen: set, exact: bool, found: dict,
+                budget: SearchBudget) -> bool:
         """
-        辅助函数：使用表达式列表进行运算
+        递归搜索：每次任选一对节点合并，直到只剩一个
         
         Args:
-            exprs: (表达式字符串, 值)的列表
-            target: 目标值
+            nodes: 表达式节点列表，见 _render
+            targets: 还没有找到解的目标值（整数），找到后会从中移除
+            seen: 已经展开过的数值多重集合
+            exact: 是否使用精确的分数运算
+            found: {目标值: 结果节点}，找到的解会写入这里
+            budget: 搜索预算（统计展开的节点数，用完时抛出BudgetExhausted）
         
         Returns:
-            如果能计算出目标值，返回(表达式字符串, 计算结果)，否则返回None
+            是否所有目标值都已找到（可以停止搜索）
         """
-        if len(exprs) == 1:
-            expr, val = exprs[0]
-            if abs(val - target) < 0.0001:
-                return (expr, val)
-            return None
+        budget.nodes += 1
+        if budget.nodes >= budget.next_check:
+            budget.check()
         
-        # 对于每一对相邻的表达式，尝试四种运算
-        for i in range(len(exprs) - 1):
-            expr1, val1 = exprs[i]
-            expr2, val2 = exprs[i + 1]
-            
-            for op in ['+', '-', '*', '/']:
-                try:
-                    if op == '+':
-                        result_val = val1 + val2
-                        result_expr = f"({expr1} + {expr2})"
-                    elif op == '-':
-                        result_val = val1 - val2
-                        result_expr = f"({expr1} - {expr2})"
-                    elif op == '*':
-                        result_val = val1 * val2
-                        result_expr = f"({expr1} * {expr2})"
-                    elif op == '/':
-                        if abs(val2) < 0.0001:
-                            continue
-                        result_val = val1 / val2
-                        result_expr = f"({expr1} / {expr2})"
-                    
-                    # 创建新的表达式列表
-                    new_exprs = exprs[:i] + [(result_expr, result_val)] + exprs[i + 2:]
-                    
-                    # 递归求解
-                    result = Solver._try_operations_helper(new_exprs, target)
-                    if result:
-                        return result
-                except:
+        if len(nodes) == 1:
+            val = nodes[0][0]
+            if exact:
+                hit = val[0] if val[1] == 1 and val[0] in targets else None
+            else:
+                nearest = round(val)
+                hit = nearest if abs(val - nearest) < 0.0001 and nearest in targets else None
+            if hit is not None:
+                found[hit] = nodes[0]
+                targets.discard(hit)
+            return not targets
+        
+        if exact:
+            vals = [node[0] for node in nodes]
+        else:
+            vals = [round(node[0], 9) for node in nodes]
+        
+        key = tuple(sorted(vals))
+        if key in seen:
+            return False
+        seen.add(key)
+        
+        # 剩余数值的量级不可能算出任何目标值时不再展开
+        if budget.prune and exact and not Solver._within_bound(vals, targets):
+            budget.pruned['bound'] += 1
+            return False
+        
+        for children in Solver._pair_children(nodes, exact, vals, budget):
+            for child in children:
+                if Solver._search(child, targets, seen, exact, found, budget):
+                    return True
+        
+        return False
+    
+    @staticmethod
+    def _within_bound(vals: List[Tuple[int, int]], targets: set) -> bool:
+        """
+        量级上界剪枝（精确模式）：剩余数值还有可能算出某个目标值吗
+        
+        对任意两个分数 a=p/q、b=r/s，四则运算结果（约分前）的 |分子|+分母
+        都不超过 (|p|+q)*(|r|+s)，所以用剩余数值能算出的任何值 x/y 都满足
+        |x|+y <= ∏(|p_i|+q_i)。整数目标值t要求 |t|+1 不超过这个乘积。
+        """
+        # 有负数目标值时 smallest<=1，不会剪枝（仍然正确，只是不够紧）
+        smallest = min(targets, default=0) + 1
+        bound = 1
+        for p, q in vals:
+            bound *= abs(p) + q
+            if bound >= smallest:
+                return True
+        return False
+    
+    @staticmethod
+    def _is_identity(a, b, op: str, swapped: bool, one, zero) -> bool:
+        """
+        判断一次运算是否与同一对数值的另一种运算结果相同（恒等运算）
+        
+        a×1 与 a÷1 相同，跳过 ÷1；a+0 与 a-0 相同，跳过 -0；
+        a×0 与 0÷a 都是0，跳过 0÷a
+        
+        Args:
+            a, b: 左右操作数（swapped为True时实际运算为 b op a）
+            op: 运算符
+            swapped: 是否交换左右操作数
+            one, zero: 当前算术模式下的1和0
+        """
+        left, right = (b, a) if swapped else (a, b)
+        if op == '/':
+            return right == one or left == zero
+        if op == '-':
+            return right == zero
+        return False
+    
+    @staticmethod
+    def _pair_children(nodes: List[tuple], exact: bool, vals: Optional[list] = None,
+                       budget: Optional[SearchBudget] = None):
+        """
+        依次取出每一对（无序）节点，生成合并这一对后的所有子状态
+        
+        启用剪枝时（budget.prune），数值相同的一对只生成一次（剩余的多重集合
+        也相同），并跳过恒等运算；去掉的子状态数量记录在budget.pruned中。
+        
+        Args:
+            nodes: 表达式节点列表
+            exact: 是否使用精确的分数运算
+            vals: 各节点用于比较的数值（可选，省略时由nodes计算）
+            budget: 搜索预算和剪枝设置（省略时不剪枝）
+        
+        Yields:
+            合并同一对节点得到的子状态（节点列表）的列表
+        """
+        if exact:
+            combine = Solver._combine_exact
+            one, zero = (1, 1), (0, 1)
+            if vals is None:
+                vals = [node[0] for node in nodes]
+        else:
+            combine = Solver._combine_float
+            one, zero = 1.0, 0.0
+            if vals is None:
+                vals = [round(node[0], 9) for node in nodes]
+        prune = budget is not None and budget.prune
+        
+        n = len(nodes)
+        tried_pairs = {}
+        for i in range(n - 1):
+            node1 = nodes[i]
+            for j in range(i + 1, n):
+                pair = (vals[i], vals[j]) if vals[i] <= vals[j] else (vals[j], vals[i])
+                if prune and pair in tried_pairs:
+                    budget.pruned['symmetric'] += tried_pairs[pair]
                     continue
+                
+                node2 = nodes[j]
+                rest = nodes[:i] + nodes[i + 1:j] + nodes[j + 1:]
+                children = []
+                # 只有含0或1的一对才可能有恒等运算
+                identity = prune and (vals[i] in (one, zero) or vals[j] in (one, zero))
+                for value, op, swapped in combine(node1[0], node2[0]):
+                    if identity and Solver._is_identity(vals[i], vals[j], op, swapped, one, zero):
+                        budget.pruned['identity'] += 1
+                        continue
+                    if swapped:
+                        new_node = (value, op, node2, node1)
+                    else:
+                        new_node = (value, op, node1, node2)
+                    children.append(rest + [new_node])
+                tried_pairs[pair] = len(children)
+                yield children
+    
+    @staticmethod
+    def solvable_targets(hands: List[List[Card]], targets: List[int],
+                         exclude_card: Optional[Card] = None) -> List[set]:
+        """
+        判断多组手牌各自能算出哪些目标值（不需要表达式时使用）
         
-        return None
+        规则与 is_solvable 相同。在预计算表的范围内查表，否则使用子集动态规划；
+        所有手牌共用一份按点数多重集合记录的可达值，手牌之间相同的部分
+        （例如只差一张牌的几组手牌）只计算一次。
+        
+        Args:
+            hands: 手牌列表（每组手牌的大小王以这组手牌为上下文）
+            targets: 目标值列表
+            exclude_card: 可选的排除牌（如黑桃K），可用可不用
+        
+        Returns:
+            与hands一一对应的能算出的目标值集合
+        """
+        shared = {}
+        return [Solver._reachable_targets(cards, targets, exclude_card, shared) for cards in hands]
+    
+    @staticmethod
+    def _card_masks(cards: List[Card], exclude_card: Optional[Card] = None) -> Tuple[int, int]:
+        """
+        必须用到的牌和可用可不用的牌（黑桃K和exclude_card）的位掩码
+        
+        Returns:
+            (必须用到的牌的位掩码, 可用可不用的牌的位掩码)，第i位对应cards[i]
+        """
+        required = 0
+        optional = 0
+        for i, card in enumerate(cards):
+            if card.is_spade_king() or (exclude_card and card == exclude_card):
+                optional |= 1 << i
+            else:
+                required |= 1 << i
+        return required, optional
+    
+    @staticmethod
+    def _reachable_targets(cards: List[Card], targets: List[int],
+                           exclude_card: Optional[Card] = None,
+                           shared: Optional[dict] = None) -> set:
+        """
+        一组手牌能算出的目标值（规则见 is_solvable）
+        
+        可用可不用的牌只有黑桃K时先查预计算表，表中查不到的目标值用子集动态规划
+        （先只用必须用到的牌，再加上可用可不用的牌）。
+        
+        Args:
+            cards: 手牌（大小王以这组手牌为上下文）
+            targets: 目标值列表
+            exclude_card: 可选的排除牌（如黑桃K），可用可不用
+            shared: 多组手牌共用的子多重集合可达值缓存（见 _SubsetSearch）
+        
+        Returns:
+            能算出的目标值集合
+        """
+        values = Card.resolve_values(cards)
+        required, optional = Solver._card_masks(cards, exclude_card)
+        # 预计算表的第二列是加上黑桃K（13）的结果，只适用于可选的牌最多一张且是黑桃K的情况
+        # 整组手牌只查一次表，得到所有目标值的可达掩码
+        table_mask = None
+        if _TABLE is not None and (optional == 0 or (
+                optional & (optional - 1) == 0
+                and cards[optional.bit_length() - 1].is_spade_king())):
+            masks = _TABLE.masks([values[i] for i in range(len(cards)) if required >> i & 1])
+            if masks is not None:
+                table_mask = masks[0] | masks[1] if optional else masks[0]
+        
+        search = None
+        reachable = set()
+        for target in targets:
+            if table_mask is not None and 0 <= target <= MAX_TARGET:
+                if table_mask >> target & 1:
+                    reachable.add(target)
+                continue
+            if search is None:
+                search = _SubsetSearch(values, shared)
+            for mask in Solver._optional_masks(required, optional):
+                if search.find(mask, (target, 1)) is not None:
+                    reachable.add(target)
+                    break
+        return reachable
+    
+    @staticmethod
+    def _optional_masks(required: int, optional: int) -> List[int]:
+        """要尝试的牌的位掩码：先只用必须用到的牌，有可选的牌时再全部用上（不含空集）"""
+        if optional == 0:
+            # 没有可选的牌时两种方式是同一个子集，只尝试一次
+            masks = [required]
+        else:
+            masks = [required, required | optional]
+        return [mask for mask in masks if mask]
     
     @staticmethod
     def solve_all_combinations(cards: List[Card], target: int, 
                               exclude_card: Optional[Card] = None) -> List[Tuple[str, float]]:
         """
-        找到所有可能的解法（使用不同数量的牌）
+        找到所有可能的解法（除黑桃K外的牌必须全部用到，黑桃K用与不用各算一种）
         
         Args:
             cards: 可用的牌列表
             target: 目标值
-            exclude_card: 可选的排除牌（如黑桃K）
+            exclude_card: 可选的排除牌（如黑桃K），与黑桃K一样可用可不用
         
         Returns:
             所有可能的解法列表
         """
+        search = _SubsetSearch(Card.resolve_values(cards))
+        required, optional = Solver._card_masks(cards, exclude_card)
+        
         solutions = []
+        for mask in Solver._optional_masks(required, optional):
+            node = search.find(mask, (target, 1))
+            if node is not None:
+                solutions.append((Solver._render(node), node[0][0] / node[0][1]))
+        return solutions
+    
+    @staticmethod
+    def solve_subsets(cards: List[Card], target: int) -> List[Tuple[List[Card], Tuple[str, float]]]:
+        """
+        找出所有能计算出目标值的牌的子集（每个子集中的牌都必须用到）
         
-        # 获取所有数值
-        values = []
-        for card in cards:
-            if exclude_card and card == exclude_card:
-                continue  # 跳过黑桃K（可选）
-            numeric_value = card.get_numeric_value(cards)
-            values.append((numeric_value, card))
+        所有子集共用一次子集动态规划：小子集的可达值只计算一次，大子集由
+        拆分出的两部分组合得到，不会对每个子集从头搜索。
         
-        # 尝试使用不同数量的牌
-        from itertools import combinations
+        Args:
+            cards: 可用的牌列表
+            target: 目标值
         
-        for r in range(1, len(values) + 1):
-            for combo in combinations(values, r):
-                # 必须使用除黑桃K外的所有牌，但黑桃K可用可不用
-                # 所以我们需要检查是否使用了所有非黑桃K的牌
-                non_spade_k_cards = [c for c in cards if not c.is_spade_king()]
-                used_cards = [c for _, c in combo]
-                
-                # 如果必须使用所有牌（除了黑桃K），需要确保所有非黑桃K的牌都被使用
-                if len(non_spade_k_cards) > 0:
-                    all_non_spade_k_used = all(
-                        any(c == used for used in used_cards) 
-                        for c in non_spade_k_cards
-                    )
-                    if not all_non_spade_k_used:
-                        continue
-                
-                result = Solver._solve_values(list(combo), target)
-                if result:
-                    solutions.append(result)
+        Returns:
+            [(用到的牌, (表达式字符串, 计算结果))]
+        """
+        values = Card.resolve_values(cards)
+        search = _SubsetSearch(values)
         
+        solutions = []
+        for mask in range(1, 1 << len(cards)):
+            node = search.find(mask, (target, 1))
+            if node is not None:
+                used_cards = [card for i, card in enumerate(cards) if mask >> i & 1]
+                solutions.append((used_cards, (Solver._render(node), node[0][0] / node[0][1])))
         return solutions
 
+
+class _SubsetSearch:
+    """
+    子集动态规划（精确分数运算）
+    
+    用位掩码表示牌的子集，reachable[mask]由所有拆分reachable[a]与reachable[mask^a]
+    两两组合得到。点数相同的子集（多重集合相同）共用同一份结果。张数较多的子集
+    不展开完整的可达值集合，而是对目标值反推另一部分需要的值再逐层查询。
+    """
+    
+    # 完整计算可达值集合的最大张数
+    FULL_SET_CARDS = 4
+    
+    def __init__(self, values: List[int], shared: Optional[dict] = None):
+        """
+        Args:
+            values: 每张牌的点数
+            shared: 可选的跨实例共享缓存 {排序后的点数元组: {值: 节点}}
+        """
+        self.values = values
+        self._by_multiset = shared if shared is not None else {}
+        self._keys = {}
+        self._found = {}
+    
+    def _key(self, mask: int) -> tuple:
+        """子集的点数多重集合"""
+        key = self._keys.get(mask)
+        if key is None:
+            key = tuple(sorted(v for i, v in enumerate(self.values) if mask >> i & 1))
+            self._keys[mask] = key
+        return key
+    
+    def _splits(self, mask: int, smaller_first: bool):
+        """
+        把子集拆成两个非空部分，点数相同的拆法只返回一次
+        
+        Args:
+            smaller_first: 是否只返回第一部分张数不多于第二部分的拆法；
+                否则只返回包含最低位的拆法（每种无序拆法一次）
+        """
+        low = mask & -mask
+        half = mask.bit_count() // 2
+        seen = set()
+        sub = (mask - 1) & mask
+        while sub:
+            other = mask ^ sub
+            if (sub.bit_count() <= half) if smaller_first else (sub & low):
+                pair = (self._key(sub), self._key(other))
+                if pair not in seen:
+                    seen.add(pair)
+                    yield sub, other
+            sub = (sub - 1) & mask
+    
+    def reachable(self, mask: int) -> dict:
+        """
+        子集中的牌全部用到时能算出的所有值
+        
+        Returns:
+            {(分子, 分母): 节点}，节点格式见 Solver._render
+        """
+        key = self._key(mask)
+        result = self._by_multiset.get(key)
+        if result is not None:
+            return result
+        
+        if mask & (mask - 1) == 0:
+            value = (key[0], 1)
+            result = {value: (value, None, str(key[0]), None)}
+        else:
+            result = {}
+            combine = Solver._combine_exact
+            for sub, other in self._splits(mask, smaller_first=False):
+                other_set = self.reachable(other)
+                for a, node_a in self.reachable(sub).items():
+                    for b, node_b in other_set.items():
+                        for value, op, swapped in combine(a, b):
+                            if value not in result:
+                                if swapped:
+                                    result[value] = (value, op, node_b, node_a)
+                                else:
+                                    result[value] = (value, op, node_a, node_b)
+        self._by_multiset[key] = result
+        return result
+    
+    def find(self, mask: int, target: Tuple[int, int]) -> Optional[tuple]:
+        """
+        子集中的牌全部用到时能否算出target
+        
+        Returns:
+            结果节点，算不出时返回None
+        """
+        if mask.bit_count() <= self.FULL_SET_CARDS or self._key(mask) in self._by_multiset:
+            return self.reachable(mask).get(target)
+        
+        memo_key = (self._key(mask), target)
+        if memo_key in self._found:
+            return self._found[memo_key]
+        
+        result = None
+        for sub, other in self._splits(mask, smaller_first=True):
+            for a, node_a in self.reachable(sub).items():
+                if a[0] == 0 and target[0] == 0:
+                    # 0乘以任意值都得到0
+                    result = (target, '*', node_a, self._sum_node(other))
+                    break
+                for b, op, b_first in Solver._inverse_exact(a, target):
+                    node_b = self.find(other, b)
+                    if node_b is not None:
+                        if b_first:
+                            result = (target, op, node_b, node_a)
+                        else:
+                            result = (target, op, node_a, node_b)
+                        break
+                if result is not None:
+                    break
+            if result is not None:
+                break
+        
+        self._found[memo_key] = result
+        return result
+    
+    def _sum_node(self, mask: int) -> tuple:
+        """把子集中的牌全部相加的节点"""
+        node = None
+        for value in self._key(mask):
+            leaf = ((value, 1), None, str(value), None)
+            if node is None:
+                node = leaf
+            else:
+                total = Solver._fraction(node[0][0] + value, 1)
+                node = (total, '+', node, leaf)
+        return node
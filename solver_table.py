@@ -0,0 +1,169 @@
+"""
+可达点数预计算表
+
+牌的点数只有1-13，手牌也只有几张，所以所有可能的手牌点数（排序后的多重集合）
+数量很少。离线为每个多重集合计算出"必须全部用到"时能算出的所有整数目标值
+（分别记录不使用/使用可选的黑桃K两种情况），写成紧凑的二进制文件，运行时
+用mmap映射后只需O(1)查表。
+
+生成表文件：
+    python solver_table.py
+"""
+import mmap
+import os
+import struct
+from itertools import combinations_with_replacement
+from math import comb
+from typing import Iterable, Optional, Tuple
+
+# 表文件默认路径（与本模块同目录）
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'solver_table.bin')
+
+MAGIC = b'HBRT'
+VERSION = 1
+MAX_RANK = 13  # 点数范围1-13
+MAX_CARDS = 5  # 必须使用的牌最多5张（手牌6张：5张 + 黑桃K）
+MAX_TARGET = 15  # 记录的目标值范围0-15（敌人点数最大为14）
+OPTIONAL_VALUE = 13  # 可用可不用的黑桃K的点数
+
+_HEADER = struct.Struct('<4sBBBB')
+_ENTRY = struct.Struct('<HH')  # (不使用黑桃K的掩码, 使用黑桃K的掩码)
+
+# 每种张数的多重集合在表中的起始位置
+_OFFSETS = [0]
+for _k in range(MAX_CARDS):
+    _OFFSETS.append(_OFFSETS[-1] + comb(MAX_RANK + _k - 1, _k))
+_ENTRY_COUNT = _OFFSETS[-1] + comb(MAX_RANK + MAX_CARDS - 1, MAX_CARDS)
+
+
+def _index(values: Iterable[int]) -> Optional[int]:
+    """
+    计算排序后的点数多重集合在表中的位置（组合数系统排名）
+
+    Returns:
+        表中的位置；超出表的范围时返回None
+    """
+    values = sorted(values)
+    if len(values) > MAX_CARDS:
+        return None
+
+    rank = 0
+    for i, value in enumerate(values):
+        if not 1 <= value <= MAX_RANK:
+            return None
+        # 非降序的多重集合转换为严格递增的组合
+        rank += comb(value - 1 + i, i + 1)
+    return _OFFSETS[len(values)] + rank
+
+
+class ReachableTable:
+    """mmap映射的可达点数表"""
+
+    def __init__(self, buffer):
+        """
+        Args:
+            buffer: 表文件内容（mmap或bytes）
+        """
+        magic, version, max_cards, max_target, _ = _HEADER.unpack_from(buffer, 0)
+        if (magic != MAGIC or version != VERSION or max_cards != MAX_CARDS
+                or max_target != MAX_TARGET):
+            raise ValueError("可达点数表格式不匹配，请重新生成")
+        if len(buffer) != _HEADER.size + _ENTRY_COUNT * _ENTRY.size:
+            raise ValueError("可达点数表大小不正确，请重新生成")
+        self._buffer = buffer
+
+    @staticmethod
+    def load(path: str = TABLE_PATH) -> Optional['ReachableTable']:
+        """
+        映射表文件
+
+        Returns:
+            表对象；文件不存在或格式不匹配时返回None（调用方回退到搜索）
+        """
+        try:
+            with open(path, 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return ReachableTable(buffer)
+        except (OSError, ValueError):
+            return None
+
+    def masks(self, values: Iterable[int]) -> Optional[Tuple[int, int]]:
+        """
+        获取点数多重集合的可达目标掩码
+
+        Args:
+            values: 必须全部用到的牌的点数
+
+        Returns:
+            (不使用黑桃K的掩码, 使用黑桃K的掩码)，第t位表示能否算出t；
+            超出表的范围时返回None
+        """
+        index = _index(values)
+        if index is None:
+            return None
+        return _ENTRY.unpack_from(self._buffer, _HEADER.size + index * _ENTRY.size)
+
+    def reachable(self, values: Iterable[int], target: int) -> Optional[Tuple[bool, bool]]:
+        """
+        查询能否算出目标值
+
+        Returns:
+            (不使用黑桃K能否算出, 使用黑桃K能否算出)；超出表的范围时返回None
+        """
+        if not 0 <= target <= MAX_TARGET:
+            return None
+        masks = self.masks(values)
+        if masks is None:
+            return None
+        without_mask, with_mask = masks
+        return (bool(without_mask >> target & 1), bool(with_mask >> target & 1))
+
+
+class _TableBuilder:
+    """离线生成可达点数表（用求解器的子集动态规划，精确分数运算）"""
+
+    def __init__(self):
+        from solver import _SubsetSearch
+        self._search_class = _SubsetSearch
+        # 所有点数组合共用的子多重集合可达值缓存
+        self._shared = {}
+
+    def mask(self, values: tuple) -> int:
+        """可达目标值的掩码"""
+        if not values:
+            return 0
+        search = self._search_class(list(values), shared=self._shared)
+        full = (1 << len(values)) - 1
+        mask = 0
+        for target in range(MAX_TARGET + 1):
+            if search.find(full, (target, 1)) is not None:
+                mask |= 1 << target
+        return mask
+
+    def build(self) -> bytes:
+        """生成整个表文件的内容"""
+        entries = [b''] * _ENTRY_COUNT
+        for k in range(MAX_CARDS + 1):
+            for values in combinations_with_replacement(range(1, MAX_RANK + 1), k):
+                entries[_index(values)] = _ENTRY.pack(
+                    self.mask(values),
+                    self.mask(values + (OPTIONAL_VALUE,))
+                )
+        header = _HEADER.pack(MAGIC, VERSION, MAX_CARDS, MAX_TARGET, 0)
+        return header + b''.join(entries)
+
+
+def build_table(path: str = TABLE_PATH):
+    """生成表文件"""
+    data = _TableBuilder().build()
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+if __name__ == '__main__':
+    import time
+    start = time.time()
+    build_table()
+    print(f"已生成 {TABLE_PATH}（{_ENTRY_COUNT} 个点数组合，耗时 {time.time() - start:.1f} 秒）")
@@ -1,6 +1,7 @@
 // 游戏状态
 let gameId = null;
 let gameState = null;
+let stateEtag = null;  // 最近一次 /state 响应的ETag
 let selectedEnemyIndex = null;
 let waitingForDiscard = false;
 
@@ -50,6 +51,50 @@ function showMessage(text, type = 'info') {
     }, 3000);
 }
 
+// 一次请求执行一组操作（check / defeat / discard），返回操作结果和最新的完整状态
+// 任何一个操作失败时服务器不保存修改，抛出错误
+async function applyActions(actions) {
+    const response = await fetch(`${API_BASE}/api/game/${gameId}/actions`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        // 只需要相对于已有版本变化的部分
+        body: JSON.stringify({ actions: actions, since_version: gameState.version })
+    });
+    
+    const data = await response.json();
+    if (!response.ok) {
+        throw new Error(data.error || '操作失败');
+    }
+    
+    const { success, results, ...state } = data;
+    applyState(state);
+    return results;
+}
+
+// 更新本地状态：完整状态直接替换，增量响应只修改变化的位置
+function applyState(state) {
+    if (!state.delta) {
+        gameState = state;
+        return;
+    }
+    
+    ['hand', 'enemies', 'hand_values', 'enemy_values', 'attackable'].forEach(field => {
+        if (!state[field]) return;
+        const list = gameState[field].slice(0, state[field].length);
+        Object.entries(state[field].changed).forEach(([index, value]) => {
+            list[Number(index)] = value;
+        });
+        gameState[field] = list;
+    });
+    ['kings_defeated', 'is_game_over', 'is_victory', 'deck_size', 'version'].forEach(field => {
+        if (field in state) {
+            gameState[field] = state[field];
+        }
+    });
+}
+
 // 启动新游戏
 async function startNewGame() {
     try {
@@ -67,6 +112,7 @@ async function startNewGame() {
         const data = await response.json();
         gameId = data.game_id;
         gameState = data;
+        stateEtag = null;
         waitingForDiscard = false;
         
         updateUI();
@@ -85,14 +131,21 @@ async function refreshGameState() {
     }
     
     try {
-        const response = await fetch(`${API_BASE}/api/game/${gameId}/state`);
+        // 状态没有变化时服务器返回304，不重新传输
+        const headers = stateEtag ? { 'If-None-Match': stateEtag } : {};
+        const response = await fetch(`${API_BASE}/api/game/${gameId}/state`, { headers: headers });
         
+        if (response.status === 304) {
+            showMessage('游戏状态没有变化', 'info');
+            return;
+        }
         if (!response.ok) {
             throw new Error('获取游戏状态失败');
         }
         
         const data = await response.json();
         gameState = data;
+        stateEtag = response.headers.get('ETag');
         
         updateUI();
         showMessage('游戏状态已刷新', 'info');
@@ -179,6 +232,7 @@ function renderEnemies() {
     
     if (!gameState || !gameState.enemies) return;
     
+    const enemyCards = [];
     gameState.enemies.forEach((enemy, index) => {
         const card = document.createElement('div');
         card.className = 'card enemy-card';
@@ -194,15 +248,16 @@ function renderEnemies() {
             ${isKing ? '<div class="card-label" style="color: #ffd700;">K</div>' : ''}
         `;
         
-        // 检查是否可以攻击
-        checkEnemyAttackable(index).then(canAttack => {
-            if (canAttack) {
-                card.classList.add('attackable');
-            }
-        });
-        
         card.addEventListener('click', () => attackEnemy(index));
         container.appendChild(card);
+        enemyCards.push(card);
+    });
+    
+    // 状态中已经包含每个敌人能否击败，不需要额外请求
+    (gameState.attackable || []).forEach((canAttack, index) => {
+        if (canAttack && enemyCards[index]) {
+            enemyCards[index].classList.add('attackable');
+        }
     });
 }
 
@@ -231,52 +286,15 @@ function renderHand() {
     });
 }
 
-// 检查敌人是否可以攻击
-async function checkEnemyAttackable(enemyIndex) {
-    if (!gameId) return false;
-    
-    try {
-        const response = await fetch(`${API_BASE}/api/game/${gameId}/check-enemy`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ enemy_index: enemyIndex })
-        });
-        
-        if (!response.ok) {
-            return false;
-        }
-        
-        const data = await response.json();
-        return data.can_defeat;
-    } catch (error) {
-        console.error('Error:', error);
-        return false;
-    }
-}
-
 // 攻击敌人
 async function attackEnemy(enemyIndex) {
     if (!gameId || waitingForDiscard) return;
     
     selectedEnemyIndex = enemyIndex;
     
-    // 获取敌人点数
-    try {
-        const stateResponse = await fetch(`${API_BASE}/api/game/${gameId}/state`);
-        if (stateResponse.ok) {
-            const stateData = await stateResponse.json();
-            const targetValue = stateData.enemy_values[enemyIndex];
-            
-            // 显示攻击选择界面
-            document.getElementById('choice-target-value').textContent = targetValue;
-            document.getElementById('attack-choice-section').style.display = 'block';
-        }
-    } catch (error) {
-        console.error('Error:', error);
-        showMessage('获取敌人信息失败', 'error');
-    }
+    // 显示攻击选择界面（敌人点数已经在状态中）
+    document.getElementById('choice-target-value').textContent = gameState.enemy_values[enemyIndex];
+    document.getElementById('attack-choice-section').style.display = 'block';
 }
 
 // 处理自动计算
@@ -284,22 +302,14 @@ async function handleAutoCalculate() {
     if (selectedEnemyIndex === null) return;
     
     try {
-        const response = await fetch(`${API_BASE}/api/game/${gameId}/check-enemy`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ enemy_index: selectedEnemyIndex })
-        });
-        
-        if (!response.ok) {
-            throw new Error('检查敌人失败');
-        }
-        
-        const data = await response.json();
+        const [data] = await applyActions([{ type: 'check', enemy_index: selectedEnemyIndex }]);
         
         if (!data.can_defeat) {
-            showMessage('无法用当前手牌计算出该敌人的点数', 'error');
+            if (data.status === 'budget_exhausted') {
+                showMessage('自动计算超时，请尝试手动输入算式', 'error');
+            } else {
+                showMessage('无法用当前手牌计算出该敌人的点数', 'error');
+            }
             document.getElementById('attack-choice-section').style.display = 'none';
             return;
         }
@@ -321,81 +331,35 @@ async function handleAutoCalculate() {
 async function handleManualInput() {
     if (selectedEnemyIndex === null) return;
     
-    // 获取敌人点数和手牌信息
-    try {
-        const stateResponse = await fetch(`${API_BASE}/api/game/${gameId}/state`);
-        if (!stateResponse.ok) {
-            throw new Error('获取游戏状态失败');
-        }
-        
-        const stateData = await stateResponse.json();
-        const targetValue = stateData.enemy_values[selectedEnemyIndex];
-        
-        // 隐藏选择界面，显示手动输入界面
-        document.getElementById('attack-choice-section').style.display = 'none';
-        document.getElementById('manual-target-value').textContent = targetValue;
-        
-        // 显示手牌点数（需要从后端获取准确的点数）
-        await displayHandValuesWithNumericValues(stateData);
-        
-        document.getElementById('manual-input-section').style.display = 'block';
-        document.getElementById('expression-input').focus();
-        
-    } catch (error) {
-        console.error('Error:', error);
-        showMessage('获取游戏信息失败', 'error');
-    }
+    // 隐藏选择界面，显示手动输入界面（敌人和手牌的点数已经在状态中）
+    document.getElementById('attack-choice-section').style.display = 'none';
+    document.getElementById('manual-target-value').textContent = gameState.enemy_values[selectedEnemyIndex];
+    
+    displayHandValuesWithNumericValues();
+    
+    document.getElementById('manual-input-section').style.display = 'block';
+    document.getElementById('expression-input').focus();
 }
 
-// 显示手牌点数（带实际数值）
-async function displayHandValuesWithNumericValues(stateData) {
+// 显示手牌点数（带实际数值，大小王已按手牌解析）
+function displayHandValuesWithNumericValues() {
     const container = document.getElementById('hand-values-display');
     container.innerHTML = '';
     
-    // 从后端获取手牌的实际点数
-    try {
-        const response = await fetch(`${API_BASE}/api/game/${gameId}/hand-values`);
-        if (!response.ok) {
-            throw new Error('获取手牌点数失败');
-        }
+    gameState.hand.forEach((card, index) => {
+        const cardEl = document.createElement('div');
+        cardEl.className = 'hand-value-item';
         
-        const data = await response.json();
+        let displayText = `${card.display} = ${gameState.hand_values[index]}`;
+        if (card.is_spade_king) {
+            displayText += ' (可选)';
+            cardEl.style.borderColor = '#ffd700';
+            cardEl.style.color = '#ffd700';
+        }
         
-        data.hand_values.forEach((item) => {
-            const card = item.card;
-            const numericValue = item.numeric_value;
-            
-            const cardEl = document.createElement('div');
-            cardEl.className = 'hand-value-item';
-            
-            let displayText = `${card.display} = ${numericValue}`;
-            if (card.is_spade_king) {
-                displayText += ' (可选)';
-                cardEl.style.borderColor = '#ffd700';
-                cardEl.style.color = '#ffd700';
-            }
-            
-            cardEl.textContent = displayText;
-            container.appendChild(cardEl);
-        });
-    } catch (error) {
-        console.error('Error:', error);
-        // 如果获取失败，显示基本信息
-        stateData.hand.forEach((card) => {
-            const item = document.createElement('div');
-            item.className = 'hand-value-item';
-            
-            let displayText = `${card.display}`;
-            if (card.is_spade_king) {
-                displayText += ' (可选)';
-                item.style.borderColor = '#ffd700';
-                item.style.color = '#ffd700';
-            }
-            
-            item.textContent = displayText;
-            container.appendChild(item);
-        });
-    }
+        cardEl.textContent = displayText;
+        container.appendChild(cardEl);
+    });
 }
 
 // 取消选择
@@ -471,25 +435,7 @@ async function confirmManualAttack() {
     }
     
     try {
-        const response = await fetch(`${API_BASE}/api/game/${gameId}/defeat-enemy`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ 
-                enemy_index: selectedEnemyIndex,
-                skip_validation: true,
-                expression: expression
-            })
-        });
-        
-        if (!response.ok) {
-            const data = await response.json();
-            throw new Error(data.error || '击败敌人失败');
-        }
-        
-        const data = await response.json();
-        gameState = data;
+        await applyActions([{ type: 'defeat', enemy_index: selectedEnemyIndex, expression: expression }]);
         selectedEnemyIndex = null;
         waitingForDiscard = false;
         
@@ -503,7 +449,7 @@ async function confirmManualAttack() {
         showMessage('成功击败敌人！', 'success');
         
         // 检查胜利
-        if (data.is_victory) {
+        if (gameState.is_victory) {
             return;
         }
         
@@ -521,28 +467,14 @@ async function confirmAttack() {
     if (!gameId || selectedEnemyIndex === null) return;
     
     try {
-        const response = await fetch(`${API_BASE}/api/game/${gameId}/defeat-enemy`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ enemy_index: selectedEnemyIndex })
-        });
-        
-        if (!response.ok) {
-            const data = await response.json();
-            throw new Error(data.error || '击败敌人失败');
-        }
-        
-        const data = await response.json();
-        gameState = data;
+        await applyActions([{ type: 'defeat', enemy_index: selectedEnemyIndex }]);
         selectedEnemyIndex = null;
         
         // 隐藏解决方案区域
         document.getElementById('solution-section').style.display = 'none';
         
         // 检查是否胜利
-        if (data.is_victory) {
+        if (gameState.is_victory) {
             updateUI();
             return;
         }
@@ -606,21 +538,7 @@ async function discardCard(cardIndex) {
     if (!gameId) return;
     
     try {
-        const response = await fetch(`${API_BASE}/api/game/${gameId}/discard`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ card_index: cardIndex })
-        });
-        
-        if (!response.ok) {
-            const data = await response.json();
-            throw new Error(data.error || '丢弃手牌失败');
-        }
-        
-        const data = await response.json();
-        gameState = data;
+        await applyActions([{ type: 'discard', card_index: cardIndex }]);
         waitingForDiscard = false;
         
         // 隐藏丢弃区域
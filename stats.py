@@ -0,0 +1,19 @@
+"""
+模拟和基准测试共用的统计函数
+"""
+from typing import List
+
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+    """
+    最近秩法求百分位数
+
+    Args:
+        sorted_values: 已排序的非空数值列表
+        percent: 百分位（0到100）
+
+    Returns:
+        排在第 ceil(len * percent / 100) 位（至少第1位）的数值
+    """
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
@@ -4,6 +4,7 @@
 import streamlit as st
 from game import Game
 from card import Card, Suit
+from solver import SolveStatus
 
 # 页面配置
 st.set_page_config(
@@ -412,8 +413,9 @@ def display_game_state():
     
     # 手牌区域 - 使用完整的HTML字符串
     hand_cards_html = []
+    hand_values = game.get_hand_values()
     for i, card in enumerate(state['hand']):
-        numeric_value = card.get_numeric_value(game.hand)
+        numeric_value = hand_values[i]
         is_spade_k = card.is_spade_king()
         card_text = card_display(card)
         
@@ -453,8 +455,7 @@ def display_battle_area():
     
     # 显示手牌点数提示
     hand_points = []
-    for i, card in enumerate(game.hand):
-        numeric_value = card.get_numeric_value(game.hand)
+    for card, numeric_value in zip(game.hand, game.get_hand_values()):
         is_spade_k = card.is_spade_king()
         hand_points.append(f"{card_display(card)}: {numeric_value}" + (" (黑桃K，可用可不用)" if is_spade_k else ""))
     hand_points_text = ", ".join(hand_points)
@@ -462,7 +463,7 @@ def display_battle_area():
     # 如果有选中的敌人
     if battle_enemy_index is not None and battle_enemy_index >= 0 and battle_enemy_index < len(game.enemies):
         enemy = game.enemies[battle_enemy_index]
-        target_value = enemy.get_numeric_value(game.enemies)
+        target_value = game.get_enemy_values()[battle_enemy_index]
         
         # 战斗区HTML - 右侧显示敌人
         is_king = enemy.is_king()
@@ -501,73 +502,39 @@ def display_battle_area():
             if battle_enemy_index is None:
                 st.warning("请先选择敌人")
             elif expression:
-                # 验证并攻击
-                try:
-                    result = eval(expression)
+                # 验证算式（结果和用到的手牌，与网页版相同的验证）并攻击
+                verdict = game.verify_expression(expression, battle_enemy_index)
+                if not verdict.valid:
+                    st.error(verdict.error)
+                else:
+                    # 攻击成功
                     enemy = game.enemies[battle_enemy_index]
-                    target_value = enemy.get_numeric_value(game.enemies)
-                    if abs(result - target_value) > 0.0001:
-                        st.error(f"计算结果 {result} 不等于目标点数 {target_value}")
+                    card_text = card_display(enemy)
+                    if game.defeat_enemy(battle_enemy_index, skip_validation=True):
+                        st.success(f"✓ 成功击败敌人 {card_text}！")
+                        st.session_state.battle_enemy_index = None
+                        st.session_state.manual_expression = ""
+                        st.session_state.expression_valid = False
+                        st.session_state.waiting_for_discard = True
+                        st.rerun()
                     else:
-                        # 验证使用的牌
-                        import re
-                        numbers_in_expr = re.findall(r'\d+\.?\d*', expression)
-                        used_values = [float(n) for n in numbers_in_expr]
-                        
-                        # 获取必须使用的牌（除黑桃K外的所有牌）
-                        required_cards = [c for c in game.hand if not c.is_spade_king()]
-                        required_values = [c.get_numeric_value(game.hand) for c in required_cards]
-                        
-                        # 检查是否所有必须的牌都被使用
-                        used_values_copy = used_values.copy()
-                        missing_cards = []
-                        for req_val in required_values:
-                            found = False
-                            for i, used_val in enumerate(used_values_copy):
-                                if abs(used_val - req_val) < 0.0001:
-                                    used_values_copy.pop(i)
-                                    found = True
-                                    break
-                            if not found:
-                                missing_cards.append(req_val)
-                        
-                        if missing_cards:
-                            st.error(f"未使用所有必须的手牌（缺少点数: {missing_cards}）")
-                        else:
-                            # 检查使用的数字是否都在手牌中
-                            invalid_values = []
-                            for used_val in used_values:
-                                valid = False
-                                for card in game.hand:
-                                    card_val = card.get_numeric_value(game.hand)
-                                    if abs(card_val - used_val) < 0.0001:
-                                        valid = True
-                                        break
-                                if not valid:
-                                    invalid_values.append(used_val)
-                            
-                            if invalid_values:
-                                st.error(f"使用了不在手牌中的点数: {invalid_values}")
-                            else:
-                                # 攻击成功
-                                enemy = game.enemies[battle_enemy_index]
-                                card_text = card_display(enemy)
-                                if game.defeat_enemy(battle_enemy_index, skip_validation=True):
-                                    st.success(f"✓ 成功击败敌人 {card_text}！")
-                                    st.session_state.battle_enemy_index = None
-                                    st.session_state.manual_expression = ""
-                                    st.session_state.expression_valid = False
-                                    st.session_state.waiting_for_discard = True
-                                    st.rerun()
-                                else:
-                                    st.error("攻击失败")
-                except Exception as e:
-                    st.error(f"算式无效: {str(e)}")
+                        st.error("攻击失败")
             else:
                 st.warning("请输入算式")
     
     with battle_col3:
         if battle_enemy_index is not None:
+            if st.button("💡 提示", key="hint_battle", use_container_width=True, disabled=st.session_state.waiting_for_discard):
+                # 在搜索预算内求解，避免个别手牌长时间卡住页面
+                result = game.solve_enemy(battle_enemy_index)
+                if result is None:
+                    st.warning("请先选择敌人")
+                elif result.status == SolveStatus.FOUND:
+                    st.info(f"提示: {result.solution[0]}")
+                elif result.status == SolveStatus.BUDGET_EXHAUSTED:
+                    st.warning("没能在限定时间内找到解法，请自己试试")
+                else:
+                    st.error("无法用当前手牌计算出该敌人的点数")
             if st.button("取消", key="cancel_battle", use_container_width=True):
                 st.session_state.battle_enemy_index = None
                 st.session_state.manual_expression = ""
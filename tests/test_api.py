@@ -0,0 +1,217 @@
+"""
+网页版API处理逻辑的测试
+
+直接调用 api.py 的处理函数（游戏存在每个测试新建的内存存储中）：/actions 的
+原子性和失败操作的序号，ETag和304，增量响应（应用到修改前的完整状态上得到
+修改后的完整状态），以及经过Flask的请求头。
+"""
+import pytest
+
+import api
+from api import ApiRequest
+from game import Game
+from game_store import MemoryGameStore
+from solver import Solver
+
+SEED = 20240601
+
+
+@pytest.fixture(autouse=True)
+def store(monkeypatch):
+    store = MemoryGameStore()
+    monkeypatch.setattr(api, 'store', store)
+    Solver.clear_cache()
+    yield store
+    Solver.clear_cache()
+
+
+@pytest.fixture
+def game_id(store):
+    return store.create(Game(SEED))
+
+
+def _defeat_action(game: Game) -> dict:
+    """用求解器找到的算式击败第一个能击败的敌人"""
+    index = next(i for i in range(len(game.enemies)) if game.can_defeat_enemy(i))
+    return {'type': 'defeat', 'enemy_index': index,
+            'expression': game.can_defeat_enemy(index)[0]}
+
+
+def _state(game_id: str, if_none_match=None):
+    return api.get_game_state(ApiRequest(game_id, if_none_match=if_none_match))
+
+
+def _apply_delta(full: dict, delta: dict) -> dict:
+    """把增量响应应用到修改前的完整状态上"""
+    assert delta['delta'] is True
+    assert delta['base_version'] == full['version']
+    result = dict(full)
+    for field, value in delta.items():
+        if field in ('delta', 'base_version'):
+            continue
+        if field in api._DELTA_LIST_FIELDS:
+            items = list(full[field][:value['length']])
+            items += [None] * (value['length'] - len(items))
+            for position, item in value['changed'].items():
+                items[int(position)] = item
+            result[field] = items
+        else:
+            result[field] = value
+    return result
+
+
+class TestActions:
+
+    def _post(self, game_id, actions, **data):
+        return api.apply_actions(ApiRequest(game_id, data={'actions': actions, **data}))
+
+    def test_all_actions_applied(self, store, game_id):
+        game = store.get(game_id)
+        defeat = _defeat_action(game)
+        response = self._post(game_id, [
+            {'type': 'check', 'enemy_index': defeat['enemy_index']},
+            defeat,
+            {'type': 'discard', 'card_index': 1},
+        ])
+        assert response.status == 200
+        assert response.payload['success'] is True
+        assert [r['type'] for r in response.payload['results']] == ['check', 'defeat', 'discard']
+        assert response.payload['results'][0]['can_defeat'] is True
+        assert response.payload['version'] == 2
+        assert response.etag == '2'
+        assert store.get(game_id).get_action_log() == bytes([defeat['enemy_index'], 0x81])
+
+    @pytest.mark.parametrize('failing, message', [
+        ({'type': 'discard', 'card_index': 0}, '无法丢弃该牌'),         # 黑桃K
+        ({'type': 'defeat', 'enemy_index': 9}, '无效的敌人索引'),
+        ({'type': 'defeat', 'enemy_index': 0, 'expression': '1+'}, '算式无效'),
+        ({'type': 'attack', 'enemy_index': 0}, '未知的操作类型'),
+        ('discard', '未知的操作类型'),
+    ])
+    def test_failure_leaves_game_unchanged(self, store, game_id, failing, message):
+        before = store.get(game_id).to_bytes()
+        response = self._post(game_id, [{'type': 'discard', 'card_index': 1},
+                                        {'type': 'discard', 'card_index': 1},
+                                        failing,
+                                        {'type': 'discard', 'card_index': 1}])
+        assert response.status == 400
+        assert response.payload['action_index'] == 2
+        assert message in response.payload['error']
+        # 前两个成功的丢弃也没有保存
+        assert store.get(game_id).to_bytes() == before
+
+    def test_wrong_expression_reports_index(self, store, game_id):
+        defeat = _defeat_action(store.get(game_id))
+        defeat['expression'] = '1+1'
+        response = self._post(game_id, [defeat])
+        assert response.status == 400
+        assert response.payload['action_index'] == 0
+        assert store.get(game_id).version == 0
+
+    def test_check_only_does_not_save(self, store, game_id):
+        game = store.get(game_id)
+        response = self._post(game_id, [{'type': 'check', 'enemy_index': 0}])
+        assert response.status == 200
+        assert store.get(game_id) is game
+
+    def test_too_many_actions(self, store, game_id):
+        actions = [{'type': 'check', 'enemy_index': 0}] * (api.MAX_ACTIONS_PER_REQUEST + 1)
+        response = self._post(game_id, actions)
+        assert response.status == 400
+        assert 'action_index' not in response.payload
+
+    def test_missing_game(self):
+        assert self._post('missing', []).status == 404
+
+
+class TestETag:
+
+    def test_not_modified(self, game_id):
+        response = _state(game_id)
+        assert response.status == 200
+        assert response.etag == '0'
+        assert response.headers == {'ETag': '"0"', 'Cache-Control': 'no-cache'}
+
+        for header in ('"0"', 'W/"0"', '"7", "0"', '*'):
+            cached = _state(game_id, header)
+            assert cached.status == 304, header
+            assert cached.payload is None
+            assert cached.etag == '0'
+
+    def test_changed_after_action(self, game_id):
+        api.discard_card(ApiRequest(game_id, data={'card_index': 1}))
+        response = _state(game_id, '"0"')
+        assert response.status == 200
+        assert response.etag == '1'
+        assert response.payload['version'] == 1
+
+    @pytest.mark.parametrize('header, matches', [
+        (None, False), ('', False), ('"1"', False), ('"00"', False),
+        ('W/"1", "2"', False), ('"0"', True), (' W/"0" ', True),
+    ])
+    def test_etag_matches(self, header, matches):
+        assert api.etag_matches(header, '0') is matches
+
+    def test_flask_headers(self, game_id):
+        flask_app = pytest.importorskip('app').app
+        client = flask_app.test_client()
+        response = client.get(f'/api/game/{game_id}/state')
+        assert response.status_code == 200
+        assert response.headers['ETag'] == '"0"'
+        assert response.headers['Cache-Control'] == 'no-cache'
+
+        cached = client.get(f'/api/game/{game_id}/state', headers={'If-None-Match': '"0"'})
+        assert cached.status_code == 304
+        assert cached.data == b''
+        assert cached.headers['ETag'] == '"0"'
+
+
+class TestDelta:
+
+    def test_discard_delta(self, store, game_id):
+        before = _state(game_id).payload
+        response = api.discard_card(ApiRequest(game_id, data={'card_index': 1,
+                                                              'since_version': 0}))
+        assert response.status == 200
+        assert response.payload['version'] == 1
+        # 丢弃后手牌变短，敌人没有变化
+        assert 'enemies' not in response.payload
+        assert response.payload['hand']['length'] == len(before['hand']) - 1
+        assert _apply_delta(before, response.payload) == {
+            **_state(game_id).payload, 'success': True}
+
+    def test_defeat_delta(self, store, game_id):
+        before = _state(game_id).payload
+        defeat = _defeat_action(store.get(game_id))
+        response = api.defeat_enemy(ApiRequest(game_id, data={
+            'enemy_index': defeat['enemy_index'], 'expression': defeat['expression'],
+            'skip_validation': True, 'since_version': 0}))
+        assert response.status == 200
+        assert response.payload['enemies']['length'] == len(before['enemies']) - 1
+        assert _apply_delta(before, response.payload) == {
+            **_state(game_id).payload, 'success': True}
+
+    def test_actions_delta(self, store, game_id):
+        before = _state(game_id).payload
+        defeat = _defeat_action(store.get(game_id))
+        response = api.apply_actions(ApiRequest(game_id, data={
+            'actions': [defeat, {'type': 'discard', 'card_index': 1}], 'since_version': 0}))
+        assert response.status == 200
+        after = _state(game_id).payload
+        assert _apply_delta(before, response.payload) == {
+            **after, 'success': True, 'results': response.payload['results']}
+
+    @pytest.mark.parametrize('since_version', [None, 1, -1, True, '0', 0.0])
+    def test_full_state_unless_version_matches(self, game_id, since_version):
+        response = api.discard_card(ApiRequest(game_id, data={
+            'card_index': 1, 'since_version': since_version}))
+        assert response.status == 200
+        assert 'delta' not in response.payload
+        assert response.payload == {**_state(game_id).payload, 'success': True}
+
+    def test_stale_version_after_other_change(self, game_id):
+        api.discard_card(ApiRequest(game_id, data={'card_index': 1}))
+        response = api.discard_card(ApiRequest(game_id, data={'card_index': 1,
+                                                              'since_version': 0}))
+        assert 'delta' not in response.payload
+        assert response.payload['version'] == 2
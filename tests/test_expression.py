@@ -0,0 +1,98 @@
+"""
+玩家输入的算式的解析器的测试
+
+算式来自不可信的网页请求：检查计算结果、运算数、长度/位数/嵌套限制、
+除以0、不支持的语法（** 和正负号）、全角符号，以及不是字符串的输入。
+"""
+from fractions import Fraction
+
+import pytest
+
+from expression import (evaluate, ExpressionError, MAX_EXPRESSION_LENGTH,
+                        MAX_NUMBER_DIGITS, MAX_NESTING)
+
+
+@pytest.mark.parametrize('expression, value, operands', [
+    ('(11 + 5) * 2', 32, [11, 5, 2]),
+    ('1 + 2 * 3', 7, [1, 2, 3]),
+    ('8 - 3 - 2', 3, [8, 3, 2]),
+    ('12 / 8 / 3', Fraction(1, 2), [12, 8, 3]),
+    ('3 / (1 - 1 / 4)', 4, [3, 1, 1, 4]),
+    ('  ( ( 7 ) )  ', 7, [7]),
+])
+def test_evaluate_exact(expression, value, operands):
+    parsed = evaluate(expression)
+    assert parsed.value == value
+    assert isinstance(parsed.value, Fraction)
+    assert parsed.operands == operands
+
+
+@pytest.mark.parametrize('expression, value', [
+    ('3×4', 12),
+    ('12÷4', 3),
+    ('（1＋2）＊3', 9),
+    ('8－2／2', 7),
+])
+def test_full_width_aliases(expression, value):
+    assert evaluate(expression).value == value
+
+
+def test_length_limit():
+    expression = '1+' * (MAX_EXPRESSION_LENGTH // 2) + '1'
+    assert len(expression) > MAX_EXPRESSION_LENGTH
+    with pytest.raises(ExpressionError, match='太长'):
+        evaluate(expression)
+    # 正好在限制内的算式可以计算
+    evaluate(' ' * (MAX_EXPRESSION_LENGTH - 1) + '1')
+
+
+def test_digit_limit():
+    assert evaluate('9' * MAX_NUMBER_DIGITS).value == int('9' * MAX_NUMBER_DIGITS)
+    with pytest.raises(ExpressionError, match='数字太大'):
+        evaluate('1' * (MAX_NUMBER_DIGITS + 1))
+
+
+def test_nesting_limit():
+    assert evaluate('(' * MAX_NESTING + '1' + ')' * MAX_NESTING).value == 1
+    with pytest.raises(ExpressionError, match='嵌套'):
+        evaluate('(' * (MAX_NESTING + 1) + '1' + ')' * (MAX_NESTING + 1))
+
+
+@pytest.mark.parametrize('expression', ['1/0', '5/(2-2)', '1/(3*0)'])
+def test_division_by_zero(expression):
+    with pytest.raises(ExpressionError, match='除以0'):
+        evaluate(expression)
+
+
+@pytest.mark.parametrize('expression', [
+    '2**3',          # 乘方
+    '2 * * 3',
+    '-1+2',          # 不支持正负号
+    '2*-3',
+    '+4',
+    '1.5*2',         # 小数
+    '2^3',
+    '__import__("os")',
+    '1e3',
+    '',
+    '   ',
+    '(1+2',
+    '1+2)',
+    '1+',
+    '()',
+    '3 4',
+])
+def test_rejected_syntax(expression):
+    with pytest.raises(ExpressionError):
+        evaluate(expression)
+
+
+def test_unary_sign_message():
+    with pytest.raises(ExpressionError, match='正负号'):
+        evaluate('-1+2')
+
+
+@pytest.mark.parametrize('expression', [5, 2.5, None, ['1+2'], {'a': 1}, b'1+2'])
+def test_non_string_rejected(expression):
+    with pytest.raises(ExpressionError, match='字符串'):
+        evaluate(expression)
@@ -0,0 +1,261 @@
+"""
+游戏逻辑的测试
+
+检查二进制快照（to_bytes / from_bytes）和操作记录重放（Game.replay）能还原
+完全相同的游戏，操作记录的格式，玩家算式的验证（verify_expression），以及
+丢弃建议（recommend_discard）的期望值与逐一枚举翻牌结果算出的相同。
+"""
+from itertools import combinations
+
+import pytest
+
+from card import Card, Suit
+from game import Deck, Game, _SNAPSHOT_HEADER
+from solver import Solver
+
+SEED = 20240601
+SPADE_KING = Card(Suit.SPADE, 13)
+
+
+def _make_game(hand, enemies, deck=()):
+    """手牌（黑桃K之外）、敌人和牌堆都指定好的游戏"""
+    game = Game(SEED)
+    game.hand = [SPADE_KING] + list(hand)
+    game.enemies = list(enemies)
+    game.deck = Deck(deck)
+    game._invalidate_values()
+    return game
+
+
+def _hearts(*values):
+    return [Card(Suit.HEART, value) for value in values]
+
+
+def _play(game: Game, turns: int) -> Game:
+    """每回合击败第一个能击败的敌人并丢弃第二张手牌，没有能击败的敌人时停止"""
+    for _ in range(turns):
+        if game.is_game_over:
+            break
+        index = next((i for i in range(len(game.enemies)) if game.can_defeat_enemy(i)), None)
+        if index is None:
+            break
+        assert game.defeat_enemy(index)
+        if not game.is_game_over:
+            assert game.discard_card(1)
+    return game
+
+
+@pytest.fixture(autouse=True)
+def clear_solver_cache():
+    Solver.clear_cache()
+    yield
+    Solver.clear_cache()
+
+
+def _assert_same_game(game: Game, other: Game):
+    assert list(other.deck) == list(game.deck)
+    assert other.hand == game.hand
+    assert other.enemies == game.enemies
+    assert other.spade_king is game.spade_king
+    assert other.kings_defeated == game.kings_defeated
+    assert (other.is_game_over, other.is_victory) == (game.is_game_over, game.is_victory)
+    assert other.seed == game.seed
+    assert other.get_action_log() == game.get_action_log()
+    assert other.get_hand_values() == game.get_hand_values()
+    assert other.get_enemy_values() == game.get_enemy_values()
+
+
+def test_same_seed_deals_same_cards():
+    game, other = Game(SEED), Game(SEED)
+    _assert_same_game(game, other)
+    assert game.hand[0] is SPADE_KING
+    assert len(game.hand) == 5 and len(game.enemies) == 4
+    assert not any(card.is_king() for card in game.hand[1:])
+
+
+@pytest.mark.parametrize('seed', [-1, 1 << 64])
+def test_seed_out_of_range(seed):
+    with pytest.raises(ValueError):
+        Game(seed)
+
+
+def test_action_log():
+    game = Game(SEED)
+    assert game.get_action_log() == b'' and game.version == 0
+
+    # 失败的操作不记录
+    assert not game.discard_card(0)  # 黑桃K不能丢弃
+    assert not game.discard_card(len(game.hand))
+    assert game.version == 0
+
+    index = next(i for i in range(len(game.enemies)) if game.can_defeat_enemy(i))
+    assert game.defeat_enemy(index)
+    assert game.discard_card(2)
+    assert game.get_action_log() == bytes([index, 0x80 | 2])
+    assert game.version == 2
+
+
+@pytest.mark.parametrize('turns', [0, 1, 3, 30])
+def test_snapshot_round_trip(turns):
+    game = _play(Game(SEED), turns)
+    data = game.to_bytes()
+    card_count = len(game.deck) + len(game.hand) + len(game.enemies)
+    assert len(data) == _SNAPSHOT_HEADER.size + card_count + game.version
+
+    restored = Game.from_bytes(data)
+    _assert_same_game(game, restored)
+    assert restored.to_bytes() == data
+
+    # 还原的游戏可以继续进行，与原来的游戏完全相同
+    _play(game, 2)
+    _play(restored, 2)
+    _assert_same_game(game, restored)
+
+
+def test_snapshot_after_victory_flags():
+    game = _play(Game(SEED), 1)
+    game.kings_defeated = 3
+    game.is_game_over = game.is_victory = True
+    restored = Game.from_bytes(game.to_bytes())
+    assert restored.kings_defeated == 3
+    assert restored.is_game_over and restored.is_victory
+
+
+def test_snapshot_rejects_other_versions_and_lengths():
+    data = _play(Game(SEED), 1).to_bytes()
+    for version in (0, 2, 255):
+        with pytest.raises(ValueError, match='版本'):
+            Game.from_bytes(bytes([version]) + data[1:])
+    with pytest.raises(ValueError, match='版本'):
+        Game.from_bytes(b'')
+    for broken in (data[:_SNAPSHOT_HEADER.size - 1], data[:-1], data + b'\x00'):
+        with pytest.raises(ValueError, match='长度'):
+            Game.from_bytes(broken)
+
+
+@pytest.mark.parametrize('turns', [0, 1, 3, 30])
+def test_replay_rebuilds_game(turns):
+    game = _play(Game(SEED), turns)
+    replayed = Game.replay(game.seed, game.get_action_log())
+    _assert_same_game(game, replayed)
+    assert replayed.to_bytes() == game.to_bytes()
+
+
+@pytest.mark.parametrize('actions', [
+    bytes([0x80 | 0]),   # 黑桃K不能丢弃
+    bytes([0x80 | 9]),   # 手牌中没有这个位置
+    bytes([7]),          # 没有这个敌人
+])
+def test_replay_rejects_invalid_log(actions):
+    with pytest.raises(ValueError, match='重放'):
+        Game.replay(SEED, actions)
+
+
+class TestVerifyExpression:
+    """手牌为 黑桃K 2 3 4 5，敌人为 9 和 5"""
+
+    @pytest.fixture
+    def game(self):
+        return _make_game(_hearts(2, 3, 4, 5), _hearts(9, 5))
+
+    @pytest.mark.parametrize('expression', [
+        '2*5-4+3',         # 不用黑桃K
+        '13-4+5-3-2',      # 用黑桃K
+        '2×5－4＋3',       # 全角符号
+    ])
+    def test_valid(self, game, expression):
+        verdict = game.verify_expression(expression, 0)
+        assert verdict.valid, verdict
+        assert verdict.error is None
+        assert verdict.value == 9 and verdict.target_value == 9
+        assert verdict.missing == [] and verdict.extra == []
+
+    def test_wrong_value(self, game):
+        verdict = game.verify_expression('2+3+4+5', 0)
+        assert not verdict.valid
+        assert verdict.value == 14 and verdict.target_value == 9
+        assert '不等于' in verdict.error
+
+    def test_missing_cards(self, game):
+        verdict = game.verify_expression('4+5', 0)
+        assert not verdict.valid
+        assert verdict.missing == [2, 3]
+        assert '缺少' in verdict.error
+
+    @pytest.mark.parametrize('expression, extra', [
+        ('2*5-4+3+6-6', [6, 6]),
+        ('2*5-4+3+5-5', [5, 5]),
+        ('13-4+5-3-2+13-13', [13, 13]),   # 黑桃K只能用一次
+    ])
+    def test_extra_numbers(self, game, expression, extra):
+        verdict = game.verify_expression(expression, 0)
+        assert not verdict.valid
+        assert verdict.missing == []
+        assert verdict.extra == extra
+
+    def test_invalid_expression(self, game):
+        verdict = game.verify_expression('2**5', 0)
+        assert not verdict.valid
+        assert verdict.error.startswith('算式无效')
+        assert verdict.value is None and verdict.target_value == 9
+
+    @pytest.mark.parametrize('enemy_index', [-1, 2])
+    def test_invalid_enemy_index(self, game, enemy_index):
+        verdict = game.verify_expression('2*5-4+3', enemy_index)
+        assert not verdict.valid
+        assert verdict.error == '无效的敌人索引'
+
+    def test_duplicate_hand_values(self):
+        game = _make_game(_hearts(5) + [Card(Suit.CLUB, 5)] + _hearts(2, 3), _hearts(5))
+        assert game.verify_expression('5*5/5', 0).missing == [2, 3]
+        assert game.verify_expression('5*(3-2)', 0).missing == [5]
+        assert game.verify_expression('(5*3-5)/2', 0).valid
+
+
+def _expected_defeats(game: Game, discard_index: int) -> float:
+    """丢弃一张手牌后能击败的敌人数的期望值：逐一枚举牌堆中的牌翻开的所有组合"""
+    hand = game.hand[:discard_index] + game.hand[discard_index + 1:]
+    deck = list(game.deck)
+    draws = min(max(4 - len(game.enemies), 0), len(deck))
+    total = count = 0
+    for drawn in combinations(deck, draws):
+        values = Card.resolve_values(game.enemies + list(drawn))
+        total += sum(Solver.solve(hand, value, exclude_card=game.spade_king, exact=True)
+                     is not None for value in values)
+        count += 1
+    return total / count
+
+
+def _check_recommendation(game: Game):
+    scores = game.recommend_discard()
+    candidates = [i for i, card in enumerate(game.hand) if not card.is_spade_king()]
+    assert sorted(index for index, _ in scores) == candidates
+    for index, score in scores:
+        assert score == pytest.approx(_expected_defeats(game, index)), index
+    # 按得分从高到低排列，得分相同时按索引排列
+    assert scores == sorted(scores, key=lambda item: (-item[1], item[0]))
+
+
+def test_recommend_discard_after_defeat():
+    game = Game(SEED)
+    index = next(i for i in range(len(game.enemies)) if game.can_defeat_enemy(i))
+    game.defeat_enemy(index)
+    _check_recommendation(game)
+
+
+def test_recommend_discard_two_draws_with_jokers():
+    """翻开两张牌，牌堆中有大小王（点数以翻开后的敌人为上下文）和重复的点数"""
+    deck = (_hearts(1, 7, 12) + [Card(Suit.CLUB, 7), Card(Suit.SPADE, 3)]
+            + [Card(Suit.JOKER, is_big_joker=False), Card(Suit.JOKER, is_big_joker=True)])
+    game = _make_game(_hearts(2, 3, 6, 10, 11), _hearts(4, 9), deck)
+    _check_recommendation(game)
+
+
+def test_recommend_discard_empty_deck():
+    game = _make_game(_hearts(2, 3, 6, 10, 11), _hearts(4, 9, 13))
+    _check_recommendation(game)
+
+
+def test_recommend_discard_only_spade_king():
+    game = _make_game([], _hearts(4))
+    assert game.recommend_discard() == []
@@ -0,0 +1,201 @@
+"""
+游戏存储的测试
+
+内存和SQLite两种后端都检查：闲置过期（TTL）、超出数量上限时的LRU淘汰、
+保存后读取得到相同的游戏（SQLite经过二进制快照），以及 edit() 持有游戏的锁，
+同一局游戏的修改依次执行。时间由替换 game_store.time 的假时钟控制。
+"""
+import threading
+import zlib
+
+import pytest
+
+import game_store
+from game import Game
+from game_store import MemoryGameStore, SQLiteGameStore
+
+SEED = 20240601
+
+
+class FakeClock:
+    """代替 game_store 中的 time 模块，测试中手动拨动时间"""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(game_store, 'time', clock)
+    return clock
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_store(request, tmp_path):
+    """按参数创建内存或SQLite存储的工厂（SQLite数据库放在临时目录中）"""
+    def make(ttl=game_store.DEFAULT_TTL, max_games=game_store.DEFAULT_MAX_GAMES):
+        if request.param == 'memory':
+            return MemoryGameStore(ttl, max_games)
+        return SQLiteGameStore(str(tmp_path / 'games.db'), ttl, max_games)
+
+    return make
+
+
+def _played_game() -> Game:
+    game = Game(SEED)
+    index = next(i for i in range(len(game.enemies)) if game.can_defeat_enemy(i))
+    game.defeat_enemy(index)
+    game.discard_card(1)
+    return game
+
+
+def test_round_trip(make_store):
+    store = make_store()
+    game = _played_game()
+    game_id = store.create(game)
+    assert game_id in store
+    assert 'missing' not in store
+
+    loaded = store.get(game_id)
+    assert loaded.to_bytes() == game.to_bytes()
+    assert loaded.get_hand_values() == game.get_hand_values()
+    assert store.count() == 1
+
+    store.delete(game_id)
+    assert store.get(game_id) is None
+    assert store.count() == 0
+
+
+def test_sqlite_shared_between_stores(tmp_path):
+    """同一个数据库文件的另一个存储对象（另一个工作进程）读到同样的游戏"""
+    path = str(tmp_path / 'games.db')
+    game = _played_game()
+    game_id = SQLiteGameStore(path).create(game)
+    other = SQLiteGameStore(path)
+    assert other.get(game_id).to_bytes() == game.to_bytes()
+    assert other.stats()['state_bytes'] == len(game.to_bytes())
+
+
+def test_ttl_sweep(make_store, clock):
+    store = make_store(ttl=100)
+    old = store.create(Game(SEED))
+    clock.advance(50)
+    new = store.create(Game(SEED))
+    clock.advance(60)
+
+    assert store.sweep() == 1
+    assert store.get(old) is None
+    assert store.get(new) is not None
+    assert store.expired == 1
+
+
+def test_ttl_counts_from_last_access(make_store, clock):
+    store = make_store(ttl=100)
+    read = store.create(Game(SEED))
+    idle = store.create(Game(SEED))
+    # SQLite只有距离上次访问超过 TOUCH_INTERVAL 的读取才更新访问时间
+    clock.advance(SQLiteGameStore.TOUCH_INTERVAL + 10)
+    assert store.get(read) is not None
+    clock.advance(50)
+
+    assert store.sweep() == 1
+    assert read in store
+    assert idle not in store
+
+
+def test_no_ttl(make_store, clock):
+    store = make_store(ttl=None)
+    game_id = store.create(Game(SEED))
+    clock.advance(10 ** 9)
+    assert store.sweep() == 0
+    assert game_id in store
+
+
+def test_lru_eviction(make_store, clock):
+    store = make_store(max_games=3)
+    first, second, third = (store.create(Game(SEED)) for _ in range(3))
+    clock.advance(SQLiteGameStore.TOUCH_INTERVAL + 10)
+    store.get(first)
+    clock.advance(1)
+
+    fourth = store.create(Game(SEED))
+    assert store.count() == 3
+    assert store.evicted == 1
+    assert second not in store
+    for game_id in (first, third, fourth):
+        assert game_id in store
+
+
+def test_edit_saves_changes(make_store):
+    store = make_store()
+    game_id = store.create(Game(SEED))
+    with store.edit(game_id) as game:
+        assert game.discard_card(1)
+    assert store.get(game_id).version == 1
+
+    with store.edit('missing') as game:
+        assert game is None
+    assert 'missing' not in store
+
+
+def test_sqlite_edit_does_not_save_on_error(tmp_path):
+    store = SQLiteGameStore(str(tmp_path / 'games.db'))
+    game_id = store.create(Game(SEED))
+    with pytest.raises(RuntimeError):
+        with store.edit(game_id) as game:
+            game.discard_card(1)
+            raise RuntimeError
+    assert store.get(game_id).version == 0
+
+
+def test_edit_holds_game_lock(make_store):
+    """edit() 期间同一局游戏的锁被占用，不同游戏的锁不受影响"""
+    store = make_store()
+    game_id, other_id = 'game-a', 'game-b'
+    # 两局游戏落在锁文件的不同字节上
+    assert (zlib.crc32(game_id.encode()) % SQLiteGameStore.LOCK_SLOTS
+            != zlib.crc32(other_id.encode()) % SQLiteGameStore.LOCK_SLOTS)
+    store.save(game_id, Game(SEED))
+    store.save(other_id, Game(SEED))
+
+    entered = threading.Event()
+    order = []
+
+    def edit_same_game():
+        entered.wait()
+        with store.edit(game_id) as game:
+            order.append(('other', game.version))
+            game.discard_card(1)
+
+    def lock_other_game():
+        entered.wait()
+        with store.lock(other_id):
+            order.append('unrelated')
+
+    same = threading.Thread(target=edit_same_game)
+    unrelated = threading.Thread(target=lock_other_game)
+    same.start()
+    unrelated.start()
+    with store.edit(game_id) as game:
+        entered.set()
+        unrelated.join(5)
+        same.join(0.2)
+        assert not unrelated.is_alive()
+        assert same.is_alive()  # 等待这局游戏的锁
+        game.discard_card(1)
+        order.append(('first', game.version))
+    same.join(5)
+
+    # 第二次修改读到的是第一次修改保存后的游戏
+    assert order == ['unrelated', ('first', 1), ('other', 1)]
+    assert store.get(game_id).version == 2
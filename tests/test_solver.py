@@ -0,0 +1,238 @@
+"""
+求解器的回归测试
+
+在固定种子的手牌语料上，把每个求解引擎和模式的结果与穷举得到的可达值集合
+比较（solve_subsets 与每个子集的穷举结果比较），并用 expression.evaluate
+重新计算找到的表达式；另外检查重新生成的可达点数表与 solver_table.bin
+完全相同。
+"""
+import random
+from fractions import Fraction
+from functools import lru_cache
+
+import pytest
+
+import solver
+import solver_table
+from card import Card
+from expression import evaluate
+from solver import Solver, SolveStatus
+
+SEED = 20240601
+# 语料的手牌数量和张数范围（穷举的开销随张数急剧增长，最多5张必须用到的牌 + 黑桃K）
+CORPUS_SIZE = 120
+MIN_CARDS = 1
+MAX_CARDS = 6
+# 预计算表范围内的目标值，以及超出表的范围、只能搜索的目标值
+TARGETS = list(range(0, 16)) + [24, 60]
+
+
+@lru_cache(maxsize=None)
+def _brute_force(values: tuple) -> frozenset:
+    """
+    必须全部用到values中的数值时能算出的所有值（精确分数）
+
+    按表达式树根节点的拆分穷举：每种把数值分成两个非空部分的方式，
+    两部分各自的可达值两两做四则运算。
+    """
+    if len(values) == 1:
+        return frozenset(values)
+    n = len(values)
+    results = set()
+    # 最高位固定在右侧部分，每种拆分只枚举一次
+    for mask in range(1, 1 << (n - 1)):
+        left = tuple(sorted(values[i] for i in range(n) if mask >> i & 1))
+        right = tuple(sorted(values[i] for i in range(n) if not mask >> i & 1))
+        for a in _brute_force(left):
+            for b in _brute_force(right):
+                results.update((a + b, a - b, b - a, a * b))
+                if b != 0:
+                    results.add(a / b)
+                if a != 0:
+                    results.add(b / a)
+    return frozenset(results)
+
+
+class Case:
+    """语料中的一手牌：必须用到的点数、可用可不用的黑桃K，以及穷举的可达整数目标值"""
+
+    def __init__(self, cards):
+        self.cards = cards
+        self.spade_king = next((card for card in cards if card.is_spade_king()), None)
+        values = Card.resolve_values(cards)
+        self.required = tuple(sorted(Fraction(v) for card, v in zip(cards, values)
+                                     if not card.is_spade_king()))
+        self.optional = tuple(Fraction(v) for card, v in zip(cards, values)
+                              if card.is_spade_king())
+        reachable = set()
+        if self.required:
+            reachable |= _brute_force(self.required)
+        if self.optional:
+            reachable |= _brute_force(tuple(sorted(self.required + self.optional)))
+        self.expected = {target for target in TARGETS if Fraction(target) in reachable}
+
+    def __repr__(self):
+        return f"Case({self.cards})"
+
+
+def _build_corpus():
+    rng = random.Random(SEED)
+    deck = Card.create_deck()
+    spade_king = next(card for card in deck if card.is_spade_king())
+    jokers = [card for card in deck if card.suit.name == 'JOKER']
+    cases = []
+    while len(cases) < CORPUS_SIZE:
+        size = rng.randint(MIN_CARDS, MAX_CARDS)
+        cards = rng.sample(deck, size)
+        # 让黑桃K和大小王出现得更频繁
+        if spade_king not in cards and rng.random() < 0.4:
+            cards[0] = spade_king
+        if rng.random() < 0.2:
+            cards[-1] = rng.choice(jokers)
+        cards = list(dict.fromkeys(cards))
+        # 必须用到的牌最多5张（穷举的开销）
+        if sum(not card.is_spade_king() for card in cards) > 5:
+            continue
+        cases.append(Case(cards))
+    return cases
+
+
+CORPUS = _build_corpus()
+
+
+@pytest.fixture(autouse=True)
+def clear_solver_cache():
+    """每个测试都从空的求解结果缓存开始，测到的是引擎本身而不是缓存"""
+    Solver.clear_cache()
+    yield
+    Solver.clear_cache()
+
+
+@pytest.fixture
+def no_table(monkeypatch):
+    """不使用预计算表（强制回退到搜索）"""
+    monkeypatch.setattr(solver, '_TABLE', None)
+
+
+def _check_solution(case: Case, target: int, solution):
+    """解的表达式能算出目标值，并且恰好用到必须用到的牌（黑桃K可用可不用）"""
+    expression, result = solution
+    assert abs(result - target) < 1e-6, (case, target, solution)
+    parsed = evaluate(expression)
+    assert parsed.value == target, (case, target, expression)
+    used = sorted(Fraction(v) for v in parsed.operands)
+    assert used in (list(case.required), sorted(case.required + case.optional)), \
+        (case, target, expression)
+
+
+@pytest.mark.parametrize('exact', [True, False], ids=['exact', 'float'])
+def test_solve_matches_brute_force(exact):
+    for case in CORPUS:
+        for target in TARGETS:
+            solution = Solver.solve(case.cards, target, exclude_card=case.spade_king,
+                                    exact=exact)
+            assert (solution is not None) == (target in case.expected), (case, target)
+            if solution is not None:
+                _check_solution(case, target, solution)
+
+
+@pytest.mark.parametrize('exact', [True, False], ids=['exact', 'float'])
+@pytest.mark.parametrize('prune', [True, False], ids=['pruned', 'unpruned'])
+def test_solve_bounded_matches_brute_force(exact, prune):
+    for case in CORPUS:
+        for target in TARGETS:
+            result = Solver.solve_bounded(case.cards, target, exclude_card=case.spade_king,
+                                          exact=exact, max_nodes=None, timeout=None,
+                                          prune=prune)
+            expected = SolveStatus.FOUND if target in case.expected else SolveStatus.IMPOSSIBLE
+            assert result.status == expected, (case, target)
+            if result.solution is not None:
+                _check_solution(case, target, result.solution)
+
+
+@pytest.mark.parametrize('exact', [True, False], ids=['exact', 'float'])
+def test_solve_many_matches_brute_force(exact):
+    for case in CORPUS:
+        solutions = Solver.solve_many(case.cards, TARGETS, exclude_card=case.spade_king,
+                                      exact=exact)
+        assert {t for t, s in zip(TARGETS, solutions) if s is not None} == case.expected, case
+        for target, solution in zip(TARGETS, solutions):
+            if solution is not None:
+                _check_solution(case, target, solution)
+
+
+def test_is_solvable_matches_brute_force():
+    for case in CORPUS:
+        for target in TARGETS:
+            assert Solver.is_solvable(case.cards, target, case.spade_king) == \
+                (target in case.expected), (case, target)
+
+
+def test_is_solvable_without_table_matches_brute_force(no_table):
+    for case in CORPUS:
+        for target in TARGETS:
+            assert Solver.is_solvable(case.cards, target, case.spade_king) == \
+                (target in case.expected), (case, target)
+
+
+@pytest.mark.parametrize('use_table', [True, False], ids=['table', 'search'])
+def test_solvable_targets_matches_brute_force(use_table, monkeypatch):
+    if not use_table:
+        monkeypatch.setattr(solver, '_TABLE', None)
+    reachable = Solver.solvable_targets([case.cards for case in CORPUS], TARGETS,
+                                        exclude_card=None)
+    for case, targets in zip(CORPUS, reachable):
+        assert targets == case.expected, case
+
+
+def test_solve_all_combinations_matches_brute_force():
+    for case in CORPUS:
+        for target in TARGETS:
+            solutions = Solver.solve_all_combinations(case.cards, target,
+                                                      exclude_card=case.spade_king)
+            assert bool(solutions) == (target in case.expected), (case, target)
+            for solution in solutions:
+                _check_solution(case, target, solution)
+
+
+def test_solve_subsets_matches_brute_force():
+    """每个能算出目标值的子集（子集中的牌全部用到，点数以整手牌为上下文）都被找到"""
+    for case in CORPUS:
+        values = [Fraction(v) for v in Card.resolve_values(case.cards)]
+        for target in TARGETS:
+            solutions = Solver.solve_subsets(case.cards, target)
+            expected = set()
+            for mask in range(1, 1 << len(case.cards)):
+                subset = tuple(sorted(values[i] for i in range(len(values)) if mask >> i & 1))
+                if Fraction(target) in _brute_force(subset):
+                    expected.add(tuple(card for i, card in enumerate(case.cards) if mask >> i & 1))
+            assert {tuple(cards) for cards, _ in solutions} == expected, (case, target)
+            for cards, (expression, result) in solutions:
+                assert abs(result - target) < 1e-6, (case, target, expression)
+                parsed = evaluate(expression)
+                assert parsed.value == target, (case, target, expression)
+                assert sorted(Fraction(v) for v in parsed.operands) == \
+                    sorted(values[case.cards.index(card)] for card in cards), \
+                    (case, target, expression)
+
+
+def test_parallel_search_matches_brute_force(monkeypatch):
+    """多进程并行搜索（第一层拆分交给进程池）与穷举结果相同"""
+    monkeypatch.setattr(solver, 'PARALLEL_PROCESSES', 2)
+    monkeypatch.setattr(solver, 'PARALLEL_MIN_CARDS', 4)
+    try:
+        for case in CORPUS[:40]:
+            results = Solver.solve_many_bounded(case.cards, TARGETS,
+                                                exclude_card=case.spade_king,
+                                                max_nodes=None, timeout=None)
+            found = {t for t, r in zip(TARGETS, results) if r.status == SolveStatus.FOUND}
+            assert found == case.expected, case
+            assert all(r.status != SolveStatus.BUDGET_EXHAUSTED for r in results), case
+    finally:
+        solver._reset_pool()
+
+
+def test_table_rebuild_is_byte_identical():
+    """重新生成的可达点数表与仓库中的 solver_table.bin 完全相同"""
+    with open(solver_table.TABLE_PATH, 'rb') as f:
+        assert solver_table._TableBuilder().build() == f.read()